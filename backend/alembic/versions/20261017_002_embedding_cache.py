@@ -0,0 +1,33 @@
+"""embedding cache
+
+Revision ID: 20261017_002
+Revises: 20260219_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "20261017_002"
+down_revision: str | None = "20260219_001"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE embedding_cache (
+            content_hash    CHAR(64) PRIMARY KEY,
+            model           VARCHAR(100) NOT NULL,
+            embedding       vector(1536) NOT NULL,
+            created_at      TIMESTAMPTZ DEFAULT NOW()
+        );
+        COMMENT ON TABLE embedding_cache IS
+            'Embedding キャッシュ。content_hash = SHA-256(モデル名 + 入力テキスト)';
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS embedding_cache CASCADE")
@@ -0,0 +1,44 @@
+"""multiple anchors per category
+
+Revision ID: 20261017_003
+Revises: 20261017_002
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "20261017_003"
+down_revision: str | None = "20261017_002"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE anchors DROP CONSTRAINT anchors_category_id_key;
+        ALTER TABLE anchors ADD COLUMN anchor_key VARCHAR(100) NOT NULL DEFAULT 'default';
+        ALTER TABLE anchors
+            ADD CONSTRAINT anchors_category_id_anchor_key_key UNIQUE (category_id, anchor_key);
+        COMMENT ON COLUMN anchors.anchor_key IS
+            'カテゴリ内のアンカー識別子。カテゴリ定義文は default、サブトピックはキーワード';
+    """)
+    # setup_anchors.py は id を明示して挿入していたため、SERIAL の採番位置を合わせる
+    op.execute("""
+        SELECT setval(
+            pg_get_serial_sequence('anchors', 'id'),
+            COALESCE((SELECT MAX(id) FROM anchors), 0) + 1,
+            false
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DELETE FROM anchors WHERE anchor_key <> 'default';
+        ALTER TABLE anchors DROP CONSTRAINT anchors_category_id_anchor_key_key;
+        ALTER TABLE anchors DROP COLUMN anchor_key;
+        ALTER TABLE anchors ADD CONSTRAINT anchors_category_id_key UNIQUE (category_id);
+    """)
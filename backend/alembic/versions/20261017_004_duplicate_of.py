@@ -0,0 +1,40 @@
+"""near-duplicate papers
+
+Revision ID: 20261017_004
+Revises: 20261017_003
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "20261017_004"
+down_revision: str | None = "20261017_003"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE papers ADD COLUMN duplicate_of VARCHAR(20)
+            REFERENCES papers (arxiv_id) ON DELETE SET NULL;
+        COMMENT ON COLUMN papers.duplicate_of IS
+            'L2 で近似重複と判定した論文の重複元 arxiv_id。設定された論文は L3 以降を行わない';
+    """)
+    # 重複と判定した論文は L3 の未処理として扱わない
+    op.execute("""
+        DROP INDEX idx_papers_unprocessed_l3;
+        CREATE INDEX idx_papers_unprocessed_l3 ON papers (importance_score DESC)
+        WHERE max_score IS NOT NULL AND is_relevant IS NULL AND duplicate_of IS NULL;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DROP INDEX idx_papers_unprocessed_l3;
+        CREATE INDEX idx_papers_unprocessed_l3 ON papers (importance_score DESC)
+        WHERE max_score IS NOT NULL AND is_relevant IS NULL;
+        ALTER TABLE papers DROP COLUMN duplicate_of;
+    """)
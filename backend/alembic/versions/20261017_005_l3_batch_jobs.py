@@ -0,0 +1,44 @@
+"""l3 batch prediction jobs
+
+Revision ID: 20261017_005
+Revises: 20261017_004
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "20261017_005"
+down_revision: str | None = "20261017_004"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE l3_batch_jobs (
+            id              SERIAL PRIMARY KEY,
+            job_name        VARCHAR(200) UNIQUE NOT NULL,
+            status          VARCHAR(20) NOT NULL DEFAULT 'submitted'
+                            CHECK (status IN ('submitted', 'applied', 'failed')),
+            provider_state  VARCHAR(40),
+            papers          JSONB NOT NULL,
+            request_count   INTEGER NOT NULL,
+            applied_count   INTEGER NOT NULL DEFAULT 0,
+            error_count     INTEGER NOT NULL DEFAULT 0,
+            input_tokens    INTEGER NOT NULL DEFAULT 0,
+            output_tokens   INTEGER NOT NULL DEFAULT 0,
+            submitted_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            completed_at    TIMESTAMPTZ
+        );
+        COMMENT ON TABLE l3_batch_jobs IS
+            'L3 バッチ予測モードで投入した Gemini バッチジョブ。papers は投入した L2Paper の JSON';
+        CREATE INDEX idx_l3_batch_jobs_open ON l3_batch_jobs (submitted_at)
+        WHERE status = 'submitted';
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS l3_batch_jobs CASCADE")
@@ -0,0 +1,34 @@
+"""l3 response cache
+
+Revision ID: 20261017_006
+Revises: 20261017_005
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "20261017_006"
+down_revision: str | None = "20261017_005"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE l3_response_cache (
+            prompt_hash     CHAR(64) PRIMARY KEY,
+            model           VARCHAR(100) NOT NULL,
+            response        JSONB NOT NULL,
+            created_at      TIMESTAMPTZ DEFAULT NOW()
+        );
+        COMMENT ON TABLE l3_response_cache IS
+            'L3 分析結果のキャッシュ。'
+            'prompt_hash = SHA-256(モデル名 + システムプロンプト + ユーザープロンプト)';
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS l3_response_cache CASCADE")
@@ -0,0 +1,29 @@
+"""l3 submitted count
+
+Revision ID: 20261017_007
+Revises: 20261017_006
+Create Date: 2026-10-17 23:30:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "20261017_007"
+down_revision: str | None = "20261017_006"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # バッチ予測モードでは投入した論文と結果を反映した論文が別の実行になるため分けて記録する
+    op.execute("""
+        ALTER TABLE batch_logs ADD COLUMN l3_submitted_count INTEGER;
+        COMMENT ON COLUMN batch_logs.l3_submitted_count IS
+            'L3 に投入した論文数。l3_input_count は L3 の結果を反映した論文数 (関連率の分母)';
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE batch_logs DROP COLUMN l3_submitted_count")
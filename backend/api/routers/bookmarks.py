@@ -50,7 +50,8 @@ def list_bookmarks(
                p.importance, p.summary_ja
         FROM bookmarks bk
         JOIN papers p ON p.id = bk.paper_id
-        LEFT JOIN anchors a ON a.category_id = p.category_id
+        LEFT JOIN anchors a
+            ON a.category_id = p.category_id AND a.anchor_key = 'default'
         WHERE {where_clause}
         ORDER BY bk.created_at DESC, bk.id DESC
         LIMIT %s
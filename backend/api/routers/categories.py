@@ -25,7 +25,7 @@ def list_categories(
                ) AS paper_count
         FROM anchors a
         LEFT JOIN papers p ON p.category_id = a.category_id
-        WHERE a.is_active = TRUE
+        WHERE a.is_active = TRUE AND a.anchor_key = 'default'
         GROUP BY a.category_id, a.category_name
         ORDER BY a.category_id
     """
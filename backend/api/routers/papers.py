@@ -16,11 +16,17 @@ from api.schemas import (
     PaperFigure,
     PaperSummary,
     Pagination,
+    RelatedPaper,
     ViewResponse,
 )
 
 router = APIRouter(prefix="/papers")
 
+# 関連論文の kNN 検索で HNSW から取り出す候補数の既定値 (= hnsw.ef_search)。
+# 表示可能な論文 (is_relevant かつ detail_review あり) への絞り込みは候補に対する
+# 後段フィルタのため、pgvector の既定 40 では limit 件に満たないことがある
+RELATED_EF_SEARCH = 200
+
 
 def _encode_cursor(published_at: datetime, paper_id: int) -> str:
     """published_at + id からカーソル文字列を生成する。"""
@@ -82,7 +88,8 @@ def list_papers(
                EXISTS(SELECT 1 FROM paper_views pv
                       WHERE pv.paper_id = p.id AND pv.user_id = %s) AS is_viewed
         FROM papers p
-        LEFT JOIN anchors a ON a.category_id = p.category_id
+        LEFT JOIN anchors a
+            ON a.category_id = p.category_id AND a.anchor_key = 'default'
         WHERE {where_clause_sql}
         ORDER BY p.published_at DESC, p.id DESC
         LIMIT %s
@@ -125,7 +132,8 @@ def list_papers(
     # total_count
     count_sql = f"""
         SELECT COUNT(*) FROM papers p
-        LEFT JOIN anchors a ON a.category_id = p.category_id
+        LEFT JOIN anchors a
+            ON a.category_id = p.category_id AND a.anchor_key = 'default'
         WHERE {where_clause_sql}
     """
     # count クエリには user_id と limit は不要なので params を調整
@@ -161,7 +169,8 @@ def get_paper_detail(
                EXISTS(SELECT 1 FROM paper_views pv
                       WHERE pv.paper_id = p.id AND pv.user_id = %s) AS is_viewed
         FROM papers p
-        LEFT JOIN anchors a ON a.category_id = p.category_id
+        LEFT JOIN anchors a
+            ON a.category_id = p.category_id AND a.anchor_key = 'default'
         WHERE p.arxiv_id = %s
     """
     with conn.cursor() as cur:
@@ -236,6 +245,91 @@ def get_paper_figures(
     return {"data": figures}
 
 
+@router.get("/{arxiv_id}/related")
+def get_related_papers(
+    arxiv_id: str,
+    conn: Annotated[DbConn, Depends(get_db)],
+    user: Annotated[CurrentUser, Depends(get_current_user)],
+    limit: int = Query(default=10, ge=1, le=50),
+    ef_search: int = Query(default=RELATED_EF_SEARCH, ge=10, le=1000),
+) -> dict[str, Any]:
+    """GET /papers/{arxiv_id}/related — Embedding が近い論文 (HNSW インデックスで kNN)
+
+    idx_papers_embedding を ORDER BY embedding <=> target LIMIT ef_search で走査して
+    候補を取り、表示可能な論文に絞って類似度順に limit 件返す。
+    hnsw.ef_search はこのトランザクション内だけ変更する。
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT embedding IS NOT NULL FROM papers WHERE arxiv_id = %s", (arxiv_id,))
+        target = cur.fetchone()
+        if not target:
+            raise HTTPException(
+                status_code=404,
+                detail={
+                    "code": "PAPER_NOT_FOUND",
+                    "message": f"Paper with arxiv_id '{arxiv_id}' not found",
+                },
+            )
+        if not target[0]:
+            return {"data": []}
+
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(ef_search),))
+        cur.execute(
+            """
+            WITH target AS (
+                SELECT id, embedding FROM papers WHERE arxiv_id = %(arxiv_id)s
+            ),
+            candidates AS MATERIALIZED (
+                SELECT p.id, p.embedding <=> (SELECT embedding FROM target) AS distance
+                FROM papers p
+                ORDER BY p.embedding <=> (SELECT embedding FROM target)
+                LIMIT %(ef_search)s
+            )
+            SELECT p.arxiv_id, p.title, p.category_id, a.category_name,
+                   p.importance, p.summary_ja,
+                   (p.detail_review->>'one_line_takeaway') AS one_line_takeaway,
+                   p.authors, p.published_at,
+                   EXISTS(SELECT 1 FROM bookmarks b
+                          WHERE b.paper_id = p.id AND b.user_id = %(user_id)s) AS is_bookmarked,
+                   EXISTS(SELECT 1 FROM paper_views pv
+                          WHERE pv.paper_id = p.id AND pv.user_id = %(user_id)s) AS is_viewed,
+                   1 - c.distance AS similarity
+            FROM candidates c
+            JOIN papers p ON p.id = c.id
+            LEFT JOIN anchors a
+                ON a.category_id = p.category_id AND a.anchor_key = 'default'
+            WHERE p.id <> (SELECT id FROM target)
+              AND p.is_relevant = TRUE AND p.detail_review IS NOT NULL
+            ORDER BY c.distance
+            LIMIT %(limit)s
+            """,
+            {"arxiv_id": arxiv_id, "ef_search": ef_search, "user_id": user.user_id, "limit": limit},
+        )
+        rows = cur.fetchall()
+    # SET LOCAL 相当の ef_search を後続のクエリに持ち越さない
+    conn.commit()
+
+    papers = [
+        RelatedPaper(
+            arxiv_id=row[0],
+            title=row[1],
+            category_id=row[2],
+            category_name=row[3],
+            importance=row[4],
+            summary_ja=row[5],
+            one_line_takeaway=row[6],
+            authors=row[7] if row[7] else [],
+            published_at=row[8],
+            thumbnail_url=None,
+            is_bookmarked=row[9],
+            is_viewed=row[10],
+            similarity=round(float(row[11]), 4),
+        ).model_dump(mode="json")
+        for row in rows
+    ]
+    return {"data": papers}
+
+
 @router.post("/{arxiv_id}/view", status_code=201)
 def record_view(
     arxiv_id: str,
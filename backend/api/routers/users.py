@@ -102,7 +102,8 @@ def get_stats(
             """SELECT p.category_id, a.category_name, COUNT(*) AS cnt
                FROM paper_views pv
                JOIN papers p ON p.id = pv.paper_id
-               LEFT JOIN anchors a ON a.category_id = p.category_id
+               LEFT JOIN anchors a
+                   ON a.category_id = p.category_id AND a.anchor_key = 'default'
                WHERE pv.user_id = %s AND p.category_id IS NOT NULL
                GROUP BY p.category_id, a.category_name
                ORDER BY cnt DESC
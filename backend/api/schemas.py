@@ -32,6 +32,12 @@ class PaperSummary(BaseModel):
     is_viewed: bool = False
 
 
+class RelatedPaper(PaperSummary):
+    """関連論文 (Embedding の近傍)。"""
+
+    similarity: float = Field(description="対象論文とのコサイン類似度")
+
+
 class Section(BaseModel):
     """論文解説セクション。"""
 
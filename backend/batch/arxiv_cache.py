@@ -0,0 +1,235 @@
+"""
+AI Research OS — arXiv API レスポンスのディスクキャッシュ
+
+同じ (クエリ, 日付範囲) の再実行 (ローカル実行・下流フェーズ失敗後のリトライ) で
+arXiv へ再リクエストしてレートリミットの待ち時間を払わないよう、
+最終的なリクエスト URL の SHA-256 をキーにレスポンス本文をファイルへ保存する。
+
+- TTL: 保存 (mtime) から ARXIV_CACHE_TTL_SEC 秒を過ぎたエントリーはミス扱い
+- LRU: 合計サイズが ARXIV_CACHE_MAX_BYTES を超えたら、最終参照 (atime) の古い順に削除
+- オフライン: ARXIV_CACHE_OFFLINE=1 では TTL を無視してキャッシュのみを返し、
+  ミスしてもネットワークへ出ない (記録済みフィクスチャによる L1 のリプレイ用)
+
+フィクスチャの記録は ARXIV_CACHE_DIR を指定して通常実行するだけでよい。
+リプレイ時は ARXIV_REPLAY_END_DATE で記録時と同じ日付範囲に固定する。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from pathlib import Path
+
+from batch.config import (
+    ARXIV_CACHE_DIR,
+    ARXIV_CACHE_MAX_BYTES,
+    ARXIV_CACHE_OFFLINE,
+    ARXIV_CACHE_TTL_SEC,
+)
+from utils.logger import logger
+
+_SUFFIX = ".xml"
+
+
+class ArxivResponseCache:
+    """URL をキーにした、TTL とサイズ上限付きのレスポンスキャッシュ。"""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        ttl_sec: float,
+        max_bytes: int,
+        offline: bool = False,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.directory = Path(directory)
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._clock = clock
+        # 統計
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, url: str) -> Path:
+        """URL に対応するキャッシュファイルのパスを返す。"""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}{_SUFFIX}"
+
+    # -----------------------------------------------------------------------
+    # 読み出し
+    # -----------------------------------------------------------------------
+    def get(self, url: str) -> bytes | None:
+        """キャッシュ済みの本文を返す。未保存・期限切れの場合は None。"""
+        path = self.path_for(url)
+        now = self._clock()
+        try:
+            stat = path.stat()
+            if not self.offline and now - stat.st_mtime > self.ttl_sec:
+                self.misses += 1
+                return None
+            body = path.read_bytes()
+            # mtime (保存時刻 = TTL の基準) は保ったまま atime を LRU の参照時刻として更新
+            os.utime(path, (now, stat.st_mtime))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except OSError:
+            logger.warning("Failed to read arXiv cache", extra={"path": str(path)}, exc_info=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return body
+
+    # -----------------------------------------------------------------------
+    # 書き込み
+    # -----------------------------------------------------------------------
+    def put(self, url: str, body: bytes) -> None:
+        """本文を保存する。書き込み失敗は呼び出し側を止めない。"""
+        path = self.path_for(url)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(body)
+            self._commit(tmp_path, path)
+        except OSError:
+            logger.warning("Failed to write arXiv cache", extra={"path": str(path)}, exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+
+    def discard(self, url: str) -> None:
+        """保存済みの本文を削除する (読み切れたが中身が壊れていた場合など)。"""
+        path = self.path_for(url)
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            logger.warning("Failed to delete arXiv cache", extra={"path": str(path)}, exc_info=True)
+
+    def tee(self, url: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """chunks をそのまま流しつつ、最後まで読み切れた本文だけをキャッシュに保存する。"""
+        writer = self._open_writer(url)
+        completed = False
+        try:
+            for chunk in chunks:
+                writer = self._write(writer, chunk)
+                yield chunk
+            completed = True
+        finally:
+            self._finish_writer(url, writer, completed)
+
+    async def atee(self, url: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """tee の非同期版。"""
+        writer = self._open_writer(url)
+        completed = False
+        try:
+            async for chunk in chunks:
+                writer = self._write(writer, chunk)
+                yield chunk
+            completed = True
+        finally:
+            self._finish_writer(url, writer, completed)
+
+    # -----------------------------------------------------------------------
+    # 内部処理
+    # -----------------------------------------------------------------------
+    def _open_writer(self, url: str) -> _Writer | None:
+        tmp_path = self.path_for(url).with_suffix(".tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            return _Writer(tmp_path)
+        except OSError:
+            logger.warning(
+                "Failed to write arXiv cache", extra={"path": str(tmp_path)}, exc_info=True
+            )
+            return None
+
+    def _write(self, writer: _Writer | None, chunk: bytes) -> _Writer | None:
+        """チャンクを書き込む。失敗したら以降の書き込みをやめて None を返す。"""
+        if writer is None:
+            return None
+        try:
+            writer.file.write(chunk)
+            return writer
+        except OSError:
+            logger.warning(
+                "Failed to write arXiv cache", extra={"path": str(writer.path)}, exc_info=True
+            )
+            writer.discard()
+            return None
+
+    def _finish_writer(self, url: str, writer: _Writer | None, completed: bool) -> None:
+        if writer is None:
+            return
+        if not completed:
+            # 途中で切れた本文はキャッシュしない
+            writer.discard()
+            return
+        try:
+            writer.file.close()
+            self._commit(writer.path, self.path_for(url))
+        except OSError:
+            logger.warning(
+                "Failed to write arXiv cache", extra={"path": str(writer.path)}, exc_info=True
+            )
+            writer.discard()
+
+    def _commit(self, tmp_path: Path, path: Path) -> None:
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えていれば、最終参照の古いエントリーから削除する。"""
+        entries: list[tuple[float, int, Path]] = []
+        total = 0
+        for path in self.directory.glob(f"*{_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        logger.info("arXiv cache evicted", extra={"evicted": evicted, "total_bytes": total})
+
+
+class _Writer:
+    """tee 中の一時ファイル。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.file = path.open("wb")
+
+    def discard(self) -> None:
+        self.file.close()
+        self.path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# シングルトン
+# ---------------------------------------------------------------------------
+_cache: ArxivResponseCache | None = None
+
+
+def get_response_cache() -> ArxivResponseCache | None:
+    """設定に基づくプロセス共有のキャッシュを返す。ARXIV_CACHE_DIR 未設定なら None。"""
+    global _cache  # noqa: PLW0603
+    if not ARXIV_CACHE_DIR:
+        return None
+    if _cache is None:
+        _cache = ArxivResponseCache(
+            ARXIV_CACHE_DIR,
+            ttl_sec=ARXIV_CACHE_TTL_SEC,
+            max_bytes=ARXIV_CACHE_MAX_BYTES,
+            offline=ARXIV_CACHE_OFFLINE,
+        )
+    return _cache
@@ -0,0 +1,304 @@
+"""
+AI Research OS — arXiv API クライアント
+
+arXiv へのリクエストはすべてこのモジュールを経由する。
+- Keep-Alive 付きの永続 Session (コネクションプール) で TCP/TLS ハンドシェイクを再利用
+- gzip 圧縮レスポンスを要求
+- プロセス内で共有するトークンバケットで ARXIV_RATE_LIMIT_SEC 間隔を保証
+- 503 / タイムアウト時のリトライ
+- ARXIV_CACHE_DIR 設定時はディスクキャッシュ (batch.arxiv_cache) を優先し、
+  ヒットした場合はレートリミットのトークンも消費しない
+同期版 (requests) と非同期版 (httpx) があり、レートリミッターは両者で共有する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncGenerator, Callable, Generator
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from batch.arxiv_cache import ArxivResponseCache, get_response_cache
+from batch.config import (
+    ARXIV_MAX_RETRIES,
+    ARXIV_POOL_MAXSIZE,
+    ARXIV_RATE_LIMIT_SEC,
+    ARXIV_TIMEOUT_SEC,
+)
+from utils.logger import logger
+
+
+# ---------------------------------------------------------------------------
+# レートリミッター
+# ---------------------------------------------------------------------------
+class TokenBucket:
+    """スレッドセーフなトークンバケット。
+
+    capacity=1 の場合、リクエスト開始時刻の間隔が 1 / rate_per_sec 秒以上になる。
+    reserve() は待ち時間を予約して返すだけなので、同期・非同期どちらの
+    呼び出し側からも同じバケットを共有できる。
+    """
+
+    def __init__(
+        self,
+        rate_per_sec: float,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._rate = rate_per_sec
+        self._capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+        # 統計: 予約回数と、スロット待ちで発生した待ち時間の合計
+        self.reserved_count = 0
+        self.total_wait_sec = 0.0
+
+    def reserve(self) -> float:
+        """トークンを1つ予約し、使用可能になるまでの待ち時間 (秒) を返す。"""
+        with self._lock:
+            now = self._clock()
+            elapsed = now - self._updated
+            self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+            self._updated = now
+            self._tokens -= 1.0
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            self.reserved_count += 1
+            self.total_wait_sec += wait
+            return wait
+
+    def acquire(self) -> float:
+        """トークンを1つ取得する。必要なら待機し、実際に待った秒数を返す。"""
+        wait = self.reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+# ---------------------------------------------------------------------------
+# キャッシュ
+# ---------------------------------------------------------------------------
+def _iter_slices(body: bytes, chunk_size: int) -> Generator[bytes]:
+    for i in range(0, len(body), chunk_size):
+        yield body[i : i + chunk_size]
+
+
+async def _aiter_slices(body: bytes, chunk_size: int) -> AsyncGenerator[bytes]:
+    for chunk in _iter_slices(body, chunk_size):
+        yield chunk
+
+
+def _lookup_cache(cache: ArxivResponseCache | None, url: str) -> tuple[bytes | None, bool]:
+    """キャッシュを引く。(本文, ネットワークに出てよいか) を返す。"""
+    if cache is None:
+        return None, True
+    body = cache.get(url)
+    if body is None and cache.offline:
+        logger.warning("arXiv cache miss in offline mode", extra={"url": url[:200]})
+        return None, False
+    return body, True
+
+
+# ---------------------------------------------------------------------------
+# HTTP クライアント
+# ---------------------------------------------------------------------------
+class ArxivClient:
+    """コネクションプールとレートリミッターを共有する arXiv API クライアント。"""
+
+    def __init__(
+        self,
+        limiter: TokenBucket | None = None,
+        cache: ArxivResponseCache | None = None,
+    ) -> None:
+        self.limiter = limiter or TokenBucket(rate_per_sec=1.0 / ARXIV_RATE_LIMIT_SEC)
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=ARXIV_POOL_MAXSIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip"})
+
+    def get(self, url: str) -> bytes | None:
+        """200 レスポンスの本文を返す。キャッシュ優先、失敗時は None。"""
+        body, online = _lookup_cache(self.cache, url)
+        if body is not None or not online:
+            return body
+        response = self._send(url, stream=False)
+        if response is None:
+            return None
+        if self.cache is not None:
+            self.cache.put(url, response.content)
+        return response.content
+
+    def iter_body(self, url: str, chunk_size: int) -> Generator[bytes] | None:
+        """本文をチャンク単位で逐次返すイテレーターを返す。失敗時は None。
+
+        キャッシュミス時は読み出しながらキャッシュへ書き込み、最後まで読み切った
+        本文だけを保存する。途中で読むのをやめる場合は close() すること。
+        """
+        body, online = _lookup_cache(self.cache, url)
+        if body is not None:
+            return _iter_slices(body, chunk_size)
+        if not online:
+            return None
+        response = self._send(url, stream=True)
+        if response is None:
+            return None
+        return self._iter_response(url, response, chunk_size)
+
+    def discard(self, url: str) -> None:
+        """url のキャッシュを削除する (本文が不正だった場合に呼ぶ)。"""
+        if self.cache is not None:
+            self.cache.discard(url)
+
+    def _iter_response(
+        self, url: str, response: requests.Response, chunk_size: int
+    ) -> Generator[bytes]:
+        with response:
+            chunks = response.iter_content(chunk_size=chunk_size)
+            if self.cache is not None:
+                chunks = self.cache.tee(url, chunks)
+            yield from chunks
+
+    def _send(self, url: str, stream: bool) -> requests.Response | None:
+        """レートリミットを守って GET し、200 のレスポンスを返す。リトライ付き。
+
+        stream=True の場合、本文は呼び出し側が iter_content で逐次読み出す。
+        失敗時は None を返す。
+        """
+        for attempt in range(ARXIV_MAX_RETRIES):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(url, timeout=ARXIV_TIMEOUT_SEC, stream=stream)
+                if response.status_code == 200:
+                    return response
+                response.close()
+                if response.status_code == 503:
+                    wait = ARXIV_RATE_LIMIT_SEC * (3**attempt)
+                    logger.warning(
+                        "arXiv 503, retrying",
+                        extra={"attempt": attempt + 1, "wait_sec": wait},
+                    )
+                    time.sleep(wait)
+                    continue
+                logger.error(
+                    "arXiv API error",
+                    extra={"status_code": response.status_code, "url": url[:200]},
+                )
+                return None
+            except requests.Timeout:
+                logger.warning("arXiv timeout", extra={"attempt": attempt + 1})
+            except requests.RequestException:
+                logger.error("arXiv request failed", exc_info=True)
+                return None
+        return None
+
+    def close(self) -> None:
+        """Session をクローズしてプール中のコネクションを解放する。"""
+        self.session.close()
+
+
+class AsyncArxivClient:
+    """httpx ベースの非同期 arXiv API クライアント。
+
+    httpx.AsyncClient はイベントループに紐づくため、1回のバッチ実行
+    (asyncio.run) ごとに生成し、終了時に aclose() する。
+    レートリミッターは同期クライアントと共有する。
+    """
+
+    def __init__(self, limiter: TokenBucket, cache: ArxivResponseCache | None = None) -> None:
+        self.limiter = limiter
+        self.cache = cache
+        self.client = httpx.AsyncClient(
+            timeout=ARXIV_TIMEOUT_SEC,
+            headers={"Accept-Encoding": "gzip"},
+            limits=httpx.Limits(max_keepalive_connections=ARXIV_POOL_MAXSIZE),
+        )
+
+    async def iter_body(self, url: str, chunk_size: int) -> AsyncGenerator[bytes] | None:
+        """ArxivClient.iter_body の非同期版。途中で読むのをやめる場合は aclose() すること。"""
+        body, online = _lookup_cache(self.cache, url)
+        if body is not None:
+            return _aiter_slices(body, chunk_size)
+        if not online:
+            return None
+        response = await self.stream(url)
+        if response is None:
+            return None
+        return self._aiter_response(url, response, chunk_size)
+
+    def discard(self, url: str) -> None:
+        """ArxivClient.discard と同じ。"""
+        if self.cache is not None:
+            self.cache.discard(url)
+
+    async def _aiter_response(
+        self, url: str, response: httpx.Response, chunk_size: int
+    ) -> AsyncGenerator[bytes]:
+        try:
+            chunks = response.aiter_bytes(chunk_size)
+            if self.cache is not None:
+                chunks = self.cache.atee(url, chunks)
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def stream(self, url: str) -> httpx.Response | None:
+        """レートリミットを守って GET し、本文未読の 200 レスポンスを返す。リトライ付き。
+
+        呼び出し側は aiter_bytes で本文を読み出し、最後に aclose() すること。
+        失敗時は None を返す。
+        """
+        for attempt in range(ARXIV_MAX_RETRIES):
+            await asyncio.sleep(self.limiter.reserve())
+            try:
+                request = self.client.build_request("GET", url)
+                response = await self.client.send(request, stream=True)
+                if response.status_code == 200:
+                    return response
+                await response.aclose()
+                if response.status_code == 503:
+                    wait = ARXIV_RATE_LIMIT_SEC * (3**attempt)
+                    logger.warning(
+                        "arXiv 503, retrying",
+                        extra={"attempt": attempt + 1, "wait_sec": wait},
+                    )
+                    await asyncio.sleep(wait)
+                    continue
+                logger.error(
+                    "arXiv API error",
+                    extra={"status_code": response.status_code, "url": url[:200]},
+                )
+                return None
+            except httpx.TimeoutException:
+                logger.warning("arXiv timeout", extra={"attempt": attempt + 1})
+            except httpx.HTTPError:
+                logger.error("arXiv request failed", exc_info=True)
+                return None
+        return None
+
+    async def aclose(self) -> None:
+        """AsyncClient をクローズする。"""
+        await self.client.aclose()
+
+
+# ---------------------------------------------------------------------------
+# シングルトン (Lambda invocation 間で再利用)
+# ---------------------------------------------------------------------------
+_client: ArxivClient | None = None
+
+
+def get_arxiv_client() -> ArxivClient:
+    """プロセス共有の ArxivClient を返す。"""
+    global _client  # noqa: PLW0603
+    if _client is None:
+        _client = ArxivClient(cache=get_response_cache())
+    return _client
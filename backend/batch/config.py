@@ -6,6 +6,8 @@ AI Research OS — バッチ処理設定定数
 
 from __future__ import annotations
 
+import os
+
 # ---------------------------------------------------------------------------
 # arXiv API (L1)
 # ---------------------------------------------------------------------------
@@ -13,10 +15,23 @@ ARXIV_BASE_URL = "http://export.arxiv.org/api/query"
 ARXIV_RATE_LIMIT_SEC = 3.0
 ARXIV_TIMEOUT_SEC = 30
 ARXIV_MAX_RETRIES = 3
+ARXIV_POOL_MAXSIZE = 4  # Keep-Alive コネクションプールの最大接続数
 ARXIV_MAX_PAGES_PER_QUERY = 3
+ARXIV_STREAM_CHUNK_BYTES = 64 * 1024  # ストリーミングパース時の読み出し単位
+# ページング途中のチェックポイント保存先 (Lambda では /tmp のみ書き込み可)
+ARXIV_CHECKPOINT_DIR = os.environ.get("ARXIV_CHECKPOINT_DIR", "/tmp/arxiv_l1_checkpoints")
+# レスポンスのディスクキャッシュ (未設定なら無効)
+ARXIV_CACHE_DIR = os.environ.get("ARXIV_CACHE_DIR", "")
+ARXIV_CACHE_TTL_SEC = float(os.environ.get("ARXIV_CACHE_TTL_SEC", str(6 * 3600)))
+ARXIV_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# 1 の場合はキャッシュのみを使い arXiv へアクセスしない (フィクスチャのリプレイ用)
+ARXIV_CACHE_OFFLINE = os.environ.get("ARXIV_CACHE_OFFLINE", "") == "1"
+# リプレイ時に日付範囲を固定する終端日 (YYYYMMDD)。未設定なら当日 UTC
+ARXIV_REPLAY_END_DATE = os.environ.get("ARXIV_REPLAY_END_DATE", "")
 
 # カテゴリ別クエリテンプレート
 # {start}, {end} は YYYYMMDDTTTT 形式の日付で置換
+# max_results は1ページあたりの件数 (最大 ARXIV_MAX_PAGES_PER_QUERY ページまで取得)
 ARXIV_QUERIES: list[dict[str, str | int]] = [
     {
         "category_id": 1,
@@ -103,8 +118,30 @@ ARXIV_QUERIES: list[dict[str, str | int]] = [
 # ---------------------------------------------------------------------------
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 1536
+# Embedding API のバッチ分割 (1リクエストあたりの入力数・推定トークン数の上限)
+EMBEDDING_MAX_BATCH_INPUTS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 250_000  # API 上限 300k に対して推定誤差の余裕を持たせる
+EMBEDDING_CHARS_PER_TOKEN = 3  # トークン数の推定に使う文字数 (英文の実測 ~4 より保守的)
+EMBEDDING_CONCURRENCY = 4
+EMBEDDING_MAX_RETRIES = 3
 L2_THRESHOLD = 0.40  # コサイン類似度の通過閾値
-ANCHOR_COUNT = 6
+# カテゴリのスコアは、カテゴリ内で類似度の高い上位 k アンカーの平均。
+# L2_THRESHOLD は1カテゴリ1アンカーで決めた値なので、最大値で集約するとサブトピックの
+# アンカーを足すほど通過数が増える。k 個のアンカーが揃って近い論文だけを通す
+# (アンカーが k 個未満のカテゴリは全アンカーの平均)
+L2_ANCHOR_POOL_TOP_K = 2
+L2_UPDATE_CHUNK_SIZE = 5000  # L2 結果の一括 UPDATE 1文あたりの件数
+# アンカー変更後の再スコアリング (1チャンク ≈ 1000 × 6KB の Embedding を保持)
+L2_RESCORE_CHUNK_SIZE = 1000
+L2_RESCORE_TIME_MARGIN_MS = 60_000  # Lambda の残り時間がこれを切ったら次回に持ち越す
+# 近似重複 (再投稿・ほぼ同一の論文) の検出。閾値以上の論文は duplicate_of を付けて L3 に回さない
+L2_DUPLICATE_THRESHOLD = 0.97  # Title + Abstract の Embedding のコサイン類似度
+L2_DUPLICATE_LOOKBACK_DAYS = 30  # 比較対象とする登録済み論文の公開日の範囲
+# 登録済み論文との最近傍探索で HNSW から取り出す候補数 (= hnsw.ef_search)。
+# 公開日・duplicate_of の条件は候補に対する後段フィルタのため、pgvector の既定 40 では
+# 直近の論文が候補に残らず重複を見逃すことがある。大きいほど再現率が上がり、
+# 論文1件あたりの探索時間も増える (pgvector 0.8 以降なら hnsw.iterative_scan でも代替できる)
+L2_DUPLICATE_EF_SEARCH = 400
 
 # importance_score の重み付け
 IMPORTANCE_WEIGHT_MAX_SCORE = 0.6
@@ -115,12 +152,33 @@ IMPORTANCE_WEIGHT_MATCHED_QUERIES = 0.1
 # Gemini L3 分析
 # ---------------------------------------------------------------------------
 GEMINI_MODEL = "gemini-2.5-flash"
-L3_CONCURRENCY = 5
-L3_REQUEST_INTERVAL_MS = 200
+# Gemini の同時実行数 (L3 / Post-L3 で共有する AIMD リミッター: batch.gemini_limiter)
+GEMINI_CONCURRENCY_INITIAL = 5
+GEMINI_CONCURRENCY_MIN = 1
+GEMINI_CONCURRENCY_MAX = 32
+GEMINI_CONCURRENCY_INCREASE = 1.0  # window 件の正常応答ごとの増分
+GEMINI_CONCURRENCY_DECREASE = 0.5  # 429 / 5xx / タイムアウト時の倍率
+GEMINI_LATENCY_TOLERANCE = 2.0  # 最小レイテンシのこの倍を超えた応答では増やさない
+# システムプロンプトのコンテキストキャッシュ (batch.gemini_cache)。
+# 現在の L3 / Post-L3 のプロンプトはキャッシュできる最小トークン数に満たないため既定は無効
+# (GEMINI_CACHE_ENABLED=1 で有効)。有効時も作成前に count_tokens で確認し、
+# 満たなければインラインで送る
+GEMINI_CACHE_ENABLED = os.environ.get("GEMINI_CACHE_ENABLED", "") == "1"
+GEMINI_CACHE_MIN_TOKENS = 1024  # Gemini 2.5 Flash の明示的キャッシュの最小トークン数
+GEMINI_CACHE_TTL_SEC = 3600
+GEMINI_CACHE_REFRESH_MARGIN_SEC = 120  # 期限のこの秒数前に TTL を延長する
 L3_TEMPERATURE = 0.1
 L3_MAX_OUTPUT_TOKENS = 500
 L3_MAX_RETRIES = 3
 L3_TIMEOUT_SEC = 30
+# 1リクエストにまとめる論文数 (1 なら論文ごとに呼び出す)。システムプロンプトの送信が 1/K になる
+L3_BATCH_SIZE = 5
+L3_BATCH_TIMEOUT_SEC = 90
+# L3 の実行方式: "interactive" (generate_content を並列に呼ぶ) /
+# "batch_prediction" (Gemini のバッチ予測ジョブに投入し、結果は次回の実行で取り込む)
+L3_MODE = os.environ.get("L3_MODE", "interactive")
+L3_BATCH_PREDICTION_DIR = os.environ.get("L3_BATCH_PREDICTION_DIR", "/tmp/l3_batch_prediction")
+GEMINI_BATCH_PRICE_FACTOR = 0.5  # バッチ予測の料金 (対話呼び出しに対する比率)
 
 # カテゴリID → カテゴリ名マッピング
 CATEGORY_NAMES: dict[int, str] = {
@@ -165,10 +223,27 @@ Categories hit (score >= 0.40): {hit_count}/6
 
 Please evaluate this paper."""
 
+# L3 複数論文モード (L3_BATCH_SIZE > 1) のシステムプロンプト追記とユーザープロンプト
+L3_BATCH_SYSTEM_PROMPT = (
+    L3_SYSTEM_PROMPT
+    + """
+
+## Batch Mode
+You will receive several papers in one request. Evaluate each paper independently, as if it were the only paper. Return exactly one result per paper in `results`, and copy the paper's arXiv ID into `arxiv_id`."""  # noqa: E501
+)
+L3_BATCH_PAPER_TEMPLATE = """## Paper {index}
+arXiv ID: {arxiv_id}
+Title: {title}
+Abstract: {abstract}
+Pre-filter context: best matching category {best_category_id} ({category_name}), similarity score {max_score}, categories hit (score >= 0.40): {hit_count}/6"""  # noqa: E501
+L3_BATCH_USER_PROMPT_TEMPLATE = """{papers}
+
+Please evaluate each of the {count} papers above."""
+
 # ---------------------------------------------------------------------------
 # Post-L3: PDF全文分析
 # ---------------------------------------------------------------------------
-POST_L3_CONCURRENCY = 3
+POST_L3_CONCURRENCY = 3  # PDF ダウンロード・図表抽出の並列数 (Gemini 呼び出しはリミッター側で制御)
 POST_L3_TEMPERATURE = 0.3
 POST_L3_MAX_OUTPUT_TOKENS = 4096
 POST_L3_TIMEOUT_SEC = 60
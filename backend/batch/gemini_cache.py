@@ -0,0 +1,207 @@
+"""
+AI Research OS — Gemini コンテキストキャッシュ
+
+L3 / Post-L3 のシステムプロンプトは全リクエストで同じなので、バッチ実行ごとに
+1度だけ Gemini のキャッシュ (cachedContents) に登録し、各リクエストからは
+cached_content で参照する。
+- 有効期限の手前 (GEMINI_CACHE_REFRESH_MARGIN_SEC) で TTL を延長し、延長できなければ作り直す
+- 作成前に count_tokens でプロンプトが最小トークン数 (GEMINI_CACHE_MIN_TOKENS) 以上か確認する。
+  満たない場合や作成できない場合はその実行中はキャッシュを使わず、
+  従来どおり system_instruction をインラインで送る
+- 実行の最後に close() で削除し、残りの TTL 分の保存料金を発生させない
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+from typing import Any
+
+from google import genai
+from google.genai import errors, types
+
+from batch.config import (
+    GEMINI_CACHE_ENABLED,
+    GEMINI_CACHE_MIN_TOKENS,
+    GEMINI_CACHE_REFRESH_MARGIN_SEC,
+    GEMINI_CACHE_TTL_SEC,
+    GEMINI_MODEL,
+)
+from utils.logger import logger
+
+
+class PromptCache:
+    """1つのシステムプロンプトに対応する Gemini キャッシュのハンドル。
+
+    キャッシュは最初の get() で作成する (使われないプロンプトは登録しない)。
+    """
+
+    def __init__(
+        self,
+        client: genai.Client,
+        name: str,
+        system_instruction: str,
+        model: str = GEMINI_MODEL,
+        ttl_sec: int = GEMINI_CACHE_TTL_SEC,
+        enabled: bool = GEMINI_CACHE_ENABLED,
+        min_tokens: int = GEMINI_CACHE_MIN_TOKENS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self._client = client
+        self._system_instruction = system_instruction
+        self._model = model
+        self._ttl_sec = ttl_sec
+        self._enabled = enabled
+        self._min_tokens = min_tokens
+        self._size_checked = False
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self._cache_name: str | None = None
+        self._expires_at = 0.0
+        # 統計
+        self.create_count = 0
+        self.refresh_count = 0
+
+    @property
+    def cache_name(self) -> str | None:
+        """現在のキャッシュ名 (cachedContents/...)。未作成・無効時は None。"""
+        return self._cache_name
+
+    async def get(self) -> str | None:
+        """有効なキャッシュ名を返す。期限が近ければ延長し、使えなければ None を返す。"""
+        if not self._enabled:
+            return None
+        if self._cache_name and self._clock() < self._expires_at - GEMINI_CACHE_REFRESH_MARGIN_SEC:
+            return self._cache_name
+
+        async with self._lock:
+            # 待っている間に他のタスクが作成・延長していればそれを使う
+            now = self._clock()
+            if not self._enabled:
+                return None
+            if self._cache_name and now < self._expires_at - GEMINI_CACHE_REFRESH_MARGIN_SEC:
+                return self._cache_name
+            if self._cache_name and await self._refresh():
+                return self._cache_name
+            await self._create()
+            return self._cache_name
+
+    async def config(self, **kwargs: Any) -> types.GenerateContentConfig:
+        """キャッシュを参照する GenerateContentConfig を返す (使えなければインライン)。"""
+        cache_name = await self.get()
+        if cache_name is None:
+            return types.GenerateContentConfig(
+                system_instruction=self._system_instruction, **kwargs
+            )
+        return types.GenerateContentConfig(cached_content=cache_name, **kwargs)
+
+    def invalidate(self, exc: BaseException) -> None:
+        """キャッシュが見つからない (期限切れ・削除済み) エラーなら次回作り直す。"""
+        if self._cache_name and isinstance(exc, errors.APIError) and exc.code == 404:
+            logger.warning(
+                "Gemini prompt cache not found, recreating",
+                extra={"prompt": self.name, "cache_name": self._cache_name},
+            )
+            self._cache_name = None
+
+    async def close(self) -> None:
+        """キャッシュを削除し、統計をログに記録する。"""
+        if self._cache_name:
+            try:
+                await self._client.aio.caches.delete(name=self._cache_name)
+            except Exception:
+                logger.warning(
+                    "Gemini prompt cache delete failed",
+                    extra={"prompt": self.name, "cache_name": self._cache_name},
+                    exc_info=True,
+                )
+            self._cache_name = None
+        if self.create_count:
+            logger.info(
+                "Gemini prompt cache closed",
+                extra={
+                    "prompt": self.name,
+                    "create_count": self.create_count,
+                    "refresh_count": self.refresh_count,
+                },
+            )
+
+    async def _large_enough(self) -> bool:
+        """プロンプトがキャッシュの最小トークン数以上か確認する (確認できなければ作成を試みる)。"""
+        if self._size_checked:
+            return True
+        self._size_checked = True
+        try:
+            counted = await self._client.aio.models.count_tokens(
+                model=self._model, contents=self._system_instruction
+            )
+        except Exception:
+            logger.warning(
+                "Gemini prompt token count failed", extra={"prompt": self.name}, exc_info=True
+            )
+            return True
+        total_tokens = counted.total_tokens or 0
+        if total_tokens >= self._min_tokens:
+            return True
+        logger.info(
+            "Gemini prompt below cache minimum, sending system prompt inline",
+            extra={
+                "prompt": self.name,
+                "total_tokens": total_tokens,
+                "min_tokens": self._min_tokens,
+            },
+        )
+        return False
+
+    async def _create(self) -> None:
+        if not await self._large_enough():
+            # 以降この実行中はインラインで送る
+            self._enabled = False
+            return
+        try:
+            cached = await self._client.aio.caches.create(
+                model=self._model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"ai-research-os-{self.name}",
+                    system_instruction=self._system_instruction,
+                    ttl=f"{self._ttl_sec}s",
+                ),
+            )
+        except Exception:
+            # 以降この実行中はインラインで送る (失敗を繰り返さない)
+            self._enabled = False
+            self._cache_name = None
+            logger.warning(
+                "Gemini prompt cache unavailable, sending system prompt inline",
+                extra={"prompt": self.name},
+                exc_info=True,
+            )
+            return
+        self._cache_name = cached.name
+        self._expires_at = self._clock() + self._ttl_sec
+        self.create_count += 1
+        logger.info(
+            "Gemini prompt cache created",
+            extra={"prompt": self.name, "cache_name": cached.name, "ttl_sec": self._ttl_sec},
+        )
+
+    async def _refresh(self) -> bool:
+        assert self._cache_name is not None
+        try:
+            await self._client.aio.caches.update(
+                name=self._cache_name,
+                config=types.UpdateCachedContentConfig(ttl=f"{self._ttl_sec}s"),
+            )
+        except Exception:
+            logger.warning(
+                "Gemini prompt cache refresh failed, recreating",
+                extra={"prompt": self.name, "cache_name": self._cache_name},
+                exc_info=True,
+            )
+            self._cache_name = None
+            return False
+        self._expires_at = self._clock() + self._ttl_sec
+        self.refresh_count += 1
+        return True
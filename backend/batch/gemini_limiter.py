@@ -0,0 +1,196 @@
+"""
+AI Research OS — Gemini API の同時実行数制御
+
+L3 と Post-L3 の Gemini 呼び出しはすべてこのリミッターを経由する。
+固定の並列数ではなく AIMD (加算的増加・乗算的減少) で同時実行数の上限
+(window) を調整し、実際のクォータに追従させる。
+- 正常応答ごとに window を increase / window ずつ増やす (window 件の成功で +increase)
+- 429 / 5xx / タイムアウトで window を decrease_factor 倍に減らす
+- 応答のレイテンシが呼び出し種別ごとの最小値の latency_tolerance 倍を超えた場合は増やさない
+
+リミッターは asyncio のイベントループに紐づくため、パイプライン実行ごとに
+create_gemini_limiter() で作り、L3 と Post-L3 に同じインスタンスを渡す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+import httpx
+from aws_lambda_powertools.metrics import MetricUnit
+from google.genai import errors
+
+from batch.config import (
+    GEMINI_CONCURRENCY_DECREASE,
+    GEMINI_CONCURRENCY_INCREASE,
+    GEMINI_CONCURRENCY_INITIAL,
+    GEMINI_CONCURRENCY_MAX,
+    GEMINI_CONCURRENCY_MIN,
+    GEMINI_LATENCY_TOLERANCE,
+)
+from utils.logger import logger, metrics
+
+
+def is_gemini_overload(exc: BaseException) -> bool:
+    """レート制限・過負荷を示す例外 (429 / 5xx / タイムアウト) なら True。"""
+    if isinstance(exc, errors.APIError):
+        return exc.code == 429 or exc.code >= 500
+    return isinstance(exc, (TimeoutError, httpx.TimeoutException))
+
+
+class AdaptiveLimiter:
+    """AIMD で同時実行数の上限を調整する非同期リミッター。
+
+    同時に返ってきた複数の 429 で何度も減らさないよう、減少は直前の減少より
+    後に開始したリクエストの失敗でのみ行う (TCP の輻輳制御と同じ考え方)。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float,
+        min_limit: float,
+        max_limit: float,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        is_overload: Callable[[BaseException], bool] = is_gemini_overload,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self._limit = float(initial)
+        self._min = float(min_limit)
+        self._max = float(max_limit)
+        self._increase = increase
+        self._decrease_factor = decrease_factor
+        self._latency_tolerance = latency_tolerance
+        self._is_overload = is_overload
+        self._clock = clock
+        self._cond = asyncio.Condition()
+        self._in_flight = 0
+        self._last_decrease = -math.inf
+        self._min_latency: dict[str, float] = {}
+        # 統計
+        self.success_count = 0
+        self.overload_count = 0
+        self.decrease_count = 0
+        self.max_in_flight = 0
+        self.peak_limit = self._limit
+        self.total_wait_sec = 0.0
+
+    @property
+    def limit(self) -> int:
+        """現在の同時実行数の上限 (window の整数部)。"""
+        return max(1, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @asynccontextmanager
+    async def slot(self, kind: str) -> AsyncIterator[None]:
+        """同時実行枠を1つ確保して Gemini を呼び出す。
+
+        ブロック内で送出された例外から過負荷を判定し、正常終了ならレイテンシを
+        評価して window を調整する。例外はそのまま呼び出し元に伝播する。
+
+        Args:
+            kind: 呼び出し種別 ("l3" / "post_l3" 等)。レイテンシの基準値を種別ごとに持つ
+        """
+        waited_from = self._clock()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        started = self._clock()
+        self.total_wait_sec += started - waited_from
+
+        try:
+            yield
+        except BaseException as exc:
+            if self._is_overload(exc):
+                self._on_overload(started)
+            raise
+        else:
+            self._on_success(kind, self._clock() - started)
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _on_success(self, kind: str, latency: float) -> None:
+        self.success_count += 1
+        baseline = self._min_latency.get(kind)
+        if baseline is None or latency < baseline:
+            self._min_latency[kind] = latency
+        elif latency > baseline * self._latency_tolerance:
+            return  # 遅延が増えている間は上限を据え置く
+        self._set_limit(self._limit + self._increase / self._limit, "increase")
+
+    def _on_overload(self, started: float) -> None:
+        self.overload_count += 1
+        if started < self._last_decrease:
+            return  # 前回の減少前に送ったリクエストの失敗は反映済み
+        self._last_decrease = self._clock()
+        self.decrease_count += 1
+        self._set_limit(self._limit * self._decrease_factor, "overload")
+
+    def _set_limit(self, value: float, reason: str) -> None:
+        previous = self.limit
+        self._limit = min(self._max, max(self._min, value))
+        self.peak_limit = max(self.peak_limit, self._limit)
+        if self.limit != previous:
+            logger.info(
+                "Gemini concurrency limit changed",
+                extra={
+                    "limiter": self.name,
+                    "limit": self.limit,
+                    "previous": previous,
+                    "reason": reason,
+                    "in_flight": self._in_flight,
+                },
+            )
+
+    def stats(self) -> dict[str, Any]:
+        """ログ・メトリクス用の統計を返す。"""
+        return {
+            "limit": self.limit,
+            "peak_limit": int(self.peak_limit),
+            "max_in_flight": self.max_in_flight,
+            "success_count": self.success_count,
+            "overload_count": self.overload_count,
+            "decrease_count": self.decrease_count,
+            "total_wait_sec": round(self.total_wait_sec, 2),
+        }
+
+    def record_metrics(self, phase: str) -> None:
+        """フェーズ終了時点の統計をログと CloudWatch カスタムメトリクスに記録する。"""
+        stats = self.stats()
+        logger.info("Gemini concurrency stats", extra={"phase": phase, **stats})
+        metrics.add_metric(
+            name="GeminiConcurrencyLimit", unit=MetricUnit.Count, value=stats["limit"]
+        )
+        metrics.add_metric(
+            name="GeminiMaxInFlight", unit=MetricUnit.Count, value=stats["max_in_flight"]
+        )
+        metrics.add_metric(
+            name="GeminiOverloads", unit=MetricUnit.Count, value=stats["overload_count"]
+        )
+
+
+def create_gemini_limiter() -> AdaptiveLimiter:
+    """L3 / Post-L3 で共有する Gemini 用のリミッターを作る (実行中のイベントループで呼ぶ)。"""
+    return AdaptiveLimiter(
+        name="gemini",
+        initial=GEMINI_CONCURRENCY_INITIAL,
+        min_limit=GEMINI_CONCURRENCY_MIN,
+        max_limit=GEMINI_CONCURRENCY_MAX,
+        increase=GEMINI_CONCURRENCY_INCREASE,
+        decrease_factor=GEMINI_CONCURRENCY_DECREASE,
+        latency_tolerance=GEMINI_LATENCY_TOLERANCE,
+    )
@@ -3,13 +3,21 @@ AI Research OS — Batch Lambda Handler
 
 EventBridge (UTC 21:00 Mon-Fri) からトリガーされ、
 L1 → L2 → L3 → Post-L3 のキュレーションパイプラインを実行する。
+
+event に {"mode": "rescore_anchors"} を渡すと、パイプラインの代わりに
+アンカー変更後の L2 再スコアリングを実行する (batch.l2_selector.rescore_papers)。
+"after_id" (前回レスポンスの last_id) で途中から再開でき、"engine" で
+"in_process" / "sql" を選べる。
+パイプライン実行時に {"force_l3": true} を渡すと、分析済み・キャッシュ済みの論文も
+L3 で再分析する。
 """
 
 from __future__ import annotations
 
 import asyncio
-from typing import Any
+from typing import Any, get_args
 
+from batch.config import L2_RESCORE_TIME_MARGIN_MS
 from utils.logger import logger, metrics
 
 
@@ -22,10 +30,13 @@ def main(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
     logger.info("Batch handler invoked")
 
+    if event.get("mode") == "rescore_anchors":
+        return _rescore_anchors(event, context)
+
     try:
         from batch.pipeline import run_pipeline
 
-        log_entry = asyncio.run(run_pipeline())
+        log_entry = asyncio.run(run_pipeline(force_l3=bool(event.get("force_l3", False))))
 
         return {
             "statusCode": 200,
@@ -42,3 +53,31 @@ def main(event: dict[str, Any], context: Any) -> dict[str, Any]:
     except Exception:
         logger.error("Pipeline execution failed", exc_info=True)
         return {"statusCode": 500, "body": "Pipeline execution failed"}
+
+
+def _rescore_anchors(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """L2 再スコアリングを Lambda の残り時間が尽きる手前まで実行する。
+
+    done=False で返った場合は、body の last_id を after_id に渡して再実行する。
+    """
+    try:
+        from batch.l2_selector import ScoringEngine, rescore_papers
+        from utils.db import close_connections
+
+        engine = event.get("engine", "in_process")
+        if engine not in get_args(ScoringEngine.__value__):
+            return {"statusCode": 400, "body": f"Unknown scoring engine: {engine}"}
+        try:
+            result = rescore_papers(
+                after_id=int(event.get("after_id", 0)),
+                engine=engine,
+                should_continue=lambda: (
+                    context.get_remaining_time_in_millis() > L2_RESCORE_TIME_MARGIN_MS
+                ),
+            )
+        finally:
+            asyncio.run(close_connections())
+        return {"statusCode": 200, "body": result.model_dump()}
+    except Exception:
+        logger.error("L2 rescore failed", exc_info=True)
+        return {"statusCode": 500, "body": "L2 rescore failed"}
@@ -2,24 +2,36 @@
 AI Research OS — L1: arXiv API データ収集
 
 6カテゴリのクエリを順次実行し、Atom XML をパースして ArxivPaper リストを返す。
+非同期版 (collect_papers_async) はカテゴリ単位でキューに流し、L2 と並行に動かせる。
+各クエリは start オフセットでページングし、途中経過をチェックポイントに保存する。
 3秒間隔のレートリミットを遵守し、重複排除を行う。
 """
 
 from __future__ import annotations
 
+import asyncio
+import json
+import os
 import re
 import time
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta, timezone
+from collections.abc import Generator, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
 
+import httpx
 import requests
 
+from batch.arxiv_client import AsyncArxivClient, TokenBucket, get_arxiv_client
 from batch.config import (
     ARXIV_BASE_URL,
-    ARXIV_MAX_RETRIES,
+    ARXIV_CHECKPOINT_DIR,
+    ARXIV_MAX_PAGES_PER_QUERY,
     ARXIV_QUERIES,
     ARXIV_RATE_LIMIT_SEC,
-    ARXIV_TIMEOUT_SEC,
+    ARXIV_REPLAY_END_DATE,
+    ARXIV_STREAM_CHUNK_BYTES,
 )
 from utils.logger import logger
 from utils.models import ArxivPaper
@@ -31,6 +43,25 @@ NS = {
     "atom": "http://www.w3.org/2005/Atom",
     "arxiv": "http://arxiv.org/schemas/atom",
 }
+_ATOM = f"{{{NS['atom']}}}"
+_ARXIV = f"{{{NS['arxiv']}}}"
+_ENTRY_TAG = f"{_ATOM}entry"
+_ID_TAG = f"{_ATOM}id"
+_TITLE_TAG = f"{_ATOM}title"
+_SUMMARY_TAG = f"{_ATOM}summary"
+_AUTHOR_TAG = f"{_ATOM}author"
+_NAME_TAG = f"{_ATOM}name"
+_LINK_TAG = f"{_ATOM}link"
+_PUBLISHED_TAG = f"{_ATOM}published"
+_CATEGORY_TAG = f"{_ATOM}category"
+_PRIMARY_CATEGORY_TAG = f"{_ARXIV}primary_category"
+
+# ---------------------------------------------------------------------------
+# 正規表現 (エントリーごとに使うためモジュールロード時にコンパイル)
+# ---------------------------------------------------------------------------
+_NEW_ID_RE = re.compile(r"(\d{4}\.\d{4,5})(v\d+)?$")
+_OLD_ID_RE = re.compile(r"([a-z-]+/\d{7})(v\d+)?$")
+_WHITESPACE_RE = re.compile(r"\s+")
 
 
 # ---------------------------------------------------------------------------
@@ -39,11 +70,17 @@ NS = {
 def compute_date_range() -> tuple[str, str]:
     """前日 UTC 00:00 〜 当日 UTC 00:00 の日付範囲を返す。
 
+    ARXIV_REPLAY_END_DATE (YYYYMMDD) が設定されている場合はその日を当日とみなす
+    (記録済みレスポンスキャッシュのリプレイ用)。
+
     Returns:
         (start, end) タプル。YYYYMMDD0000 形式。
     """
-    now_utc = datetime.now(timezone.utc)
-    today = now_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+    if ARXIV_REPLAY_END_DATE:
+        today = datetime.strptime(ARXIV_REPLAY_END_DATE, "%Y%m%d").replace(tzinfo=UTC)
+    else:
+        now_utc = datetime.now(UTC)
+        today = now_utc.replace(hour=0, minute=0, second=0, microsecond=0)
     yesterday = today - timedelta(days=1)
     start = yesterday.strftime("%Y%m%d0000")
     end = today.strftime("%Y%m%d0000")
@@ -63,11 +100,11 @@ def extract_arxiv_id(id_url: str) -> str:
         "2402.12345" 形式の ID (バージョン番号を除去)
     """
     # URLの末尾から ID を取得し、バージョン番号 (vN) を除去
-    match = re.search(r"(\d{4}\.\d{4,5})(v\d+)?$", id_url)
+    match = _NEW_ID_RE.search(id_url)
     if match:
         return match.group(1)
     # 旧形式 ID のフォールバック (例: hep-ph/0601001)
-    match = re.search(r"([a-z-]+/\d{7})(v\d+)?$", id_url)
+    match = _OLD_ID_RE.search(id_url)
     if match:
         return match.group(1)
     return id_url.split("/")[-1]
@@ -84,166 +121,482 @@ def parse_entries(xml_text: str, category_id: int) -> list[ArxivPaper]:
         category_id: このクエリのカテゴリID
 
     Returns:
-        パースされた ArxivPaper のリスト
+        パースされた ArxivPaper のリスト (XML が不正な場合は空リスト)
     """
-    papers: list[ArxivPaper] = []
     try:
-        root = ET.fromstring(xml_text)
+        return list(iter_entries([xml_text.encode("utf-8")], category_id))
     except ET.ParseError:
-        logger.error("XML parse error", extra={"category_id": category_id})
-        return papers
+        return []
 
-    for entry in root.findall("atom:entry", NS):
-        try:
-            paper = _parse_single_entry(entry, category_id)
-            if paper is not None:
-                papers.append(paper)
-        except Exception:
-            logger.warning(
-                "Failed to parse entry",
-                extra={"category_id": category_id},
-                exc_info=True,
-            )
-    return papers
 
+class _AtomEntryParser:
+    """Atom XML をチャンク単位で受け取り、閉じた <entry> から順に ArxivPaper を返す。
 
-def _parse_single_entry(entry: ET.Element, category_id: int) -> ArxivPaper | None:
-    """1つの Atom entry 要素をパースする。"""
-    id_elem = entry.find("atom:id", NS)
-    if id_elem is None or id_elem.text is None:
-        return None
+    処理済みの entry 要素はツリーから取り除くため、レスポンス全体を
+    メモリに載せずにパースできる。同期・非同期どちらのストリームからも使う。
+    不正な XML の場合、feed / close は ET.ParseError を送出する。
+    """
 
-    arxiv_id = extract_arxiv_id(id_elem.text)
+    def __init__(self, category_id: int) -> None:
+        self.category_id = category_id
+        self._parser: ET.XMLPullParser[ET.Element] = ET.XMLPullParser(events=("start", "end"))
+        self._root: ET.Element | None = None
+
+    def feed(self, chunk: bytes) -> list[ArxivPaper]:
+        """チャンクを投入し、このチャンクで完結した entry を返す。"""
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> list[ArxivPaper]:
+        """ストリーム終端を通知し、残りの entry を返す。"""
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list[ArxivPaper]:
+        papers: list[ArxivPaper] = []
+        for event, elem in self._parser.read_events():  # type: ignore[misc]
+            if not isinstance(elem, ET.Element):
+                continue
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag != _ENTRY_TAG:
+                continue
+            try:
+                paper = _parse_single_entry(elem, self.category_id)
+                if paper is not None:
+                    papers.append(paper)
+            except Exception:
+                logger.warning(
+                    "Failed to parse entry",
+                    extra={"category_id": self.category_id},
+                    exc_info=True,
+                )
+            # 処理済み entry を解放してツリーの肥大化を防ぐ
+            elem.clear()
+            if self._root is not None:
+                self._root.remove(elem)
+        return papers
 
-    title_elem = entry.find("atom:title", NS)
-    title = _normalize_text(title_elem.text if title_elem is not None and title_elem.text else "")
 
-    summary_elem = entry.find("atom:summary", NS)
-    abstract = _normalize_text(
-        summary_elem.text if summary_elem is not None and summary_elem.text else ""
-    )
+def iter_entries(chunks: Iterable[bytes], category_id: int) -> Iterator[ArxivPaper]:
+    """Atom XML をチャンク単位でインクリメンタルにパースする。
 
-    # 著者
-    authors = []
-    for author_elem in entry.findall("atom:author", NS):
-        name_elem = author_elem.find("atom:name", NS)
-        if name_elem is not None and name_elem.text:
-            authors.append(name_elem.text)
+    <entry> の終了タグを読んだ時点で ArxivPaper を yield し、処理済みの要素は
+    ツリーから取り除く。レスポンス全体をメモリに載せないため、ページが大きくても
+    ピークメモリはほぼ一定になる。
 
-    # PDF URL
-    pdf_url: str | None = None
-    for link_elem in entry.findall("atom:link", NS):
-        if link_elem.get("title") == "pdf":
-            pdf_url = link_elem.get("href")
-            break
+    Args:
+        chunks: XML 本文のバイト列チャンク (HTTP レスポンスの iter_content など)
+        category_id: このクエリのカテゴリID
 
-    # 発行日
-    published_elem = entry.find("atom:published", NS)
-    published_text = (
-        published_elem.text if published_elem is not None and published_elem.text else ""
-    )
-    published_at = _parse_datetime(published_text)
+    Yields:
+        パースされた ArxivPaper
 
-    # カテゴリ
-    primary_cat_elem = entry.find("arxiv:primary_category", NS)
-    primary_category = (
-        primary_cat_elem.get("term", "unknown") if primary_cat_elem is not None else "unknown"
-    )
+    Raises:
+        ET.ParseError: XML が不正、または途中で切れている場合。
+            それまでに yield した entry もページとしては不完全なので、呼び出し側は
+            取得失敗として扱うこと
+    """
+    parser = _AtomEntryParser(category_id)
+    try:
+        for chunk in chunks:
+            yield from parser.feed(chunk)
+        yield from parser.close()
+    except ET.ParseError:
+        logger.error("XML parse error", extra={"category_id": category_id})
+        raise
 
-    all_categories = []
-    for cat_elem in entry.findall("atom:category", NS):
-        term = cat_elem.get("term")
-        if term:
-            all_categories.append(term)
+
+def _parse_single_entry(entry: ET.Element, category_id: int) -> ArxivPaper | None:
+    """1つの Atom entry 要素をパースする。
+
+    子要素を1回だけ走査し、タグで振り分ける (要素ごとの find/findall は行わない)。
+    同じタグが複数ある単一値フィールドは、従来どおり先頭の要素を採用する。
+    """
+    id_text: str | None = None
+    title: str | None = None
+    abstract: str | None = None
+    published_text: str | None = None
+    pdf_url: str | None = None
+    primary_category: str | None = None
+    authors: list[str] = []
+    all_categories: list[str] = []
+
+    for child in entry:
+        tag = child.tag
+        if tag == _AUTHOR_TAG:
+            for name_elem in child:
+                if name_elem.tag == _NAME_TAG:
+                    if name_elem.text:
+                        authors.append(name_elem.text)
+                    break
+        elif tag == _CATEGORY_TAG:
+            term = child.get("term")
+            if term:
+                all_categories.append(term)
+        elif tag == _LINK_TAG and pdf_url is None and child.get("title") == "pdf":
+            pdf_url = child.get("href")
+        elif tag == _ID_TAG and id_text is None:
+            id_text = child.text or ""
+        elif tag == _TITLE_TAG and title is None:
+            title = _normalize_text(child.text or "")
+        elif tag == _SUMMARY_TAG and abstract is None:
+            abstract = _normalize_text(child.text or "")
+        elif tag == _PUBLISHED_TAG and published_text is None:
+            published_text = child.text or ""
+        elif tag == _PRIMARY_CATEGORY_TAG and primary_category is None:
+            primary_category = child.get("term", "unknown")
+
+    if not id_text:
+        return None
 
     return ArxivPaper(
-        arxiv_id=arxiv_id,
-        title=title,
-        abstract=abstract,
+        arxiv_id=extract_arxiv_id(id_text),
+        title=title or "",
+        abstract=abstract or "",
         authors=authors,
         pdf_url=pdf_url,
-        primary_category=primary_category,
+        primary_category=primary_category if primary_category is not None else "unknown",
         all_categories=all_categories,
-        published_at=published_at,
+        published_at=_parse_datetime(published_text or ""),
         matched_queries=[category_id],
     )
 
 
 def _normalize_text(text: str) -> str:
     """改行・余分な空白を正規化する。"""
-    return re.sub(r"\s+", " ", text).strip()
+    return _WHITESPACE_RE.sub(" ", text).strip()
 
 
 def _parse_datetime(text: str) -> datetime:
     """ISO 8601 形式の日付文字列をパースする。"""
     if not text:
-        return datetime.now(timezone.utc)
+        return datetime.now(UTC)
     # arXiv の形式: "2026-02-11T12:00:00Z"
     text = text.strip()
     try:
         return datetime.fromisoformat(text.replace("Z", "+00:00"))
     except ValueError:
-        return datetime.now(timezone.utc)
+        return datetime.now(UTC)
 
 
 # ---------------------------------------------------------------------------
 # 単一クエリ実行
 # ---------------------------------------------------------------------------
-def _fetch_query(
+def _build_query_url(
     query_template: str,
     max_results: int,
     start_date: str,
     end_date: str,
+    start: int = 0,
 ) -> str:
-    """arXiv API に1回リクエストを送信する。リトライ付き。"""
+    """日付範囲とページ位置を指定した arXiv API の URL を組み立てる。"""
     search_query = f"{query_template}+AND+submittedDate:[{start_date}+TO+{end_date}]"
-    params = f"search_query={search_query}&start=0&max_results={max_results}"
+    params = f"search_query={search_query}&start={start}&max_results={max_results}"
     params += "&sortBy=submittedDate&sortOrder=descending"
-    url = f"{ARXIV_BASE_URL}?{params}"
-
-    for attempt in range(ARXIV_MAX_RETRIES):
-        try:
-            response = requests.get(url, timeout=ARXIV_TIMEOUT_SEC)
-            if response.status_code == 200:
-                return response.text
-            if response.status_code == 503:
-                wait = ARXIV_RATE_LIMIT_SEC * (3**attempt)
-                logger.warning(
-                    "arXiv 503, retrying",
-                    extra={"attempt": attempt + 1, "wait_sec": wait},
-                )
-                time.sleep(wait)
-                continue
-            logger.error(
-                "arXiv API error",
-                extra={"status_code": response.status_code, "url": url[:200]},
+    return f"{ARXIV_BASE_URL}?{params}"
+
+
+def _open_query_stream(
+    query_template: str,
+    max_results: int,
+    start_date: str,
+    end_date: str,
+    start: int = 0,
+) -> Generator[bytes] | None:
+    """arXiv API にストリーミングリクエストを送信し、本文のチャンクイテレーターを返す。
+
+    ステータスコードの確認までを共有クライアント (リトライ・レートリミット・
+    レスポンスキャッシュ付き) が行う。失敗時は None を返す。
+    """
+    url = _build_query_url(query_template, max_results, start_date, end_date, start)
+    return get_arxiv_client().iter_body(url, ARXIV_STREAM_CHUNK_BYTES)
+
+
+# ---------------------------------------------------------------------------
+# ページング用チェックポイント
+# ---------------------------------------------------------------------------
+@dataclass
+class QueryCheckpoint:
+    """1クエリ分のページング進捗。"""
+
+    next_start: int = 0
+    done: bool = False
+    papers: list[ArxivPaper] = field(default_factory=list)
+
+
+def _checkpoint_path(category_id: int, start_date: str, end_date: str) -> Path:
+    """クエリと日付範囲ごとのチェックポイントファイルパスを返す。"""
+    return Path(ARXIV_CHECKPOINT_DIR) / f"{start_date}_{end_date}_cat{category_id}.json"
+
+
+def _load_checkpoint(category_id: int, start_date: str, end_date: str) -> QueryCheckpoint:
+    """チェックポイントを読み込む。存在しない・壊れている場合は初期状態を返す。"""
+    path = _checkpoint_path(category_id, start_date, end_date)
+    if not path.exists():
+        return QueryCheckpoint()
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return QueryCheckpoint(
+            next_start=int(data["next_start"]),
+            done=bool(data["done"]),
+            papers=[ArxivPaper.model_validate(p) for p in data["papers"]],
+        )
+    except Exception:
+        logger.warning(
+            "Invalid L1 checkpoint, starting over",
+            extra={"path": str(path)},
+            exc_info=True,
+        )
+        return QueryCheckpoint()
+
+
+def _save_checkpoint(
+    category_id: int,
+    start_date: str,
+    end_date: str,
+    checkpoint: QueryCheckpoint,
+) -> None:
+    """チェックポイントをアトミックに書き込む。書き込み失敗は収集を止めない。"""
+    path = _checkpoint_path(category_id, start_date, end_date)
+    payload = {
+        "next_start": checkpoint.next_start,
+        "done": checkpoint.done,
+        "papers": [p.model_dump(mode="json") for p in checkpoint.papers],
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Failed to save L1 checkpoint", extra={"path": str(path)}, exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# 1クエリ分のページング取得
+# ---------------------------------------------------------------------------
+def _start_harvest(category_id: int, start_date: str, end_date: str) -> QueryCheckpoint:
+    """チェックポイントを読み込み、取得を開始 (または再開) する。"""
+    checkpoint = _load_checkpoint(category_id, start_date, end_date)
+    if checkpoint.done:
+        logger.info(
+            "L1 query restored from checkpoint",
+            extra={"category_id": category_id, "count": len(checkpoint.papers)},
+        )
+    elif checkpoint.next_start > 0:
+        logger.info(
+            "L1 query resuming from checkpoint",
+            extra={"category_id": category_id, "start": checkpoint.next_start},
+        )
+    return checkpoint
+
+
+def _record_page(
+    category_id: int,
+    start_date: str,
+    end_date: str,
+    checkpoint: QueryCheckpoint,
+    page: list[ArxivPaper],
+    page_size: int,
+) -> None:
+    """取得した1ページをチェックポイントに反映して保存する。
+
+    取得件数がページサイズを下回った時点、または ARXIV_MAX_PAGES_PER_QUERY
+    ページに達した時点でクエリ完了とする。
+    """
+    checkpoint.papers.extend(page)
+    checkpoint.next_start += page_size
+    if len(page) < page_size:
+        checkpoint.done = True
+    elif checkpoint.next_start >= page_size * ARXIV_MAX_PAGES_PER_QUERY:
+        checkpoint.done = True
+        logger.warning(
+            "L1 query reached max pages, results may be truncated",
+            extra={"category_id": category_id, "max_pages": ARXIV_MAX_PAGES_PER_QUERY},
+        )
+    _save_checkpoint(category_id, start_date, end_date, checkpoint)
+
+
+def _fetch_page(
+    category_id: int,
+    query_template: str,
+    page_size: int,
+    start_date: str,
+    end_date: str,
+    start: int,
+) -> list[ArxivPaper] | None:
+    """1ページをストリーミング取得・パースする。取得失敗時は None を返す。
+
+    本文が途中で切れていた (XML が閉じていない) 場合も取得失敗とする。
+    途中までの entry で件数を判定するとクエリ完了と誤認するため、ページは捨てて
+    キャッシュ済みの本文も削除する。
+    """
+    chunks = _open_query_stream(query_template, page_size, start_date, end_date, start=start)
+    if chunks is None:
+        return None
+    try:
+        return list(iter_entries(chunks, category_id))
+    except ET.ParseError:
+        get_arxiv_client().discard(
+            _build_query_url(query_template, page_size, start_date, end_date, start)
+        )
+        return None
+    except requests.RequestException:
+        logger.warning("arXiv stream broken", exc_info=True)
+        return None
+    finally:
+        chunks.close()
+
+
+def _harvest_query(
+    category_id: int,
+    query_template: str,
+    page_size: int,
+    start_date: str,
+    end_date: str,
+) -> list[ArxivPaper]:
+    """start オフセットを進めながら1クエリ分の全ページを取得する。
+
+    ページごとにチェックポイントを保存するため、途中で失敗・タイムアウトした場合も
+    再実行時に続きのオフセットから再開できる。
+    """
+    checkpoint = _start_harvest(category_id, start_date, end_date)
+    while not checkpoint.done:
+        page = _fetch_page(
+            category_id, query_template, page_size, start_date, end_date, checkpoint.next_start
+        )
+        if page is None:
+            # 取得失敗: 現在のオフセットのまま中断し、再実行時にここから再開する
+            logger.warning(
+                "L1 query interrupted",
+                extra={"category_id": category_id, "start": checkpoint.next_start},
+            )
+            break
+        _record_page(category_id, start_date, end_date, checkpoint, page, page_size)
+    return checkpoint.papers
+
+
+async def _fetch_page_async(
+    client: AsyncArxivClient,
+    category_id: int,
+    query_template: str,
+    page_size: int,
+    start_date: str,
+    end_date: str,
+    start: int,
+) -> list[ArxivPaper] | None:
+    """_fetch_page の非同期版。取得失敗 (途中で切れた本文を含む) 時は None を返す。"""
+    url = _build_query_url(query_template, page_size, start_date, end_date, start)
+    chunks = await client.iter_body(url, ARXIV_STREAM_CHUNK_BYTES)
+    if chunks is None:
+        return None
+    parser = _AtomEntryParser(category_id)
+    papers: list[ArxivPaper] = []
+    try:
+        async for chunk in chunks:
+            papers.extend(parser.feed(chunk))
+        papers.extend(parser.close())
+    except ET.ParseError:
+        logger.error("XML parse error", extra={"category_id": category_id})
+        client.discard(url)
+        return None
+    except httpx.HTTPError:
+        logger.warning("arXiv stream broken", exc_info=True)
+        return None
+    finally:
+        await chunks.aclose()
+    return papers
+
+
+async def _harvest_query_async(
+    client: AsyncArxivClient,
+    category_id: int,
+    query_template: str,
+    page_size: int,
+    start_date: str,
+    end_date: str,
+) -> list[ArxivPaper]:
+    """_harvest_query の非同期版。チェックポイントは同期版と共通。"""
+    checkpoint = _start_harvest(category_id, start_date, end_date)
+    while not checkpoint.done:
+        page = await _fetch_page_async(
+            client,
+            category_id,
+            query_template,
+            page_size,
+            start_date,
+            end_date,
+            checkpoint.next_start,
+        )
+        if page is None:
+            logger.warning(
+                "L1 query interrupted",
+                extra={"category_id": category_id, "start": checkpoint.next_start},
             )
-            return ""
-        except requests.Timeout:
-            logger.warning("arXiv timeout", extra={"attempt": attempt + 1})
-            if attempt < ARXIV_MAX_RETRIES - 1:
-                time.sleep(ARXIV_RATE_LIMIT_SEC)
-        except requests.RequestException:
-            logger.error("arXiv request failed", exc_info=True)
-            return ""
-    return ""
+            break
+        _record_page(category_id, start_date, end_date, checkpoint, page, page_size)
+    return checkpoint.papers
 
 
 # ---------------------------------------------------------------------------
 # 重複排除
 # ---------------------------------------------------------------------------
 def deduplicate(papers: list[ArxivPaper]) -> list[ArxivPaper]:
-    """arXiv ID で重複排除し、matched_queries をマージする。"""
-    seen: dict[str, ArxivPaper] = {}
+    """arXiv ID で重複排除し、matched_queries をマージする。
+
+    ID ごとに初出の論文と (重複した場合のみ) クエリ ID の集合を集め、
+    最後に初出の論文の matched_queries を1回だけ書き換える。
+    論文モデルは新たに作らない (入力の初出の論文をそのまま出力に使う)。
+    出力順は初出順、matched_queries は昇順。
+    """
+    first_seen: dict[str, ArxivPaper] = {}
+    # 2回以上出現した ID のみ集合を持つ (大半を占める単独ヒットでは確保しない)
+    merged_ids: dict[str, set[int]] = {}
     for paper in papers:
-        if paper.arxiv_id not in seen:
-            seen[paper.arxiv_id] = paper
-        else:
-            # matched_queries をマージ
-            existing = seen[paper.arxiv_id]
-            merged_queries = list(set(existing.matched_queries + paper.matched_queries))
-            seen[paper.arxiv_id] = existing.model_copy(update={"matched_queries": merged_queries})
-    return list(seen.values())
+        arxiv_id = paper.arxiv_id
+        first = first_seen.setdefault(arxiv_id, paper)
+        if first is paper:
+            if len(paper.matched_queries) > 1:
+                # 複数クエリ分を持つ入力 (再実行時など) も昇順にそろえる
+                merged_ids[arxiv_id] = set(paper.matched_queries)
+            continue
+        ids = merged_ids.get(arxiv_id)
+        if ids is None:
+            ids = merged_ids[arxiv_id] = set(first.matched_queries)
+        ids.update(paper.matched_queries)
+
+    for arxiv_id, ids in merged_ids.items():
+        first_seen[arxiv_id].matched_queries = sorted(ids)
+    return list(first_seen.values())
+
+
+# ---------------------------------------------------------------------------
+# レートリミット統計
+# ---------------------------------------------------------------------------
+def _rate_limit_stats(
+    limiter: TokenBucket,
+    requests_before: int,
+    wait_before: float,
+    started: float,
+) -> dict[str, float | int]:
+    """収集開始時点からのリクエスト数・待ち時間・短縮時間の推定値を集計する。
+
+    waited_sec は実測値。estimated_saved_sec は「旧実装ならリクエストごとに固定で
+    ARXIV_RATE_LIMIT_SEC 待っていた」という仮定との差による推定値で、
+    実測ではないため負にはしない。
+    """
+    request_count = limiter.reserved_count - requests_before
+    waited_sec = limiter.total_wait_sec - wait_before
+    estimated_saved_sec = max(0.0, request_count * ARXIV_RATE_LIMIT_SEC - waited_sec)
+    return {
+        "requests": request_count,
+        "waited_sec": round(waited_sec, 2),
+        "estimated_saved_sec": round(estimated_saved_sec, 2),
+        "elapsed_sec": round(time.monotonic() - started, 2),
+    }
 
 
 # ---------------------------------------------------------------------------
@@ -252,7 +605,10 @@ def deduplicate(papers: list[ArxivPaper]) -> list[ArxivPaper]:
 def collect_papers() -> list[ArxivPaper]:
     """L1: arXiv API から論文を収集する。
 
-    6カテゴリのクエリを順次実行し、重複排除後のリストを返す。
+    6カテゴリのクエリを順次ページング実行し、重複排除後のリストを返す。
+    リクエスト間隔は共有クライアントのトークンバケットが「開始時刻の間隔」で
+    制御するため、前のレスポンスのダウンロード・パースにかかった時間は
+    次のスロットまでの待ち時間に算入され、最後のクエリの後に待つこともない。
 
     Returns:
         重複排除済みの ArxivPaper リスト
@@ -265,15 +621,18 @@ def collect_papers() -> list[ArxivPaper]:
 
     all_papers: list[ArxivPaper] = []
     query_stats: list[dict[str, object]] = []
+    limiter = get_arxiv_client().limiter
+    requests_before = limiter.reserved_count
+    wait_before = limiter.total_wait_sec
+    started = time.monotonic()
 
     for q in ARXIV_QUERIES:
         category_id = int(q["category_id"])
         category_name = str(q["category_name"])
         query_template = str(q["query"])
-        max_results = int(q["max_results"])
+        page_size = int(q["max_results"])
 
-        xml_text = _fetch_query(query_template, max_results, start_date, end_date)
-        papers = parse_entries(xml_text, category_id) if xml_text else []
+        papers = _harvest_query(category_id, query_template, page_size, start_date, end_date)
 
         query_stats.append(
             {
@@ -284,9 +643,6 @@ def collect_papers() -> list[ArxivPaper]:
 
         all_papers.extend(papers)
 
-        # レートリミット遵守
-        time.sleep(ARXIV_RATE_LIMIT_SEC)
-
     # 重複排除
     total_raw = len(all_papers)
     deduped = deduplicate(all_papers)
@@ -298,7 +654,71 @@ def collect_papers() -> list[ArxivPaper]:
             "after_dedup": len(deduped),
             "date_range": {"start": start_date, "end": end_date},
             "queries": query_stats,
+            "rate_limit": _rate_limit_stats(limiter, requests_before, wait_before, started),
         },
     )
 
     return deduped
+
+
+async def collect_papers_async(queue: asyncio.Queue[list[ArxivPaper] | None]) -> None:
+    """L1: arXiv API から論文を非同期に収集し、カテゴリ単位でキューに流す。
+
+    1カテゴリ分の取得が終わるたびにその論文リストを queue に put するので、
+    受け取り側 (L2 Embedding) は残りのカテゴリのダウンロード中に処理を始められる。
+    全カテゴリの終了後、例外で中断した場合も含めて必ず None を put して終端を知らせる。
+    カテゴリ間の重複排除は受け取り側で行う。
+
+    Args:
+        queue: カテゴリごとの ArxivPaper リストを受け渡すキュー
+    """
+    try:
+        await _collect_into_queue(queue)
+    finally:
+        # 例外で中断した場合も受け取り側が待ち続けないよう終端を送る
+        await queue.put(None)
+
+
+async def _collect_into_queue(queue: asyncio.Queue[list[ArxivPaper] | None]) -> None:
+    """collect_papers_async の本体。終端 (None) の送信は呼び出し側が行う。"""
+    start_date, end_date = compute_date_range()
+    logger.info(
+        "L1 collection started",
+        extra={"start": start_date, "end": end_date, "mode": "async"},
+    )
+
+    query_stats: list[dict[str, object]] = []
+    total_raw = 0
+    shared = get_arxiv_client()
+    limiter = shared.limiter
+    requests_before = limiter.reserved_count
+    wait_before = limiter.total_wait_sec
+    started = time.monotonic()
+    client = AsyncArxivClient(limiter, cache=shared.cache)
+
+    try:
+        for q in ARXIV_QUERIES:
+            category_id = int(q["category_id"])
+            papers = await _harvest_query_async(
+                client,
+                category_id,
+                str(q["query"]),
+                int(q["max_results"]),
+                start_date,
+                end_date,
+            )
+            query_stats.append({"category": str(q["category_name"]), "raw_count": len(papers)})
+            total_raw += len(papers)
+            await queue.put(papers)
+    finally:
+        await client.aclose()
+
+    logger.info(
+        "L1 collection completed",
+        extra={
+            "total_raw": total_raw,
+            "date_range": {"start": start_date, "end": end_date},
+            "queries": query_stats,
+            "rate_limit": _rate_limit_stats(limiter, requests_before, wait_before, started),
+        },
+    )
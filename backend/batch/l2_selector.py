@@ -6,195 +6,864 @@ OpenAI Embedding で論文ベクトルを生成し、DB に挿入後、
 """
 
 from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
 import json
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Literal
 
+import numpy as np
+import numpy.typing as npt
+import openai
+import psycopg
 from openai import OpenAI
 
 from batch.config import (
-    ANCHOR_COUNT,
+    ARXIV_QUERIES,
+    BACKOFF_BASE_SEC,
+    EMBEDDING_CHARS_PER_TOKEN,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MAX_BATCH_INPUTS,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_MAX_RETRIES,
     EMBEDDING_MODEL,
     IMPORTANCE_WEIGHT_HIT_COUNT,
     IMPORTANCE_WEIGHT_MATCHED_QUERIES,
     IMPORTANCE_WEIGHT_MAX_SCORE,
+    L2_ANCHOR_POOL_TOP_K,
+    L2_DUPLICATE_EF_SEARCH,
+    L2_DUPLICATE_LOOKBACK_DAYS,
+    L2_DUPLICATE_THRESHOLD,
+    L2_RESCORE_CHUNK_SIZE,
     L2_THRESHOLD,
+    L2_UPDATE_CHUNK_SIZE,
 )
 from utils.db import get_sync_connection
 from utils.logger import logger
-from utils.models import ArxivPaper, L2Paper, L2Result
+from utils.models import ArxivPaper, L2Paper, L2RescoreResult, L2Result
 from utils.secrets import get_openai_api_key
 
+# Embedding は float32 で保持する。Matrix は (論文数, EMBEDDING_DIMENSIONS) の連続領域
+type Vector = npt.NDArray[np.float32]
+type Matrix = npt.NDArray[np.float32]
+# L2 スコアリングの計算方式 (in_process: 保持している Embedding を NumPy で / sql: DB で1文)
+type ScoringEngine = Literal["in_process", "sql"]
+
+
+# ---------------------------------------------------------------------------
+# Embedding キャッシュ (embedding_cache テーブル)
+# ---------------------------------------------------------------------------
+def _embedding_cache_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    """モデル名 + 入力テキストの SHA-256 を返す。"""
+    return hashlib.sha256(f"{model}\n{text}".encode()).hexdigest()
+
+
+def _parse_vector(value: str | Sequence[float]) -> Vector:
+    """pgvector の値を float32 のベクトルに変換する。
+
+    アダプター登録済みの接続では ndarray がそのまま返るが、未登録の場合の
+    '[0.1,0.2,...]' 形式のテキストも受け付ける。
+    """
+    if isinstance(value, str):
+        return np.array(json.loads(value), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _lookup_cached_embeddings(keys: list[str]) -> dict[str, Vector]:
+    """キャッシュ済みの Embedding を1クエリで取得する (ベクトルはバイナリ形式で受信)。"""
+    conn = get_sync_connection()
+    try:
+        with conn.cursor(binary=True) as cur:
+            cur.execute(
+                "SELECT content_hash, embedding FROM embedding_cache WHERE content_hash = ANY(%s)",
+                (keys,),
+            )
+            rows = cur.fetchall()
+    except psycopg.Error:
+        conn.rollback()
+        raise
+    return {str(r[0]): _parse_vector(r[1]) for r in rows}
+
+
+def _store_cached_embeddings(entries: dict[str, Vector]) -> None:
+    """新たに生成した Embedding をキャッシュに保存する。"""
+    conn = get_sync_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                INSERT INTO embedding_cache (content_hash, model, embedding)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (content_hash) DO NOTHING
+                """,
+                [(key, EMBEDDING_MODEL, vector) for key, vector in entries.items()],
+            )
+        conn.commit()
+    except psycopg.Error:
+        conn.rollback()
+        raise
+
 
 # ---------------------------------------------------------------------------
 # Embedding 生成 (バッチ)
 # ---------------------------------------------------------------------------
+def _estimate_tokens(text: str) -> int:
+    """トークン数を文字数から保守的に推定する。"""
+    return len(text) // EMBEDDING_CHARS_PER_TOKEN + 1
+
+
+def _pack_batches(texts: list[str]) -> list[list[int]]:
+    """入力数と推定トークン数の上限に収まるよう、テキストの添字をバッチに詰める。
+
+    1件で上限を超えるテキストは単独のバッチにする (API 側で切り詰めない限り
+    そのバッチだけが失敗する)。
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = _estimate_tokens(text)
+        if current and (
+            len(current) >= EMBEDDING_MAX_BATCH_INPUTS
+            or current_tokens + tokens > EMBEDDING_MAX_BATCH_TOKENS
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _decode_embedding(value: str | Sequence[float]) -> Vector:
+    """API レスポンスの Embedding (base64 エンコードされた little-endian float32) を復号する。"""
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype="<f4").astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _create_embeddings(texts: list[str], client: OpenAI) -> Matrix:
+    """1回の API 呼び出しで (len(texts), 次元数) の行列を取得する。
+
+    base64 形式で受け取り、Python の float リストを経由せずに float32 行列にする。
+    """
+    response = client.embeddings.create(
+        input=texts, model=EMBEDDING_MODEL, encoding_format="base64"
+    )
+    return np.stack([_decode_embedding(d.embedding) for d in response.data])
+
+
+def _is_transient_embedding_error(exc: BaseException) -> bool:
+    """リトライで回復しうるエラー (429 / タイムアウト / 接続エラー / 5xx) なら True。"""
+    if isinstance(exc, openai.RateLimitError | openai.APIConnectionError):
+        return True  # APITimeoutError は APIConnectionError のサブクラス
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _request_batch(texts: list[str], client: OpenAI) -> Matrix:
+    """1バッチ分の Embedding を取得する。一時的なエラーのときだけこのバッチをリトライする。
+
+    認証エラーや入力サイズ超過などの 4xx はリトライしても回復しないため、そのまま送出する。
+    """
+    for attempt in range(EMBEDDING_MAX_RETRIES - 1):
+        try:
+            return _create_embeddings(texts, client)
+        except Exception as e:
+            if not _is_transient_embedding_error(e):
+                raise
+            wait = BACKOFF_BASE_SEC * (2**attempt)
+            logger.warning(
+                "Embedding API error, retrying",
+                extra={"count": len(texts), "attempt": attempt + 1, "wait_sec": wait},
+                exc_info=True,
+            )
+            time.sleep(wait)
+    # 最後の試行の失敗は呼び出し側に伝える
+    return _create_embeddings(texts, client)
+
+
+def _request_embeddings(texts: list[str], client: OpenAI) -> Matrix:
+    """OpenAI Embedding API を呼び出す。
+
+    推定トークン数でバッチに詰め、EMBEDDING_CONCURRENCY 並列で送信する。
+    戻り値は texts と同じ行順の float32 行列。
+    """
+    batches = _pack_batches(texts)
+    vectors: Matrix = np.empty((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=min(EMBEDDING_CONCURRENCY, len(batches) or 1)) as pool:
+        futures = {
+            pool.submit(_request_batch, [texts[i] for i in batch], client): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            vectors[futures[future]] = future.result()
+    return vectors
+
+
 def _generate_embeddings(
     papers: list[ArxivPaper],
     client: OpenAI,
-) -> list[list[float]]:
-    """Title + Abstract を結合して Embedding を一括生成する。
+) -> Matrix:
+    """Title + Abstract を結合して Embedding を一括生成し、論文順の float32 行列で返す。
 
-    OpenAI Embedding API はバッチ入力をサポートしているため、
-    1回の API コールで全論文の Embedding を取得する。
+    embedding_cache を一括で引き、キャッシュにないテキストだけを OpenAI に
+    バッチで問い合わせて保存する。キャッシュの読み書きに失敗しても
+    Embedding の生成は続ける。
     """
     texts = [f"{p.title} {p.abstract}" for p in papers]
+    keys = [_embedding_cache_key(t) for t in texts]
 
-    # OpenAI API のバッチ上限 (2048) を超える場合は分割
-    batch_size = 2048
-    all_embeddings: list[list[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        response = client.embeddings.create(input=batch, model=EMBEDDING_MODEL)
-        all_embeddings.extend([d.embedding for d in response.data])
+    try:
+        vectors = _lookup_cached_embeddings(list(set(keys)))
+    except Exception:
+        logger.warning("Embedding cache lookup failed", exc_info=True)
+        vectors = {}
 
-    return all_embeddings
+    # 同一テキストは1回だけ問い合わせる
+    missing = {key: text for key, text in zip(keys, texts, strict=True) if key not in vectors}
+    hits = sum(1 for key in keys if key in vectors)
+    if missing:
+        matrix = _request_embeddings(list(missing.values()), client)
+        generated = dict(zip(missing, matrix, strict=True))
+        try:
+            _store_cached_embeddings(generated)
+        except Exception:
+            logger.warning("Embedding cache store failed", exc_info=True)
+        vectors.update(generated)
+
+    logger.info(
+        "Embedding cache lookup",
+        extra={"hits": hits, "misses": len(keys) - hits, "requested": len(missing)},
+    )
+    embeddings: Matrix = np.empty((len(keys), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    for i, key in enumerate(keys):
+        embeddings[i] = vectors[key]
+    return embeddings
+
+
+# ---------------------------------------------------------------------------
+# L1 と並行した Embedding 生成
+# ---------------------------------------------------------------------------
+async def embed_collected_batches(
+    queue: asyncio.Queue[list[ArxivPaper] | None],
+) -> tuple[list[ArxivPaper], dict[str, Vector]]:
+    """L1 からカテゴリ単位で届く論文を、届いた順に Embedding する。
+
+    残りのカテゴリのダウンロードと重ねて OpenAI を呼ぶため、DB・API 呼び出しは
+    スレッドで実行してイベントループを塞がない。papers テーブルに登録済みの論文は
+    Embedding しない。Embedding に失敗したバッチはログだけ残して読み飛ばし、
+    run_l2 で改めて計算させる。
+    キューは終端 (None) まで必ず読み切る。
+
+    Returns:
+        (受け取った全論文 (重複排除前), arxiv_id → Embedding)
+    """
+    raw_papers: list[ArxivPaper] = []
+    embeddings: dict[str, Vector] = {}
+    known: set[str] = set()
+    client: OpenAI | None = None
+
+    while (batch := await queue.get()) is not None:
+        raw_papers.extend(batch)
+        # 他カテゴリで計算済み・登録済みの論文 (クロスリスト) は再計算しない
+        pending = {
+            p.arxiv_id: p for p in batch if p.arxiv_id not in embeddings and p.arxiv_id not in known
+        }
+        if not pending:
+            continue
+        try:
+            known |= await asyncio.to_thread(_fetch_known_ids, list(pending))
+        except Exception:
+            logger.warning("Known paper lookup failed", exc_info=True)
+        pending = {arxiv_id: p for arxiv_id, p in pending.items() if arxiv_id not in known}
+        if not pending:
+            continue
+        try:
+            if client is None:
+                client = OpenAI(api_key=get_openai_api_key())
+            vectors = await asyncio.to_thread(_generate_embeddings, list(pending.values()), client)
+        except Exception:
+            logger.warning(
+                "Embedding for L1 batch failed, deferring to L2",
+                extra={"count": len(pending)},
+                exc_info=True,
+            )
+            continue
+        embeddings.update(zip(pending, vectors, strict=True))
+
+    logger.info(
+        "L2 embeddings overlapped with L1",
+        extra={"received": len(raw_papers), "embedded": len(embeddings), "known": len(known)},
+    )
+    return raw_papers, embeddings
+
+
+# ---------------------------------------------------------------------------
+# 登録済み論文の判定 (日をまたいだ重複排除)
+# ---------------------------------------------------------------------------
+def _fetch_known_ids(arxiv_ids: list[str]) -> set[str]:
+    """papers テーブルに登録済みで L2 スコアリング済みの arxiv_id を1クエリで返す。
+
+    L2 結果の書き込み前に失敗した実行の残り (max_score が NULL) は含めず、
+    新規論文と同じくスコアリングし直させる。
+    """
+    if not arxiv_ids:
+        return set()
+    conn = get_sync_connection()
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT arxiv_id FROM papers WHERE arxiv_id = ANY(%s) AND max_score IS NOT NULL",
+            (arxiv_ids,),
+        )
+        rows = cur.fetchall()
+    return {str(r[0]) for r in rows}
+
+
+def _fetch_unanalyzed_results(arxiv_ids: list[str], force: bool = False) -> list[L2Result]:
+    """登録済み論文のうち、L2 を通過したが L3 の結果が無いものの L2 結果を返す。
+
+    L3 / Post-L3 が失敗した実行の論文を、再実行時に L3 へ渡し直すために使う。
+    force=True なら L3 分析済みの論文も返す (再分析用)。重複と判定済みの論文は除く。
+    """
+    if not arxiv_ids:
+        return []
+    conn = get_sync_connection()
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT arxiv_id, max_score, best_category_id, hit_count, importance_score, all_scores
+            FROM papers
+            WHERE arxiv_id = ANY(%s)
+              AND max_score >= %s
+              AND (is_relevant IS NULL OR %s)
+              AND duplicate_of IS NULL
+            """,
+            (arxiv_ids, L2_THRESHOLD, force),
+        )
+        rows = cur.fetchall()
+    return [
+        L2Result(
+            arxiv_id=r[0],
+            max_score=r[1],
+            best_category_id=r[2],
+            hit_count=r[3],
+            importance_score=r[4],
+            all_scores=r[5] or {},
+            passed=True,
+        )
+        for r in rows
+    ]
+
+
+def _merge_known_papers(papers: list[ArxivPaper]) -> None:
+    """登録済み論文の matched_queries に今回ヒットしたクエリを追加する。
+
+    既に全クエリを含む行は更新しない (updated_at も変えない)。
+    """
+    conn = get_sync_connection()
+    with conn.cursor() as cur:
+        cur.executemany(
+            """
+            UPDATE papers SET
+                matched_queries = (
+                    SELECT ARRAY(
+                        SELECT DISTINCT q
+                        FROM unnest(papers.matched_queries || %(queries)s::int[]) AS q
+                        ORDER BY q
+                    )
+                ),
+                updated_at = NOW()
+            WHERE arxiv_id = %(arxiv_id)s
+              AND NOT (matched_queries @> %(queries)s::int[])
+            """,
+            [{"arxiv_id": p.arxiv_id, "queries": p.matched_queries} for p in papers],
+        )
+    conn.commit()
+
+
+# ---------------------------------------------------------------------------
+# 近似重複の検出 (再投稿・ほぼ同一の論文)
+# ---------------------------------------------------------------------------
+def _fetch_recent_duplicates(arxiv_ids: list[str], embeddings: Matrix) -> dict[str, str]:
+    """各論文に最も近い登録済み論文を pgvector で引き、重複と判定したものを返す。
+
+    比較対象は直近 L2_DUPLICATE_LOOKBACK_DAYS 日に公開された、重複でない論文
+    (重複元は常に最初に登録された論文を指す)。論文ごとの最近傍探索
+    (ORDER BY embedding <=> ... LIMIT 1、HNSW インデックスを使う) を LATERAL JOIN で
+    1文にまとめるため、登録済み論文の Embedding は Python 側に読み込まない。
+    絞り込み条件は HNSW の候補に対する後段フィルタなので、hnsw.ef_search を
+    L2_DUPLICATE_EF_SEARCH に上げて探索する (このトランザクション内だけ変更する)。
+
+    Returns:
+        重複と判定した論文の arxiv_id → 重複元の arxiv_id
+    """
+    conn = get_sync_connection()
+    with conn.cursor() as cur:
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(L2_DUPLICATE_EF_SEARCH),))
+        cur.execute(
+            """
+            SELECT q.arxiv_id, n.arxiv_id
+            FROM unnest(%(arxiv_ids)s::text[], %(embeddings)b::vector[]) AS q(arxiv_id, embedding)
+            CROSS JOIN LATERAL (
+                SELECT p.arxiv_id, p.embedding <=> q.embedding AS distance
+                FROM papers p
+                WHERE p.embedding IS NOT NULL
+                  AND p.duplicate_of IS NULL
+                  AND p.published_at >= NOW() - make_interval(days => %(days)s::int)
+                  AND p.arxiv_id <> ALL(%(arxiv_ids)s::text[])
+                ORDER BY p.embedding <=> q.embedding
+                LIMIT 1
+            ) AS n
+            WHERE n.distance <= 1 - %(threshold)s
+            """,
+            {
+                "arxiv_ids": arxiv_ids,
+                "embeddings": list(embeddings),
+                "days": L2_DUPLICATE_LOOKBACK_DAYS,
+                "threshold": L2_DUPLICATE_THRESHOLD,
+            },
+        )
+        rows = cur.fetchall()
+    # SET LOCAL 相当の ef_search を後続のクエリに持ち越さない
+    conn.commit()
+    return {str(r[0]): str(r[1]) for r in rows}
+
+
+def _find_duplicates(papers: list[ArxivPaper], embeddings: Matrix) -> dict[str, str]:
+    """新規論文のうち、既存の論文とほぼ同一のものを重複元に対応付ける。
+
+    Embedding のコサイン類似度が L2_DUPLICATE_THRESHOLD 以上の論文を重複とみなす。
+    比較対象は直近に登録済みの論文 (pgvector の最近傍探索) と、同じバッチ内で
+    先に公開された論文 (公開日時が同じなら arxiv_id 順)。バッチ内の比較は
+    float32 のまま1行ずつ計算し、論文数 × 論文数の行列は作らない。
+
+    Returns:
+        重複と判定した論文の arxiv_id → 重複元の arxiv_id
+    """
+    if not papers:
+        return {}
+
+    # 1. 登録済み論文との比較 (最も近い1件)
+    duplicates = _fetch_recent_duplicates([p.arxiv_id for p in papers], embeddings)
+    from_recent = len(duplicates)
+
+    # 2. バッチ内の比較 (先に公開された、重複でない論文のうち最も近い1件)
+    order = sorted(range(len(papers)), key=lambda i: (papers[i].published_at, papers[i].arxiv_id))
+    normed = embeddings[order] / np.linalg.norm(embeddings[order], axis=1, keepdims=True)
+    canonical = np.zeros(len(order), dtype=bool)
+    for rank, i in enumerate(order):
+        if papers[i].arxiv_id in duplicates:
+            continue
+        scores = normed[:rank] @ normed[rank]  # 先に公開された論文との類似度 (float32)
+        earlier = np.flatnonzero(canonical[:rank] & (scores >= L2_DUPLICATE_THRESHOLD))
+        if earlier.size:
+            source = earlier[scores[earlier].argmax()]
+            duplicates[papers[i].arxiv_id] = papers[order[source]].arxiv_id
+        else:
+            canonical[rank] = True
+
+    if duplicates:
+        logger.info(
+            "Near-duplicate papers detected",
+            extra={"from_recent": from_recent, "in_batch": len(duplicates) - from_recent},
+        )
+    return duplicates
 
 
 # ---------------------------------------------------------------------------
 # DB 挿入 (papers テーブル)
 # ---------------------------------------------------------------------------
+# COPY で papers_staging に流し込む列と、その COPY (バイナリ形式) での型
+_INSERT_COLUMNS = (
+    "arxiv_id, title, abstract, authors, pdf_url, "
+    "primary_category, all_categories, published_at, matched_queries, embedding, duplicate_of"
+)
+_INSERT_COPY_TYPES = [
+    "varchar",
+    "text",
+    "text",
+    "text[]",
+    "text",
+    "varchar",
+    "text[]",
+    "timestamptz",
+    "int4[]",
+    "vector",
+    "varchar",
+]
+
+
 def _insert_papers(
     papers: list[ArxivPaper],
-    embeddings: list[list[float]],
+    embeddings: Matrix,
+    duplicates: dict[str, str] | None = None,
 ) -> None:
-    """論文メタデータと Embedding を papers テーブルに INSERT する。
+    """論文メタデータと Embedding を papers テーブルに一括 INSERT する。
 
-    重複 (arxiv_id UNIQUE制約) は ON CONFLICT DO NOTHING でスキップ。
+    一時テーブル papers_staging に COPY (バイナリ形式) で流し込み、
+    INSERT ... SELECT の1文で papers にマージする。行ごとの往復が無いため
+    論文数によらず DB とのやり取りは4回で済む。
+
+    重複 (arxiv_id UNIQUE制約) は matched_queries の和集合で更新する。
+    duplicates (近似重複 → 重複元の arxiv_id) は新規挿入時の duplicate_of になる。
+    papers_staging は ON COMMIT DROP のため、commit / rollback で消える。
     """
+    if not papers:
+        return
+    duplicates = duplicates or {}
     conn = get_sync_connection()
     with conn.cursor() as cur:
-        for paper, embedding in zip(papers, embeddings):
-            cur.execute(
-                """
-                INSERT INTO papers (
-                    arxiv_id, title, abstract, authors, pdf_url,
-                    primary_category, all_categories, published_at,
-                    matched_queries, embedding
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE papers_staging ON COMMIT DROP AS
+            SELECT {_INSERT_COLUMNS} FROM papers WITH NO DATA
+            """
+        )
+        with cur.copy(
+            f"COPY papers_staging ({_INSERT_COLUMNS}) FROM STDIN (FORMAT BINARY)"
+        ) as copy:
+            copy.set_types(_INSERT_COPY_TYPES)
+            for paper, embedding in zip(papers, embeddings, strict=True):
+                copy.write_row(
+                    (
+                        paper.arxiv_id,
+                        paper.title,
+                        paper.abstract,
+                        paper.authors,
+                        paper.pdf_url,
+                        paper.primary_category,
+                        paper.all_categories,
+                        paper.published_at,
+                        paper.matched_queries,
+                        embedding,
+                        duplicates.get(paper.arxiv_id),
+                    )
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (arxiv_id) DO UPDATE SET
-                    matched_queries = (
-                        SELECT ARRAY(
-                            SELECT DISTINCT unnest(
-                                papers.matched_queries || EXCLUDED.matched_queries
-                            )
+        cur.execute(
+            f"""
+            INSERT INTO papers ({_INSERT_COLUMNS})
+            SELECT {_INSERT_COLUMNS} FROM papers_staging
+            ON CONFLICT (arxiv_id) DO UPDATE SET
+                matched_queries = (
+                    SELECT ARRAY(
+                        SELECT DISTINCT unnest(
+                            papers.matched_queries || EXCLUDED.matched_queries
                         )
-                    ),
-                    updated_at = NOW()
-                """,
-                (
-                    paper.arxiv_id,
-                    paper.title,
-                    paper.abstract,
-                    paper.authors,
-                    paper.pdf_url,
-                    paper.primary_category,
-                    paper.all_categories,
-                    paper.published_at,
-                    paper.matched_queries,
-                    str(embedding),
+                    )
                 ),
-            )
+                updated_at = NOW()
+            """
+        )
+        merged = cur.rowcount
     conn.commit()
+    logger.info("Papers inserted", extra={"staged": len(papers), "merged": merged})
 
 
 # ---------------------------------------------------------------------------
-# L2 スコアリング (pgvector)
+# L2 スコアリング (アンカーとのコサイン類似度)
 # ---------------------------------------------------------------------------
-def _compute_l2_scores(papers: list[ArxivPaper]) -> list[L2Result]:
-    """全アンカーとのコサイン類似度を計算し、L2結果を返す。"""
+def _fetch_active_anchors() -> tuple[list[int], Matrix]:
+    """有効なアンカーを category_id 順に取得する。
+
+    1カテゴリに複数のアンカー (サブトピックごと) があり得るため、
+    同じカテゴリのアンカーは連続して並ぶ。
+
+    Returns:
+        (アンカーごとの category_id のリスト, (アンカー数, EMBEDDING_DIMENSIONS) の行列)
+    """
     conn = get_sync_connection()
-    results: list[L2Result] = []
+    with conn.cursor(binary=True) as cur:
+        cur.execute(
+            """
+            SELECT category_id, embedding
+            FROM anchors
+            WHERE is_active = TRUE
+            ORDER BY category_id, anchor_key
+            """
+        )
+        rows = cur.fetchall()
+    if not rows:
+        return [], np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    return [int(r[0]) for r in rows], np.stack([_parse_vector(r[1]) for r in rows])
+
+
+def _cosine_similarity(embeddings: Matrix, anchors: Matrix) -> npt.NDArray[np.float64]:
+    """(論文数, アンカー数) のコサイン類似度行列を返す。
+
+    pgvector の 1 - (a <=> b) と同じ値を、行を L2 正規化した行列積で求める。
+    丸め誤差を抑えるため float64 で計算する。
+    """
+    papers64 = embeddings.astype(np.float64)
+    anchors64 = anchors.astype(np.float64)
+    papers64 /= np.linalg.norm(papers64, axis=1, keepdims=True)
+    anchors64 /= np.linalg.norm(anchors64, axis=1, keepdims=True)
+    return papers64 @ anchors64.T
+
+
+def _pool_by_category(
+    scores: npt.NDArray[np.float64],
+    anchor_category_ids: list[int],
+    top_k: int,
+) -> tuple[list[int], npt.NDArray[np.float64]]:
+    """アンカーごとの類似度を、カテゴリごとに上位 top_k アンカーの平均へ集約する。
+
+    anchor_category_ids は同じカテゴリが連続している前提 (_fetch_active_anchors の順序)。
+    1カテゴリ1アンカーならその類似度がそのままカテゴリのスコアになる。
+
+    Returns:
+        (カテゴリ ID のリスト, (論文数, カテゴリ数) の類似度行列)
+    """
+    ids = np.asarray(anchor_category_ids)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    if len(starts) == len(ids):  # 1カテゴリ1アンカーなら集約不要
+        return list(anchor_category_ids), scores
+    ends = np.r_[starts[1:], len(ids)]
+    pooled = np.empty((scores.shape[0], len(starts)), dtype=np.float64)
+    for j, (start, end) in enumerate(zip(starts.tolist(), ends.tolist(), strict=True)):
+        k = min(top_k, end - start)
+        # 各行の上位 k 個を末尾に寄せてから平均する (カテゴリ内のアンカー数ぶんの部分ソート)
+        top = np.partition(scores[:, start:end], end - start - k, axis=1)[:, -k:]
+        pooled[:, j] = top.mean(axis=1)
+    return ids[starts].tolist(), pooled
+
+
+def _importance_scores(
+    max_scores: npt.NDArray[np.float64],
+    hit_counts: npt.NDArray[np.int64],
+    matched_counts: npt.NDArray[np.int64],
+    category_counts: int | npt.NDArray[np.int64],
+) -> npt.NDArray[np.float64]:
+    """importance_score を論文ごとにまとめて算出する。
+
+    hit_count はスコアを計算したカテゴリ数で、matched_queries の件数は
+    arXiv クエリ数で正規化する。
+    """
+    return (
+        IMPORTANCE_WEIGHT_MAX_SCORE * max_scores
+        + IMPORTANCE_WEIGHT_HIT_COUNT * (hit_counts / category_counts)
+        + IMPORTANCE_WEIGHT_MATCHED_QUERIES * (matched_counts / len(ARXIV_QUERIES))
+    )
+
+
+def _score_embeddings(
+    arxiv_ids: list[str],
+    matched_counts: npt.NDArray[np.int64],
+    embeddings: Matrix,
+    anchor_category_ids: list[int],
+    anchors: Matrix,
+) -> list[L2Result]:
+    """Embedding 行列とアンカー行列から L2 結果をまとめて導出する。
+
+    論文 × アンカーの類似度を1回の行列積で求め、カテゴリごとに上位 k アンカーの平均で集約する。
+    max_score / best_category_id / hit_count / importance_score も列方向の
+    演算でまとめて導出する。
+    """
+    category_ids, scores = _pool_by_category(
+        _cosine_similarity(embeddings, anchors), anchor_category_ids, L2_ANCHOR_POOL_TOP_K
+    )
+    best = scores.argmax(axis=1)  # 同点は category_id の小さい方 (旧実装と同じ)
+    max_scores = scores[np.arange(len(arxiv_ids)), best]
+    hit_counts = (scores >= L2_THRESHOLD).sum(axis=1)
+    importance_scores = _importance_scores(
+        max_scores, hit_counts, matched_counts, len(category_ids)
+    )
+
+    keys = [str(c) for c in category_ids]
+    rounded = np.round(scores, 4).tolist()
+    return [
+        L2Result(
+            arxiv_id=arxiv_id,
+            max_score=round(max_score, 4),
+            best_category_id=category_ids[best_idx],
+            hit_count=hit_count,
+            importance_score=round(importance_score, 4),
+            all_scores=dict(zip(keys, row, strict=True)),
+            passed=max_score >= L2_THRESHOLD,
+        )
+        for arxiv_id, row, max_score, best_idx, hit_count, importance_score in zip(
+            arxiv_ids,
+            rounded,
+            max_scores.tolist(),
+            best.tolist(),
+            hit_counts.tolist(),
+            importance_scores.tolist(),
+            strict=True,
+        )
+    ]
+
+
+def _compute_l2_scores_in_process(papers: list[ArxivPaper], embeddings: Matrix) -> list[L2Result]:
+    """保持している Embedding でアンカーとのコサイン類似度を計算する。
+
+    アンカーは1回だけ読み込む。
+
+    Args:
+        papers: スコアリング対象の論文
+        embeddings: papers と同じ順の (論文数, EMBEDDING_DIMENSIONS) 行列
+    """
+    anchor_category_ids, anchors = _fetch_active_anchors()
+    if not anchor_category_ids:
+        logger.warning("No active anchors, L2 scores not computed")
+        return []
+    matched_counts = np.array([len(p.matched_queries) for p in papers], dtype=np.int64)
+    return _score_embeddings(
+        [p.arxiv_id for p in papers], matched_counts, embeddings, anchor_category_ids, anchors
+    )
+
+
+def _compute_l2_scores_sql(arxiv_ids: list[str]) -> list[L2Result]:
+    """papers に保存済みの Embedding で、全論文のスコアを1文の SQL で計算する。
 
+    Embedding をメモリに持たない場合 (アンカー変更後の過去論文の再スコアリング等) 用。
+    アンカーごとの類似度をカテゴリごとに上位 k アンカーの平均へ集約した上で、最大値・argmax・
+    閾値超え数を DB 側で集約し、全行を1回で受け取る。
+    matched_queries の件数は papers テーブルの値を使う。
+    Embedding の無い論文は結果に含まれない。
+    """
+    if not arxiv_ids:
+        return []
+    conn = get_sync_connection()
     with conn.cursor() as cur:
-        for paper in papers:
-            # 全アンカーとの類似度を計算
-            cur.execute(
-                """
+        cur.execute(
+            """
+            WITH ranked AS (
                 SELECT
+                    p.arxiv_id,
+                    cardinality(p.matched_queries) AS matched_count,
                     a.category_id,
-                    1 - (p.embedding <=> a.embedding) AS cosine_similarity
+                    1 - (p.embedding <=> a.embedding) AS score,
+                    row_number() OVER (
+                        PARTITION BY p.arxiv_id, a.category_id
+                        ORDER BY p.embedding <=> a.embedding
+                    ) AS anchor_rank
                 FROM papers p
                 CROSS JOIN anchors a
-                WHERE p.arxiv_id = %s AND a.is_active = TRUE
-                ORDER BY a.category_id
-                """,
-                (paper.arxiv_id,),
+                WHERE p.arxiv_id = ANY(%(arxiv_ids)s)
+                  AND p.embedding IS NOT NULL
+                  AND a.is_active = TRUE
+            ),
+            s AS (
+                SELECT arxiv_id, matched_count, category_id, avg(score) AS score
+                FROM ranked
+                WHERE anchor_rank <= %(top_k)s
+                GROUP BY arxiv_id, matched_count, category_id
             )
-            rows = cur.fetchall()
+            SELECT
+                arxiv_id,
+                COALESCE(matched_count, 0),
+                array_agg(category_id ORDER BY category_id),
+                array_agg(score ORDER BY category_id),
+                max(score),
+                (array_agg(category_id ORDER BY score DESC, category_id))[1],
+                count(*) FILTER (WHERE score >= %(threshold)s)
+            FROM s
+            GROUP BY arxiv_id, matched_count
+            """,
+            {"arxiv_ids": arxiv_ids, "threshold": L2_THRESHOLD, "top_k": L2_ANCHOR_POOL_TOP_K},
+        )
+        rows = {str(r[0]): r for r in cur.fetchall()}
 
-            if not rows:
-                logger.warning(
-                    "No anchor scores for paper",
-                    extra={"arxiv_id": paper.arxiv_id},
-                )
-                continue
-
-            all_scores: dict[str, float] = {}
-            scores: list[float] = []
-            for row in rows:
-                cat_id = int(row[0])
-                score = float(row[1])
-                all_scores[str(cat_id)] = round(score, 4)
-                scores.append(score)
-
-            max_score = max(scores)
-            best_category_id = int(rows[scores.index(max_score)][0])
-            hit_count = sum(1 for s in scores if s >= L2_THRESHOLD)
-            matched_queries_count = len(paper.matched_queries)
-
-            # importance_score の算出
-            importance_score = (
-                IMPORTANCE_WEIGHT_MAX_SCORE * max_score
-                + IMPORTANCE_WEIGHT_HIT_COUNT * (hit_count / ANCHOR_COUNT)
-                + IMPORTANCE_WEIGHT_MATCHED_QUERIES * (matched_queries_count / ANCHOR_COUNT)
-            )
+    missing = len(arxiv_ids) - len(rows)
+    if missing:
+        logger.warning("No anchor scores for papers", extra={"missing": missing})
+    ordered = [rows[a] for a in arxiv_ids if a in rows]
+    if not ordered:
+        return []
 
-            passed = max_score >= L2_THRESHOLD
-
-            results.append(
-                L2Result(
-                    arxiv_id=paper.arxiv_id,
-                    max_score=round(max_score, 4),
-                    best_category_id=best_category_id,
-                    hit_count=hit_count,
-                    importance_score=round(importance_score, 4),
-                    all_scores=all_scores,
-                    passed=passed,
-                )
-            )
+    max_scores = np.array([r[4] for r in ordered], dtype=np.float64)
+    hit_counts = np.array([r[6] for r in ordered], dtype=np.int64)
+    matched_counts = np.array([r[1] for r in ordered], dtype=np.int64)
+    category_counts = np.array([len(r[2]) for r in ordered], dtype=np.int64)
+    importance_scores = _importance_scores(
+        max_scores, hit_counts, matched_counts, category_counts
+    ).tolist()
+    return [
+        L2Result(
+            arxiv_id=str(r[0]),
+            max_score=round(float(r[4]), 4),
+            best_category_id=int(r[5]),
+            hit_count=int(r[6]),
+            importance_score=round(importance_score, 4),
+            all_scores={str(c): round(float(v), 4) for c, v in zip(r[2], r[3], strict=True)},
+            passed=float(r[4]) >= L2_THRESHOLD,
+        )
+        for r, importance_score in zip(ordered, importance_scores, strict=True)
+    ]
 
-    return results
+
+def _compute_l2_scores(
+    papers: list[ArxivPaper],
+    embeddings: Matrix | None = None,
+    engine: ScoringEngine = "in_process",
+) -> list[L2Result]:
+    """全アンカーとのコサイン類似度を計算し、L2結果を返す。
+
+    Args:
+        papers: スコアリング対象の論文
+        embeddings: papers と同じ順の Embedding 行列 (in_process で必須)
+        engine: "in_process" (NumPy の行列積) または "sql" (DB で1文)
+    """
+    if engine == "sql":
+        return _compute_l2_scores_sql([p.arxiv_id for p in papers])
+    if embeddings is None:
+        raise ValueError("in_process scoring requires embeddings")
+    return _compute_l2_scores_in_process(papers, embeddings)
 
 
 # ---------------------------------------------------------------------------
 # L2 結果を DB に更新
 # ---------------------------------------------------------------------------
-def _update_l2_results(results: list[L2Result]) -> None:
-    """L2結果を papers テーブルに反映する。"""
+def _update_l2_results(results: list[L2Result]) -> int:
+    """L2結果を papers テーブルに反映し、更新した行数を返す。
+
+    L2_UPDATE_CHUNK_SIZE 件ごとに列ごとの配列へまとめ、
+    UPDATE ... FROM unnest(...) の1文で更新する。commit は最後に1回。
+    """
+    if not results:
+        return 0
     conn = get_sync_connection()
+    updated = 0
     with conn.cursor() as cur:
-        for r in results:
+        for start in range(0, len(results), L2_UPDATE_CHUNK_SIZE):
+            chunk = results[start : start + L2_UPDATE_CHUNK_SIZE]
             cur.execute(
                 """
-                UPDATE papers SET
-                    best_category_id = %s,
-                    max_score = %s,
-                    hit_count = %s,
-                    importance_score = %s,
-                    all_scores = %s,
+                UPDATE papers AS p SET
+                    best_category_id = r.best_category_id,
+                    max_score = r.max_score,
+                    hit_count = r.hit_count,
+                    importance_score = r.importance_score,
+                    all_scores = r.all_scores::jsonb,
                     updated_at = NOW()
-                WHERE arxiv_id = %s
+                FROM unnest(
+                    %s::text[], %s::int[], %s::float8[], %s::int[], %s::float8[], %s::text[]
+                ) AS r(
+                    arxiv_id, best_category_id, max_score, hit_count, importance_score, all_scores
+                )
+                WHERE p.arxiv_id = r.arxiv_id
                 """,
                 (
-                    r.best_category_id,
-                    r.max_score,
-                    r.hit_count,
-                    r.importance_score,
-                    json.dumps(r.all_scores),  # JSONB として文字列化
-                    r.arxiv_id,
+                    [r.arxiv_id for r in chunk],
+                    [r.best_category_id for r in chunk],
+                    [r.max_score for r in chunk],
+                    [r.hit_count for r in chunk],
+                    [r.importance_score for r in chunk],
+                    [json.dumps(r.all_scores) for r in chunk],  # JSONB として文字列化
                 ),
             )
+            updated += cur.rowcount
     conn.commit()
+    logger.info(
+        "L2 results updated",
+        extra={"results": len(results), "updated": updated},
+    )
+    return updated
 
 
 # ---------------------------------------------------------------------------
@@ -228,45 +897,189 @@ def _build_l2_papers(
     return l2_papers
 
 
+# ---------------------------------------------------------------------------
+# アンカー変更後の再スコアリング
+# ---------------------------------------------------------------------------
+def _fetch_rescore_page(
+    after_id: int, limit: int, with_embeddings: bool
+) -> list[tuple[int, str, int, Vector | None]]:
+    """id > after_id の Embedding 済み論文を id 順に最大 limit 件返す (キーセットページング)。
+
+    Returns:
+        (id, arxiv_id, matched_queries の件数, Embedding) のリスト。
+        with_embeddings=False の場合 Embedding は None
+    """
+    conn = get_sync_connection()
+    with conn.cursor(binary=True) as cur:
+        cur.execute(
+            """
+            SELECT
+                id,
+                arxiv_id,
+                COALESCE(cardinality(matched_queries), 0),
+                CASE WHEN %(with_embeddings)s THEN embedding END
+            FROM papers
+            WHERE id > %(after_id)s AND embedding IS NOT NULL
+            ORDER BY id
+            LIMIT %(limit)s
+            """,
+            {"after_id": after_id, "limit": limit, "with_embeddings": with_embeddings},
+        )
+        rows = cur.fetchall()
+    # 読み取りだけのトランザクションを閉じる (ページ間でスナップショットを保持しない)
+    conn.commit()
+    return [
+        (int(r[0]), str(r[1]), int(r[2]), None if r[3] is None else _parse_vector(r[3]))
+        for r in rows
+    ]
+
+
+def rescore_papers(
+    after_id: int = 0,
+    engine: ScoringEngine = "in_process",
+    chunk_size: int = L2_RESCORE_CHUNK_SIZE,
+    should_continue: Callable[[], bool] | None = None,
+) -> L2RescoreResult:
+    """papers の全論文を現在のアンカーで再スコアリングし、L2 結果を書き戻す。
+
+    id 順のキーセットページングで chunk_size 件ずつ処理するため、保持する
+    Embedding は常に1チャンク分のみ。チャンクごとに commit し、処理済みの
+    最大 id を last_id として返すので、中断しても after_id=last_id で再開できる。
+
+    Args:
+        after_id: この id より後の論文から処理する (前回の last_id)
+        engine: "in_process" (Embedding を読み込み NumPy で計算) または "sql" (DB で計算)
+        chunk_size: 1チャンクの論文数
+        should_continue: チャンクの合間に呼ばれ、False なら途中で打ち切る (Lambda の残り時間等)
+
+    Returns:
+        処理件数と再開位置。全件処理し終えた場合 done=True
+    """
+    anchor_category_ids: list[int] = []
+    anchors: Matrix = np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    if engine == "in_process":
+        anchor_category_ids, anchors = _fetch_active_anchors()
+        if not anchor_category_ids:
+            logger.warning("No active anchors, rescore skipped")
+            return L2RescoreResult(last_id=after_id, done=True)
+
+    result = L2RescoreResult(last_id=after_id)
+    logger.info("L2 rescore started", extra={"after_id": after_id, "engine": engine})
+    while should_continue is None or should_continue():
+        page = _fetch_rescore_page(result.last_id, chunk_size, engine == "in_process")
+        if not page:
+            result.done = True
+            break
+
+        arxiv_ids = [row[1] for row in page]
+        if engine == "sql":
+            results = _compute_l2_scores_sql(arxiv_ids)
+        else:
+            matched_counts = np.array([row[2] for row in page], dtype=np.int64)
+            embeddings = np.stack([row[3] for row in page if row[3] is not None])
+            results = _score_embeddings(
+                arxiv_ids, matched_counts, embeddings, anchor_category_ids, anchors
+            )
+
+        result.updated += _update_l2_results(results)
+        result.processed += len(results)
+        result.last_id = page[-1][0]
+        logger.info(
+            "L2 rescore chunk completed",
+            extra={"last_id": result.last_id, "processed": result.processed},
+        )
+
+    logger.info("L2 rescore finished", extra=result.model_dump())
+    return result
+
+
 # ---------------------------------------------------------------------------
 # メイン: L2 選別
 # ---------------------------------------------------------------------------
-def run_l2(papers: list[ArxivPaper]) -> list[L2Paper]:
+def run_l2(
+    papers: list[ArxivPaper],
+    embeddings: dict[str, Vector] | None = None,
+    scoring_engine: ScoringEngine = "in_process",
+    force: bool = False,
+) -> list[L2Paper]:
     """L2: ベクトル選別を実行する。
 
-    1. OpenAI Embedding を一括生成
-    2. papers テーブルに INSERT
-    3. pgvector でアンカーとのコサイン類似度を計算
-    4. 閾値以上の論文を L2Paper として返す
+    0. papers テーブルに登録済みの論文は matched_queries のマージのみ行い除外
+       (L2 を通過したが L3 の結果が無いもの (force 時は分析済みも) は、
+       保存済みの L2 結果で戻り値に含める)
+    1. OpenAI Embedding を一括生成 (計算済みのものは再利用)
+    2. 近似重複 (再投稿・ほぼ同一の論文) を検出し、papers テーブルに INSERT
+    3. アンカーとのコサイン類似度を計算 (scoring_engine で方式を選択)
+    4. 閾値以上の論文を L2Paper として返す (近似重複は除く)
 
     Args:
         papers: L1 で取得した論文リスト
+        embeddings: L1 と並行して計算済みの arxiv_id → Embedding
+        scoring_engine: "in_process" (保持している Embedding を NumPy で計算) または
+            "sql" (papers に挿入済みの Embedding を DB で計算)
+        force: True なら L3 分析済みの登録済み論文も L3 へ渡し直す (L3 の再分析用)
 
     Returns:
-        L2 を通過した L2Paper リスト
+        L2 を通過した (重複でない) L2Paper リスト。
+        新規論文に加え、前回までの実行で L3 に至らなかった登録済み論文を含む
     """
     if not papers:
         logger.info("L2: No papers to process")
         return []
 
-    logger.info("L2 selection started", extra={"input_count": len(papers)})
+    # 0. 登録済み論文 (前日以前に収集済みのクロスリスト・バージョン更新) を除外
+    known_ids = _fetch_known_ids([p.arxiv_id for p in papers])
+    carried_over: list[L2Paper] = []
+    if known_ids:
+        known = [p for p in papers if p.arxiv_id in known_ids]
+        _merge_known_papers(known)
+        # L3 / Post-L3 が失敗した実行の論文は、スコアリングし直さずに L3 へ渡し直す
+        unanalyzed = _fetch_unanalyzed_results(list(known_ids), force)
+        carried_over = _build_l2_papers(known, unanalyzed)
+    input_count = len(papers)
+    papers = [p for p in papers if p.arxiv_id not in known_ids]
+
+    logger.info(
+        "L2 selection started",
+        extra={
+            "input_count": input_count,
+            "known": len(known_ids),
+            "carried_over": len(carried_over),
+            "new": len(papers),
+            "precomputed": len(embeddings or {}),
+        },
+    )
+    if not papers:
+        return carried_over
 
-    # 1. Embedding 生成
-    client = OpenAI(api_key=get_openai_api_key())
-    embeddings = _generate_embeddings(papers, client)
+    # 1. Embedding 生成 (計算済みでない論文のみ) → 論文順の float32 行列
+    precomputed = embeddings or {}
+    paper_embeddings: Matrix = np.empty((len(papers), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    missing: list[int] = []
+    for i, paper in enumerate(papers):
+        vector = precomputed.get(paper.arxiv_id)
+        if vector is None:
+            missing.append(i)
+        else:
+            paper_embeddings[i] = vector
+    if missing:
+        client = OpenAI(api_key=get_openai_api_key())
+        paper_embeddings[missing] = _generate_embeddings([papers[i] for i in missing], client)
 
-    # 2. DB 挿入
-    _insert_papers(papers, embeddings)
+    # 2. 近似重複の検出 → DB 挿入 (重複は duplicate_of を付けて保存し、スコアも計算する)
+    duplicates = _find_duplicates(papers, paper_embeddings)
+    _insert_papers(papers, paper_embeddings, duplicates)
 
     # 3. L2 スコアリング
-    results = _compute_l2_scores(papers)
+    results = _compute_l2_scores(papers, paper_embeddings, scoring_engine)
 
     # 4. L2 結果を DB 更新
     _update_l2_results(results)
 
-    # 5. 通過論文を構築
+    # 5. 通過論文を構築 (重複は L3 / Post-L3 を重複元の1回で済ませる)
     passed = _build_l2_papers(papers, results)
     rejected = len(results) - len(passed)
+    passed = [p for p in passed if p.arxiv_id not in duplicates]
 
     logger.info(
         "L2 selection completed",
@@ -274,8 +1087,9 @@ def run_l2(papers: list[ArxivPaper]) -> list[L2Paper]:
             "input_count": len(papers),
             "passed_count": len(passed),
             "rejected_count": rejected,
+            "duplicate_count": len(duplicates),
             "pass_rate": round(len(passed) / len(papers) * 100, 1) if papers else 0,
         },
     )
 
-    return passed
+    return passed + carried_over
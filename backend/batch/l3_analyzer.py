@@ -3,33 +3,47 @@ AI Research OS — L3: Gemini LLM 分析
 
 L2通過論文に対して Gemini 2.0 Flash でJSON Mode分析を行い、
 適合判定・カテゴリ分類・日本語要約・重要度判定を生成する。
-5並列、200ms間隔、指数バックオフ付き。
+L3_BATCH_SIZE 件ずつ1リクエストにまとめ (システムプロンプトの送信を 1/K に)、
+応答に含まれなかった論文だけを1論文ずつ呼び出し直す。
+同時実行数は AIMD リミッター (batch.gemini_limiter) で調整し、指数バックオフ付き。
+システムプロンプトはコンテキストキャッシュ (batch.gemini_cache) 経由で参照する。
 """
 
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
 
 from google import genai
 from google.genai import types
+from pydantic import ValidationError
 
 from batch.config import (
     CATEGORY_NAMES,
     GEMINI_MODEL,
-    L3_CONCURRENCY,
+    L3_BATCH_PAPER_TEMPLATE,
+    L3_BATCH_SIZE,
+    L3_BATCH_SYSTEM_PROMPT,
+    L3_BATCH_TIMEOUT_SEC,
+    L3_BATCH_USER_PROMPT_TEMPLATE,
     L3_MAX_RETRIES,
-    L3_REQUEST_INTERVAL_MS,
     L3_SYSTEM_PROMPT,
     L3_TEMPERATURE,
+    L3_TIMEOUT_SEC,
     L3_USER_PROMPT_TEMPLATE,
     BACKOFF_BASE_SEC,
 )
+from batch.gemini_cache import PromptCache
+from batch.gemini_limiter import AdaptiveLimiter, create_gemini_limiter
 from utils.db import get_async_connection
 from utils.logger import logger
-from utils.models import L2Paper, L3Response
+from utils.models import L2Paper, L3BatchItem, L3BatchResponse, L3Response
 from utils.secrets import get_gemini_api_key
 
+# 論文ごとの L3 結果 (失敗した論文は None)
+L3Outcome = tuple[str, L3Response | None]
+
 
 # ---------------------------------------------------------------------------
 # プロンプト構築
@@ -47,28 +61,64 @@ def build_l3_prompt(paper: L2Paper) -> str:
     )
 
 
+def build_l3_batch_prompt(papers: list[L2Paper]) -> str:
+    """複数論文をまとめた L3 分析用のユーザープロンプトを構築する。"""
+    blocks = [
+        L3_BATCH_PAPER_TEMPLATE.format(
+            index=i,
+            arxiv_id=paper.arxiv_id,
+            title=paper.title,
+            abstract=paper.abstract,
+            best_category_id=paper.best_category_id,
+            category_name=CATEGORY_NAMES.get(paper.best_category_id, "Unknown"),
+            max_score=paper.max_score,
+            hit_count=paper.hit_count,
+        )
+        for i, paper in enumerate(papers, start=1)
+    ]
+    return L3_BATCH_USER_PROMPT_TEMPLATE.format(papers="\n\n".join(blocks), count=len(papers))
+
+
+def _token_counts(response: types.GenerateContentResponse) -> tuple[int, int]:
+    """レスポンスの (in_tokens, out_tokens) を返す。"""
+    usage = response.usage_metadata
+    if not usage:
+        return 0, 0
+    return (
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "candidates_token_count", 0) or 0,
+    )
+
+
 # ---------------------------------------------------------------------------
 # Gemini API 呼び出し (1論文)
 # ---------------------------------------------------------------------------
 async def _call_gemini(
     client: genai.Client,
     paper: L2Paper,
+    limiter: AdaptiveLimiter,
+    cache: PromptCache,
 ) -> tuple[L3Response | None, int, int]:
-    """Gemini API を呼び出して L3Response とトークン数 (in_tokens, out_tokens) を取得する。"""
+    """Gemini API を呼び出して L3Response とトークン数 (in_tokens, out_tokens) を取得する。
+
+    同時実行枠は API 呼び出しの間だけ確保し、リトライ前のバックオフ中は手放す。
+    """
     user_prompt = build_l3_prompt(paper)
 
     for attempt in range(L3_MAX_RETRIES):
         try:
-            response = await client.aio.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=[user_prompt],
-                config=types.GenerateContentConfig(
-                    system_instruction=L3_SYSTEM_PROMPT,
-                    response_mime_type="application/json",
-                    response_schema=L3Response,
-                    temperature=L3_TEMPERATURE,
-                ),
+            config = await cache.config(
+                response_mime_type="application/json",
+                response_schema=L3Response,
+                temperature=L3_TEMPERATURE,
             )
+            async with limiter.slot("l3"):
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(
+                        model=GEMINI_MODEL, contents=[user_prompt], config=config
+                    ),
+                    timeout=L3_TIMEOUT_SEC,
+                )
 
             if response.text is None:
                 logger.warning(
@@ -78,12 +128,7 @@ async def _call_gemini(
                 continue
 
             parsed = json.loads(response.text)
-
-            in_tokens = 0
-            out_tokens = 0
-            if response.usage_metadata:
-                in_tokens = getattr(response.usage_metadata, "prompt_token_count", 0)
-                out_tokens = getattr(response.usage_metadata, "candidates_token_count", 0)
+            in_tokens, out_tokens = _token_counts(response)
 
             return L3Response(**parsed), in_tokens, out_tokens
 
@@ -92,7 +137,8 @@ async def _call_gemini(
                 "L3 JSON parse error",
                 extra={"arxiv_id": paper.arxiv_id, "attempt": attempt + 1},
             )
-        except Exception:
+        except Exception as exc:
+            cache.invalidate(exc)
             wait = BACKOFF_BASE_SEC * (2**attempt)
             logger.warning(
                 "L3 API error, retrying",
@@ -109,66 +155,309 @@ async def _call_gemini(
     return None, 0, 0
 
 
+# ---------------------------------------------------------------------------
+# Gemini API 呼び出し (複数論文を1リクエストで)
+# ---------------------------------------------------------------------------
+def _parse_batch_results(text: str, arxiv_ids: list[str]) -> dict[str, L3Response]:
+    """複数論文モードの応答から arxiv_id → L3Response を取り出す。
+
+    スキーマに合わない要素と、依頼していない arxiv_id の要素は捨てる
+    (該当する論文は1論文ずつの呼び出しに回る)。
+    """
+    raw = json.loads(text)
+    items = raw.get("results", []) if isinstance(raw, dict) else []
+    wanted = set(arxiv_ids)
+    parsed: dict[str, L3Response] = {}
+    for item in items:
+        try:
+            result = L3BatchItem.model_validate(item)
+        except ValidationError:
+            continue
+        if result.arxiv_id in wanted and result.arxiv_id not in parsed:
+            parsed[result.arxiv_id] = L3Response(**result.model_dump(exclude={"arxiv_id"}))
+    return parsed
+
+
+async def _call_gemini_batch(
+    client: genai.Client,
+    papers: list[L2Paper],
+    limiter: AdaptiveLimiter,
+    cache: PromptCache,
+) -> tuple[dict[str, L3Response], int, int]:
+    """複数論文を1リクエストで分析し、arxiv_id → L3Response とトークン数を返す。
+
+    全リトライに失敗した場合は空の dict を返す (全論文が1論文ずつの呼び出しに回る)。
+    """
+    arxiv_ids = [p.arxiv_id for p in papers]
+    user_prompt = build_l3_batch_prompt(papers)
+
+    for attempt in range(L3_MAX_RETRIES):
+        try:
+            config = await cache.config(
+                response_mime_type="application/json",
+                response_schema=L3BatchResponse,
+                temperature=L3_TEMPERATURE,
+            )
+            async with limiter.slot("l3_batch"):
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(
+                        model=GEMINI_MODEL, contents=[user_prompt], config=config
+                    ),
+                    timeout=L3_BATCH_TIMEOUT_SEC,
+                )
+
+            if response.text is None:
+                logger.warning(
+                    "L3 batch empty response",
+                    extra={"arxiv_ids": arxiv_ids, "attempt": attempt + 1},
+                )
+                continue
+
+            results = _parse_batch_results(response.text, arxiv_ids)
+            in_tokens, out_tokens = _token_counts(response)
+            return results, in_tokens, out_tokens
+
+        except json.JSONDecodeError:
+            logger.warning(
+                "L3 batch JSON parse error",
+                extra={"arxiv_ids": arxiv_ids, "attempt": attempt + 1},
+            )
+        except Exception as exc:
+            cache.invalidate(exc)
+            wait = BACKOFF_BASE_SEC * (2**attempt)
+            logger.warning(
+                "L3 batch API error, retrying",
+                extra={"arxiv_ids": arxiv_ids, "attempt": attempt + 1, "wait_sec": wait},
+                exc_info=True,
+            )
+            await asyncio.sleep(wait)
+
+    logger.error("L3 batch all retries failed", extra={"arxiv_ids": arxiv_ids})
+    return {}, 0, 0
+
+
 # ---------------------------------------------------------------------------
 # DB 更新 (L3結果)
 # ---------------------------------------------------------------------------
-async def _update_l3_result(arxiv_id: str, result: L3Response) -> None:
-    """L3結果を papers テーブルに反映する。"""
+async def _apply_l3_results(results: dict[str, L3Response]) -> None:
+    """複数論文の L3 結果を papers テーブルに1文で一括反映する。"""
+    if not results:
+        return
+    items = list(results.items())
     conn = await get_async_connection()
     async with conn.cursor() as cur:
         await cur.execute(
             """
-            UPDATE papers SET
-                is_relevant = %s,
-                category_id = %s,
-                confidence = %s,
-                importance = %s,
-                summary_ja = %s,
-                reasoning = %s,
+            UPDATE papers p SET
+                is_relevant = r.is_relevant,
+                category_id = r.category_id,
+                confidence = r.confidence,
+                importance = r.importance,
+                summary_ja = r.summary_ja,
+                reasoning = r.reasoning,
                 updated_at = NOW()
-            WHERE arxiv_id = %s
+            FROM unnest(
+                %s::text[], %s::boolean[], %s::int[], %s::float8[], %s::int[], %s::text[],
+                %s::text[]
+            ) AS r(arxiv_id, is_relevant, category_id, confidence, importance, summary_ja,
+                   reasoning)
+            WHERE p.arxiv_id = r.arxiv_id
             """,
             (
-                result.is_relevant,
-                result.category_id,
-                result.confidence,
-                result.importance,
-                result.summary_ja,
-                result.reasoning,
-                arxiv_id,
+                [arxiv_id for arxiv_id, _ in items],
+                [r.is_relevant for _, r in items],
+                [r.category_id for _, r in items],
+                [r.confidence for _, r in items],
+                [r.importance for _, r in items],
+                [r.summary_ja for _, r in items],
+                [r.reasoning for _, r in items],
             ),
         )
     await conn.commit()
 
 
 # ---------------------------------------------------------------------------
-# 1論文の処理 (セマフォ付き)
+# L3 結果の再利用 (l3_response_cache テーブル)
+# ---------------------------------------------------------------------------
+def _l3_cache_key(paper: L2Paper, model: str = GEMINI_MODEL) -> str:
+    """モデル名 + システムプロンプト + 1論文のユーザープロンプトの SHA-256 を返す。
+
+    複数論文モードの結果も同じキーで保存する (L3_BATCH_SYSTEM_PROMPT は
+    L3_SYSTEM_PROMPT を含むため、プロンプトの変更でどちらのキャッシュも無効になる)。
+    """
+    text = f"{model}\n{L3_SYSTEM_PROMPT}\n{build_l3_prompt(paper)}"
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+async def _fetch_analyzed(arxiv_ids: list[str]) -> dict[str, bool]:
+    """is_relevant が設定済みの論文を arxiv_id → is_relevant で返す。"""
+    conn = await get_async_connection()
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT arxiv_id, is_relevant FROM papers
+            WHERE arxiv_id = ANY(%s) AND is_relevant IS NOT NULL
+            """,
+            (arxiv_ids,),
+        )
+        rows = await cur.fetchall()
+    return {str(r[0]): bool(r[1]) for r in rows}
+
+
+async def _lookup_cached_results(keys: list[str]) -> dict[str, L3Response]:
+    """キャッシュ済みの L3 結果を1クエリで取得する。"""
+    conn = await get_async_connection()
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "SELECT prompt_hash, response FROM l3_response_cache WHERE prompt_hash = ANY(%s)",
+            (keys,),
+        )
+        rows = await cur.fetchall()
+    return {str(r[0]): L3Response.model_validate(r[1]) for r in rows}
+
+
+async def _store_cached_results(entries: dict[str, L3Response]) -> None:
+    """新たに得た L3 結果をキャッシュに保存する (force で再分析した結果は上書き)。"""
+    if not entries:
+        return
+    conn = await get_async_connection()
+    async with conn.cursor() as cur:
+        await cur.executemany(
+            """
+            INSERT INTO l3_response_cache (prompt_hash, model, response)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (prompt_hash) DO UPDATE SET
+                response = EXCLUDED.response,
+                created_at = NOW()
+            """,
+            [(key, GEMINI_MODEL, result.model_dump_json()) for key, result in entries.items()],
+        )
+    await conn.commit()
+
+
+async def _reuse_l3_results(
+    papers: list[L2Paper], force: bool = False
+) -> tuple[list[L2Paper], dict[str, bool]]:
+    """API を呼ばずに結果が分かる論文を除き、(残りの論文, arxiv_id → is_relevant) を返す。
+
+    - is_relevant が設定済みの論文は再分析しない
+    - 同じプロンプトの結果が l3_response_cache にあれば papers に反映して使う
+    force=True なら両方とも行わず、全論文を API で再分析する。
+    DB の読み書きに失敗しても分析は続ける (該当論文は API に回る)。
+    """
+    if force or not papers:
+        return papers, {}
+
+    reused: dict[str, bool] = {}
+    try:
+        reused.update(await _fetch_analyzed([p.arxiv_id for p in papers]))
+    except Exception:
+        logger.warning("L3 analyzed papers lookup failed", exc_info=True)
+    analyzed_count = len(reused)
+
+    pending = [p for p in papers if p.arxiv_id not in reused]
+    keys = {p.arxiv_id: _l3_cache_key(p) for p in pending}
+    try:
+        cached = await _lookup_cached_results(list(set(keys.values()))) if keys else {}
+    except Exception:
+        logger.warning("L3 response cache lookup failed", exc_info=True)
+        cached = {}
+    hits = {arxiv_id: cached[key] for arxiv_id, key in keys.items() if key in cached}
+    if hits:
+        try:
+            await _apply_l3_results(hits)
+        except Exception:
+            logger.warning("L3 cached results apply failed", exc_info=True)
+            hits = {}
+        reused.update({arxiv_id: result.is_relevant for arxiv_id, result in hits.items()})
+
+    remaining = [p for p in pending if p.arxiv_id not in hits]
+    logger.info(
+        "L3 result reuse",
+        extra={
+            "already_analyzed": analyzed_count,
+            "cache_hits": len(hits),
+            "remaining": len(remaining),
+        },
+    )
+    return remaining, reused
+
+
+async def _remember_l3_results(papers: list[L2Paper], results: dict[str, L3Response]) -> None:
+    """API で得た L3 結果を論文のプロンプトのキーでキャッシュに保存する。"""
+    entries = {_l3_cache_key(p): results[p.arxiv_id] for p in papers if p.arxiv_id in results}
+    try:
+        await _store_cached_results(entries)
+    except Exception:
+        logger.warning("L3 response cache store failed", exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# 1論文 / 複数論文の処理
 # ---------------------------------------------------------------------------
 async def _process_paper(
     client: genai.Client,
     paper: L2Paper,
-    semaphore: asyncio.Semaphore,
-) -> tuple[str, L3Response | None, int, int]:
-    """セマフォで並列数を制限しつつ、1論文を L3 分析する。"""
-    async with semaphore:
-        # リクエスト間隔
-        await asyncio.sleep(L3_REQUEST_INTERVAL_MS / 1000)
+    limiter: AdaptiveLimiter,
+    cache: PromptCache,
+) -> tuple[list[L3Outcome], int, int]:
+    """1論文を L3 分析する。並列数は Gemini 呼び出しごとに limiter が制限する。"""
+    result, in_tokens, out_tokens = await _call_gemini(client, paper, limiter, cache)
+    if result is not None:
+        await _apply_l3_results({paper.arxiv_id: result})
+
+    return [(paper.arxiv_id, result)], in_tokens, out_tokens
+
+
+async def _process_batch(
+    client: genai.Client,
+    papers: list[L2Paper],
+    limiter: AdaptiveLimiter,
+    batch_cache: PromptCache,
+    single_cache: PromptCache,
+) -> tuple[list[L3Outcome], int, int]:
+    """複数論文を1リクエストで L3 分析し、応答に含まれなかった論文は1論文ずつ呼び出す。"""
+    results, in_tokens, out_tokens = await _call_gemini_batch(client, papers, limiter, batch_cache)
+
+    missing = [p for p in papers if p.arxiv_id not in results]
+    if missing:
+        logger.warning(
+            "L3 batch response incomplete, falling back to single calls",
+            extra={"requested": len(papers), "missing": [p.arxiv_id for p in missing]},
+        )
+        singles = await asyncio.gather(
+            *(_call_gemini(client, p, limiter, single_cache) for p in missing)
+        )
+        for paper, (result, single_in, single_out) in zip(missing, singles, strict=True):
+            in_tokens += single_in
+            out_tokens += single_out
+            if result is not None:
+                results[paper.arxiv_id] = result
 
-        result, in_tokens, out_tokens = await _call_gemini(client, paper)
-        if result is not None:
-            await _update_l3_result(paper.arxiv_id, result)
+    # 単独呼び出しの分も含め、UPDATE ... FROM unnest(...) の1文でまとめて反映する
+    await _apply_l3_results(results)
 
-        return paper.arxiv_id, result, in_tokens, out_tokens
+    return [(p.arxiv_id, results.get(p.arxiv_id)) for p in papers], in_tokens, out_tokens
 
 
 # ---------------------------------------------------------------------------
 # メイン: L3 分析
 # ---------------------------------------------------------------------------
-async def run_l3(papers: list[L2Paper]) -> tuple[list[L2Paper], int, int]:
+async def run_l3(
+    papers: list[L2Paper],
+    limiter: AdaptiveLimiter | None = None,
+    batch_size: int = L3_BATCH_SIZE,
+    force: bool = False,
+) -> tuple[list[L2Paper], int, int]:
     """L3: Gemini LLM 分析を実行する。
 
+    分析済みの論文と、同じプロンプトの結果がキャッシュにある論文は API を呼ばない。
+
     Args:
         papers: L2 を通過した論文リスト
+        limiter: Gemini の同時実行数リミッター (Post-L3 と共有する。省略時は新規作成)
+        batch_size: 1リクエストにまとめる論文数 (1 なら論文ごとに呼び出す)
+        force: True なら分析済み・キャッシュ済みの論文も API で再分析する
 
     Returns:
         (L3 で is_relevant=True と判定された論文リスト, total_in_tokens, total_out_tokens)
@@ -177,18 +466,37 @@ async def run_l3(papers: list[L2Paper]) -> tuple[list[L2Paper], int, int]:
         logger.info("L3: No papers to process")
         return [], 0, 0
 
-    logger.info("L3 analysis started", extra={"input_count": len(papers)})
+    all_papers = papers
+    papers, reused = await _reuse_l3_results(papers, force)
+    if not papers:
+        logger.info("L3: All papers reused", extra={"reused_count": len(reused)})
+        return [p for p in all_papers if reused.get(p.arxiv_id)], 0, 0
+
+    batch_size = max(1, batch_size)
+    logger.info("L3 analysis started", extra={"input_count": len(papers), "batch_size": batch_size})
 
     client = genai.Client(api_key=get_gemini_api_key())
-    semaphore = asyncio.Semaphore(L3_CONCURRENCY)
-
-    tasks = [_process_paper(client, p, semaphore) for p in papers]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    limiter = limiter or create_gemini_limiter()
+
+    # システムプロンプトのキャッシュは最初に使われた時点で作成し、終了時に削除する
+    single_cache = PromptCache(client, "l3", L3_SYSTEM_PROMPT)
+    batch_cache = PromptCache(client, "l3_batch", L3_BATCH_SYSTEM_PROMPT)
+
+    groups = [papers[i : i + batch_size] for i in range(0, len(papers), batch_size)]
+    tasks = [
+        _process_batch(client, group, limiter, batch_cache, single_cache)
+        if len(group) > 1
+        else _process_paper(client, group[0], limiter, single_cache)
+        for group in groups
+    ]
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await asyncio.gather(single_cache.close(), batch_cache.close())
 
     # 結果集計
-    relevant_papers: list[L2Paper] = []
     errors: list[str] = []
-    paper_map = {p.arxiv_id: p for p in papers}
+    analyzed: dict[str, L3Response] = {}
 
     total_in_tokens = 0
     total_out_tokens = 0
@@ -197,25 +505,30 @@ async def run_l3(papers: list[L2Paper]) -> tuple[list[L2Paper], int, int]:
         if isinstance(r, BaseException):
             errors.append(str(r))
             continue
-        arxiv_id, l3_result, in_tok, out_tok = r
+        outcomes, in_tok, out_tok = r
         total_in_tokens += in_tok
         total_out_tokens += out_tok
+        analyzed.update((arxiv_id, res) for arxiv_id, res in outcomes if res is not None)
+
+    await _remember_l3_results(papers, analyzed)
 
-        if l3_result is not None and l3_result.is_relevant:
-            paper = paper_map.get(arxiv_id)
-            if paper is not None:
-                relevant_papers.append(paper)
+    relevance = {**reused, **{arxiv_id: res.is_relevant for arxiv_id, res in analyzed.items()}}
+    relevant_papers = [p for p in all_papers if relevance.get(p.arxiv_id)]
+    relevant_analyzed = sum(1 for res in analyzed.values() if res.is_relevant)
 
     logger.info(
         "L3 analysis completed",
         extra={
-            "input_count": len(papers),
+            "input_count": len(all_papers),
+            "reused_count": len(reused),
             "relevant_count": len(relevant_papers),
-            "rejected_count": len(papers) - len(relevant_papers) - len(errors),
-            "error_count": len(errors),
+            "rejected_count": len(analyzed) - relevant_analyzed,
+            "error_count": len(papers) - len(analyzed),
+            "request_groups": len(groups),
             "in_tokens": total_in_tokens,
             "out_tokens": total_out_tokens,
         },
     )
+    limiter.record_metrics("l3")
 
     return relevant_papers, total_in_tokens, total_out_tokens
@@ -0,0 +1,362 @@
+"""
+AI Research OS — L3: Gemini バッチ予測モード
+
+L3_MODE = "batch_prediction" のときに run_l3 の代わりに使う。
+対話的なレイテンシが不要な日次バッチ向けで、料金は対話呼び出しの約半分になり、
+Lambda がレート制限待ちで遊ぶこともない。
+1. 前回までに投入したジョブ (l3_batch_jobs) の状態を確認し、完了していれば
+   結果 JSONL をダウンロードして papers に一括反映する
+2. 今回の L2 通過論文 (と失敗したジョブの論文) を build_l3_prompt で JSONL に書き出し、
+   バッチジョブとして投入する
+
+結果は投入した実行ではなく、次回以降の実行で取り込まれる (Post-L3 もその時点で行う)。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from google import genai
+from google.genai import types
+from pydantic import ValidationError
+
+from batch.config import (
+    GEMINI_MODEL,
+    L3_BATCH_PREDICTION_DIR,
+    L3_SYSTEM_PROMPT,
+    L3_TEMPERATURE,
+)
+from batch.l3_analyzer import (
+    _apply_l3_results,
+    _remember_l3_results,
+    _reuse_l3_results,
+    _token_counts,
+    build_l3_prompt,
+)
+from utils.db import get_async_connection
+from utils.logger import logger
+from utils.models import L2Paper, L3Response
+from utils.secrets import get_gemini_api_key
+
+_SUCCEEDED_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+}
+_FAILED_STATES = {
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+
+
+@dataclass
+class BatchPredictionCounts:
+    """1回の実行で扱った論文数。それぞれ別の論文集合を数える。"""
+
+    submitted: int = 0  # 今回新しいジョブに投入した論文
+    applied: int = 0  # 結果を反映した論文 (完了したジョブの取り込み + キャッシュの再利用)
+    pending: int = 0  # 実行中のジョブに残っている論文
+
+
+# ---------------------------------------------------------------------------
+# ジョブ入出力 (JSONL)
+# ---------------------------------------------------------------------------
+def build_batch_request(paper: L2Paper) -> dict[str, Any]:
+    """1論文分のバッチ予測リクエスト (JSONL の1行) を構築する。key は arxiv_id。"""
+    return {
+        "key": paper.arxiv_id,
+        "request": {
+            "contents": [{"role": "user", "parts": [{"text": build_l3_prompt(paper)}]}],
+            "system_instruction": {"parts": [{"text": L3_SYSTEM_PROMPT}]},
+            "generation_config": {
+                "response_mime_type": "application/json",
+                "response_json_schema": L3Response.model_json_schema(),
+                "temperature": L3_TEMPERATURE,
+            },
+        },
+    }
+
+
+def parse_batch_output(data: bytes) -> tuple[dict[str, L3Response], int, int, int]:
+    """結果 JSONL を解析し (arxiv_id → L3Response, in_tokens, out_tokens, エラー行数) を返す。"""
+    results: dict[str, L3Response] = {}
+    in_tokens = 0
+    out_tokens = 0
+    error_count = 0
+    for line in data.decode().splitlines():
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            response = types.GenerateContentResponse.model_validate(row["response"])
+            line_in, line_out = _token_counts(response)
+            in_tokens += line_in
+            out_tokens += line_out
+            results[row["key"]] = L3Response.model_validate_json(response.text or "")
+        except (json.JSONDecodeError, KeyError, TypeError, ValidationError):
+            # リクエスト単位のエラー ({"key": ..., "error": ...}) もここで数える
+            error_count += 1
+    return results, in_tokens, out_tokens, error_count
+
+
+def _write_requests(path: str, papers: list[L2Paper]) -> None:
+    """論文のバッチ予測リクエストを JSONL ファイルに書き出す。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for paper in papers:
+            f.write(json.dumps(build_batch_request(paper), ensure_ascii=False) + "\n")
+
+
+async def _submit_job(client: genai.Client, papers: list[L2Paper]) -> str:
+    """論文を JSONL に書き出してアップロードし、バッチジョブを作成してジョブ名を返す。"""
+    path = os.path.join(L3_BATCH_PREDICTION_DIR, f"l3_{papers[0].arxiv_id}_{len(papers)}.jsonl")
+    # ファイル書き出しはイベントループを止めないようスレッドで行う
+    await asyncio.to_thread(_write_requests, path, papers)
+
+    try:
+        uploaded = await client.aio.files.upload(
+            file=path,
+            config=types.UploadFileConfig(display_name=os.path.basename(path), mime_type="jsonl"),
+        )
+        job = await client.aio.batches.create(
+            model=GEMINI_MODEL,
+            src=uploaded.name or "",
+            config=types.CreateBatchJobConfig(display_name=f"ai-research-os-l3-{len(papers)}"),
+        )
+    finally:
+        os.remove(path)
+    return job.name or ""
+
+
+# ---------------------------------------------------------------------------
+# DB 操作
+# ---------------------------------------------------------------------------
+async def _fetch_open_jobs() -> list[tuple[int, str, list[L2Paper]]]:
+    """結果を取り込んでいないジョブを (id, job_name, 論文リスト) で返す (投入順)。"""
+    conn = await get_async_connection()
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT id, job_name, papers FROM l3_batch_jobs
+            WHERE status = 'submitted'
+            ORDER BY submitted_at
+            """
+        )
+        rows = await cur.fetchall()
+    return [(r[0], r[1], [L2Paper.model_validate(p) for p in r[2]]) for r in rows]
+
+
+async def _record_submission(
+    job_name: str, papers: list[L2Paper], failed_jobs: list[tuple[int, str]]
+) -> None:
+    """失敗したジョブの終了と、その論文を含む新しいジョブの記録を1トランザクションで行う。
+
+    投入に成功してから呼ぶ。投入や記録に失敗した場合は失敗したジョブが submitted のまま残り、
+    次回の実行で再び失敗を検出して再投入する (論文が宙に浮かない)。
+
+    Args:
+        job_name: 投入したジョブ名 (空文字なら投入していない)
+        papers: 投入した論文リスト
+        failed_jobs: 失敗したジョブの (id, provider_state) リスト
+    """
+    conn = await get_async_connection()
+    async with conn.cursor() as cur:
+        for job_id, provider_state in failed_jobs:
+            await cur.execute(
+                """
+                UPDATE l3_batch_jobs
+                SET status = 'failed', provider_state = %s, completed_at = NOW()
+                WHERE id = %s
+                """,
+                (provider_state, job_id),
+            )
+        if job_name:
+            await cur.execute(
+                """
+                INSERT INTO l3_batch_jobs (job_name, papers, request_count)
+                VALUES (%s, %s, %s)
+                """,
+                (job_name, json.dumps([p.model_dump(mode="json") for p in papers]), len(papers)),
+            )
+    await conn.commit()
+
+
+async def _finish_job(
+    job_id: int,
+    status: str,
+    provider_state: str,
+    applied_count: int = 0,
+    error_count: int = 0,
+    in_tokens: int = 0,
+    out_tokens: int = 0,
+) -> None:
+    """結果を取り込んだジョブを終了状態 (applied) にする。"""
+    conn = await get_async_connection()
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE l3_batch_jobs SET
+                status = %s,
+                provider_state = %s,
+                applied_count = %s,
+                error_count = %s,
+                input_tokens = %s,
+                output_tokens = %s,
+                completed_at = NOW()
+            WHERE id = %s
+            """,
+            (status, provider_state, applied_count, error_count, in_tokens, out_tokens, job_id),
+        )
+    await conn.commit()
+
+
+# ---------------------------------------------------------------------------
+# メイン: L3 バッチ予測
+# ---------------------------------------------------------------------------
+async def run_l3_batch_prediction(
+    papers: list[L2Paper], client: genai.Client | None = None, force: bool = False
+) -> tuple[list[L2Paper], int, int, BatchPredictionCounts]:
+    """完了したバッチジョブの結果を取り込み、今回の論文を新しいジョブとして投入する。
+
+    分析済みの論文と、同じプロンプトの結果がキャッシュにある論文は投入しない
+    (キャッシュの結果はその場で反映し、戻り値にも含める)。
+
+    Args:
+        papers: 今回 L2 を通過した論文リスト
+        client: Gemini クライアント (省略時は新規作成)
+        force: True なら分析済み・キャッシュ済みの論文も投入する
+
+    Returns:
+        (反映した結果のうち is_relevant=True の論文リスト, 合計入力トークン, 合計出力トークン,
+        投入・反映・実行中の論文数)
+        トークン数は取り込んだ結果の分で、料金は GEMINI_BATCH_PRICE_FACTOR 倍になる。
+        関連論文は今回投入した論文ではなく反映した論文の中から数える
+    """
+    client = client or genai.Client(api_key=get_gemini_api_key())
+
+    relevant_papers: list[L2Paper] = []
+    resubmit: list[L2Paper] = []
+    failed_jobs: list[tuple[int, str]] = []
+    counts = BatchPredictionCounts()
+    total_in_tokens = 0
+    total_out_tokens = 0
+    pending_count = 0
+    in_flight: set[str] = set()  # 実行中のジョブに投入済みの論文
+
+    # 1. 前回までのジョブの結果を取り込む
+    for job_id, job_name, job_papers in await _fetch_open_jobs():
+        try:
+            job = await client.aio.batches.get(name=job_name)
+        except Exception:
+            # 状態を確認できないジョブは実行中として残し、次回の実行で確認し直す
+            pending_count += 1
+            counts.pending += len(job_papers)
+            in_flight.update(p.arxiv_id for p in job_papers)
+            logger.warning(
+                "L3 batch prediction job poll failed, keeping it open",
+                extra={"job_name": job_name},
+                exc_info=True,
+            )
+            continue
+        state = job.state.value if job.state else "JOB_STATE_UNSPECIFIED"
+
+        if job.state in _FAILED_STATES:
+            logger.warning(
+                "L3 batch prediction job failed, resubmitting",
+                extra={"job_name": job_name, "state": state, "paper_count": len(job_papers)},
+            )
+            # 失敗の記録は再投入に成功してから行う (_record_submission)
+            failed_jobs.append((job_id, state))
+            resubmit.extend(job_papers)
+            continue
+        if job.state not in _SUCCEEDED_STATES:
+            pending_count += 1
+            counts.pending += len(job_papers)
+            in_flight.update(p.arxiv_id for p in job_papers)
+            logger.info(
+                "L3 batch prediction job still running",
+                extra={"job_name": job_name, "state": state},
+            )
+            continue
+
+        output_file = job.dest.file_name if job.dest else None
+        data = await client.aio.files.download(file=output_file or "") if output_file else None
+        results, in_tokens, out_tokens, _ = parse_batch_output(data or b"")
+        # 結果の無い論文 (リクエスト単位のエラー) は再投入しない (対話モードの全リトライ失敗と同じ)
+        error_count = len(job_papers) - len(results)
+        await _apply_l3_results(results)
+        await _remember_l3_results(job_papers, results)
+        await _finish_job(
+            job_id,
+            "applied",
+            state,
+            applied_count=len(results),
+            error_count=error_count,
+            in_tokens=in_tokens,
+            out_tokens=out_tokens,
+        )
+        total_in_tokens += in_tokens
+        total_out_tokens += out_tokens
+        counts.applied += len(results)
+        relevant_papers.extend(
+            p for p in job_papers if p.arxiv_id in results and results[p.arxiv_id].is_relevant
+        )
+        logger.info(
+            "L3 batch prediction results applied",
+            extra={
+                "job_name": job_name,
+                "request_count": len(job_papers),
+                "applied_count": len(results),
+                "error_count": error_count,
+                "in_tokens": in_tokens,
+                "out_tokens": out_tokens,
+            },
+        )
+
+    # 2. 今回の論文 (と失敗したジョブの論文) を新しいジョブとして投入する
+    # L2 は結果未取り込みの論文も渡し直すため、実行中のジョブにある論文は除く
+    candidates = list(
+        {p.arxiv_id: p for p in [*resubmit, *papers] if p.arxiv_id not in in_flight}.values()
+    )
+    # 1. で取り込んだ結果は反映済みなので、投入に失敗してもその関連論文は返す
+    # (返さないと以降の実行にも引き継がれず、Post-L3 が行われない)
+    reused: dict[str, bool] = {}
+    job_name = ""
+    try:
+        to_submit, reused = await _reuse_l3_results(candidates, force)
+        relevant_papers.extend(p for p in candidates if reused.get(p.arxiv_id))
+        counts.applied += len(reused)
+        if to_submit:
+            job_name = await _submit_job(client, to_submit)
+            counts.submitted = len(to_submit)
+        if job_name or failed_jobs:
+            await _record_submission(job_name, to_submit, failed_jobs)
+    except Exception:
+        # 失敗したジョブは submitted のまま残り、次回の実行で再投入する
+        logger.error(
+            "L3 batch prediction submission failed",
+            extra={"candidate_count": len(candidates), "job_name": job_name},
+            exc_info=True,
+        )
+
+    logger.info(
+        "L3 batch prediction completed",
+        extra={
+            "relevant_count": len(relevant_papers),
+            "applied_count": counts.applied,
+            "pending_jobs": pending_count,
+            "pending_count": counts.pending,
+            "submitted_count": counts.submitted,
+            "resubmitted_count": len(resubmit),
+            "reused_count": len(reused),
+            "job_name": job_name,
+            "in_tokens": total_in_tokens,
+            "out_tokens": total_out_tokens,
+        },
+    )
+
+    return relevant_papers, total_in_tokens, total_out_tokens, counts
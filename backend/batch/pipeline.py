@@ -1,28 +1,36 @@
 """
 AI Research OS — パイプラインオーケストレーター
 
-L1 → L2 → L3 → Post-L3 の4段階パイプラインを順次実行し、
+L1 → L2 → L3 → Post-L3 の4段階パイプラインを実行し、
 batch_logs テーブルに結果を記録する。
+L1 の arXiv 収集と L2 の Embedding 生成はカテゴリ単位で重ねて実行する。
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import time
 from datetime import datetime, timezone
 
-from batch.l1_collector import collect_papers, compute_date_range
-from batch.l2_selector import run_l2
+from batch.config import GEMINI_BATCH_PRICE_FACTOR, L3_MODE
+from batch.gemini_limiter import create_gemini_limiter
+from batch.l1_collector import collect_papers_async, compute_date_range, deduplicate
+from batch.l2_selector import embed_collected_batches, run_l2
 from batch.l3_analyzer import run_l3
+from batch.l3_batch_prediction import run_l3_batch_prediction
 from batch.post_l3_reviewer import run_post_l3
 from utils.db import close_connections, get_async_connection
 from utils.logger import CurationStats, log_curation_stats, logger
-from utils.models import BatchLogEntry
+from utils.models import ArxivPaper, BatchLogEntry
 
 
-async def run_pipeline() -> BatchLogEntry:
+async def run_pipeline(force_l3: bool = False) -> BatchLogEntry:
     """パイプライン全体を実行する。
 
+    Args:
+        force_l3: True なら分析済み・キャッシュ済みの論文も L3 で再分析する
+
     Returns:
         バッチ実行ログ
     """
@@ -34,23 +42,27 @@ async def run_pipeline() -> BatchLogEntry:
     logger.info("Pipeline started", extra={"execution_date": today})
 
     # -----------------------------------------------------------------------
-    # L1: arXiv API 収集 (同期)
+    # L1: arXiv API 収集 (非同期) + L2 Embedding 生成 (L1 と並行)
     # -----------------------------------------------------------------------
+    queue: asyncio.Queue[list[ArxivPaper] | None] = asyncio.Queue()
+    l1_task = asyncio.create_task(collect_papers_async(queue))
+    raw_papers, embeddings = await embed_collected_batches(queue)
     try:
-        l1_papers = collect_papers()
+        await l1_task
     except Exception as e:
         logger.error("L1 failed", exc_info=True)
         errors.append(f"L1: {e}")
-        l1_papers = []
 
-    l1_raw_count = len(l1_papers)
-    l1_dedup_count = len(l1_papers)  # collect_papers() は重複排除済み
+    l1_papers = deduplicate(raw_papers)
+    l1_raw_count = len(raw_papers)
+    l1_dedup_count = len(l1_papers)
 
     # -----------------------------------------------------------------------
     # L2: pgvector 選別 (同期)
     # -----------------------------------------------------------------------
     try:
-        l2_papers = run_l2(l1_papers)
+        # force_l3 のときは分析済みの登録済み論文も L3 へ渡す
+        l2_papers = run_l2(l1_papers, embeddings, force=force_l3)
     except Exception as e:
         logger.error("L2 failed", exc_info=True)
         errors.append(f"L2: {e}")
@@ -61,13 +73,33 @@ async def run_pipeline() -> BatchLogEntry:
     # -----------------------------------------------------------------------
     # L3: Gemini LLM 分析 (非同期)
     # -----------------------------------------------------------------------
+    # L3 と Post-L3 は同じ Gemini クォータを使うため、同時実行数の学習結果を引き継ぐ
+    gemini_limiter = create_gemini_limiter()
     l3_in_tokens = 0
     l3_out_tokens = 0
     l3_cost_usd: float = 0.0
+    # L3 に投入した論文数と、結果を反映した論文数 (関連率の分母)。
+    # 対話モードではどちらも L2 通過数だが、バッチ予測モードでは別の論文集合になる
+    l3_submitted_count = l2_passed_count
+    l3_input_count = l2_passed_count
     try:
-        l3_papers, l3_in_tokens, l3_out_tokens = await run_l3(l2_papers)
+        if L3_MODE == "batch_prediction":
+            # 今回の論文はジョブに投入し、前回までのジョブの結果を取り込む
+            l3_papers, l3_in_tokens, l3_out_tokens, counts = await run_l3_batch_prediction(
+                l2_papers, force=force_l3
+            )
+            l3_submitted_count = counts.submitted
+            l3_input_count = counts.applied
+            price_factor = GEMINI_BATCH_PRICE_FACTOR
+        else:
+            l3_papers, l3_in_tokens, l3_out_tokens = await run_l3(
+                l2_papers, gemini_limiter, force=force_l3
+            )
+            price_factor = 1.0
         # Gemini 2.5 Flash Pricing (approx: $0.075 / 1M input, $0.30 / 1M output tokens)
-        l3_cost_usd = (l3_in_tokens / 1_000_000) * 0.075 + (l3_out_tokens / 1_000_000) * 0.30
+        l3_cost_usd = price_factor * (
+            (l3_in_tokens / 1_000_000) * 0.075 + (l3_out_tokens / 1_000_000) * 0.30
+        )
     except Exception as e:
         logger.error("L3 failed", exc_info=True)
         errors.append(f"L3: {e}")
@@ -98,7 +130,9 @@ async def run_pipeline() -> BatchLogEntry:
     # -----------------------------------------------------------------------
     figures_extracted = 0
     try:
-        success_count, figures_extracted, post_errors = await run_post_l3(l3_papers, summaries)
+        success_count, figures_extracted, post_errors = await run_post_l3(
+            l3_papers, summaries, gemini_limiter
+        )
         errors.extend(post_errors)
     except Exception as e:
         logger.error("Post-L3 failed", exc_info=True)
@@ -115,7 +149,7 @@ async def run_pipeline() -> BatchLogEntry:
         l2_passed=l2_passed_count,
         l2_filtered=l1_dedup_count - l2_passed_count,
         l3_passed=l3_relevant_count,
-        l3_filtered=l2_passed_count - l3_relevant_count,
+        l3_filtered=l3_input_count - l3_relevant_count,
     )
     log_curation_stats(stats)
 
@@ -128,10 +162,11 @@ async def run_pipeline() -> BatchLogEntry:
         l2_input_count=l1_dedup_count,
         l2_passed_count=l2_passed_count,
         l2_pass_rate=round(l2_passed_count / l1_dedup_count * 100, 1) if l1_dedup_count else 0,
-        l3_input_count=l2_passed_count,
+        l3_submitted_count=l3_submitted_count,
+        l3_input_count=l3_input_count,
         l3_relevant_count=l3_relevant_count,
         l3_relevance_rate=(
-            round(l3_relevant_count / l2_passed_count * 100, 1) if l2_passed_count else 0
+            round(l3_relevant_count / l3_input_count * 100, 1) if l3_input_count else 0
         ),
         l3_input_tokens=l3_in_tokens,
         l3_output_tokens=l3_out_tokens,
@@ -151,11 +186,11 @@ async def run_pipeline() -> BatchLogEntry:
                     execution_date, date_range,
                     l1_raw_count, l1_dedup_count,
                     l2_input_count, l2_passed_count, l2_pass_rate,
-                    l3_input_count, l3_relevant_count, l3_relevance_rate,
+                    l3_submitted_count, l3_input_count, l3_relevant_count, l3_relevance_rate,
                     l3_input_tokens, l3_output_tokens, l3_cost_usd,
                     figures_extracted, errors, processing_time_sec
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """,
                 (
                     log_entry.execution_date,
@@ -165,6 +200,7 @@ async def run_pipeline() -> BatchLogEntry:
                     log_entry.l2_input_count,
                     log_entry.l2_passed_count,
                     log_entry.l2_pass_rate,
+                    log_entry.l3_submitted_count,
                     log_entry.l3_input_count,
                     log_entry.l3_relevant_count,
                     log_entry.l3_relevance_rate,
@@ -190,6 +226,8 @@ async def run_pipeline() -> BatchLogEntry:
             "processing_time_sec": elapsed,
             "l1_dedup": l1_dedup_count,
             "l2_passed": l2_passed_count,
+            "l3_submitted": l3_submitted_count,
+            "l3_applied": l3_input_count,
             "l3_relevant": l3_relevant_count,
             "figures": figures_extracted,
             "error_count": len(errors),
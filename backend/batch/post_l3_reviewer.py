@@ -5,7 +5,9 @@ L3通過論文に対して:
 1. PDF ダウンロード
 2. Gemini 2.0 Flash で PDF 全文分析 (詳細解説生成)
 3. PyMuPDF で図表抽出 → S3 アップロード
-を3並列で実行する。
+を3並列で実行する。Gemini の呼び出しは L3 と共有する AIMD リミッター
+(batch.gemini_limiter) も経由し、システムプロンプトはコンテキストキャッシュ
+(batch.gemini_cache) 経由で参照する。
 """
 
 from __future__ import annotations
@@ -33,6 +35,8 @@ from batch.config import (
     POST_L3_TEMPERATURE,
     POST_L3_USER_PROMPT_TEMPLATE,
 )
+from batch.gemini_cache import PromptCache
+from batch.gemini_limiter import AdaptiveLimiter, create_gemini_limiter
 from utils.db import get_async_connection
 from utils.logger import logger
 from utils.models import DetailReview, ExtractedFigure, L2Paper
@@ -69,8 +73,13 @@ async def _generate_detail_review(
     paper: L2Paper,
     pdf_bytes: bytes,
     summary_ja: str,
+    limiter: AdaptiveLimiter,
+    cache: PromptCache,
 ) -> DetailReview | None:
-    """Gemini 2.0 Flash で PDF 全文を分析し DetailReview を生成する。"""
+    """Gemini 2.0 Flash で PDF 全文を分析し DetailReview を生成する。
+
+    同時実行枠は API 呼び出しの間だけ確保し、リトライ前のバックオフ中は手放す。
+    """
     category_name = CATEGORY_NAMES.get(paper.best_category_id, "Unknown")
     user_prompt = POST_L3_USER_PROMPT_TEMPLATE.format(
         title=paper.title,
@@ -85,18 +94,17 @@ async def _generate_detail_review(
         try:
             # PDF を Part として送信
             pdf_part = types.Part.from_bytes(data=pdf_bytes, mime_type="application/pdf")
-
-            response = await client.aio.models.generate_content(
-                model=GEMINI_MODEL,
-                contents=[pdf_part, user_prompt],
-                config=types.GenerateContentConfig(
-                    system_instruction=POST_L3_SYSTEM_PROMPT,
-                    response_mime_type="application/json",
-                    response_schema=DetailReview,
-                    temperature=POST_L3_TEMPERATURE,
-                ),
+            config = await cache.config(
+                response_mime_type="application/json",
+                response_schema=DetailReview,
+                temperature=POST_L3_TEMPERATURE,
             )
 
+            async with limiter.slot("post_l3"):
+                response = await client.aio.models.generate_content(
+                    model=GEMINI_MODEL, contents=[pdf_part, user_prompt], config=config
+                )
+
             if response.text is None:
                 logger.warning(
                     "Post-L3 empty response",
@@ -112,7 +120,8 @@ async def _generate_detail_review(
                 "Post-L3 JSON parse error",
                 extra={"arxiv_id": paper.arxiv_id, "attempt": attempt + 1},
             )
-        except Exception:
+        except Exception as exc:
+            cache.invalidate(exc)
             wait = BACKOFF_BASE_SEC * (2**attempt)
             logger.warning(
                 "Post-L3 API error, retrying",
@@ -297,6 +306,8 @@ async def _process_relevant_paper(
     client: genai.Client,
     paper: L2Paper,
     summary_ja: str,
+    limiter: AdaptiveLimiter,
+    cache: PromptCache,
 ) -> tuple[DetailReview | None, list[ExtractedFigure]]:
     """L3通過論文に対する後処理: PDF分析 + 図表抽出を並列実行。"""
     # PDF ダウンロード
@@ -307,7 +318,7 @@ async def _process_relevant_paper(
 
     # 並列実行: Gemini分析 & PyMuPDF図表抽出
     analysis_task = asyncio.create_task(
-        _generate_detail_review(client, paper, pdf_bytes, summary_ja)
+        _generate_detail_review(client, paper, pdf_bytes, summary_ja, limiter, cache)
     )
     figures_task = asyncio.create_task(extract_and_upload_figures(paper.arxiv_id, pdf_bytes))
 
@@ -327,12 +338,14 @@ async def _process_relevant_paper(
 async def run_post_l3(
     papers: list[L2Paper],
     summaries: dict[str, str] | None = None,
+    limiter: AdaptiveLimiter | None = None,
 ) -> tuple[int, int, list[str]]:
     """Post-L3: PDF全文分析 + 図表抽出を実行する。
 
     Args:
         papers: L3 で is_relevant=True と判定された論文リスト
         summaries: arxiv_id → summary_ja のマッピング (L3結果から)
+        limiter: Gemini の同時実行数リミッター (L3 と共有する。省略時は新規作成)
 
     Returns:
         (成功数, 図表抽出総数, エラーリスト) のタプル
@@ -345,6 +358,8 @@ async def run_post_l3(
 
     client = genai.Client(api_key=get_gemini_api_key())
     semaphore = asyncio.Semaphore(POST_L3_CONCURRENCY)
+    limiter = limiter or create_gemini_limiter()
+    cache = PromptCache(client, "post_l3", POST_L3_SYSTEM_PROMPT)
     summaries = summaries or {}
 
     async def process_with_limit(
@@ -355,7 +370,8 @@ async def run_post_l3(
             summary_ja = summaries.get(paper.arxiv_id, "")
             try:
                 res = await asyncio.wait_for(
-                    _process_relevant_paper(client, paper, summary_ja), timeout=300
+                    _process_relevant_paper(client, paper, summary_ja, limiter, cache),
+                    timeout=300,
                 )
                 logger.info("Finished post-L3 paper", extra={"arxiv_id": paper.arxiv_id})
                 return res
@@ -371,7 +387,10 @@ async def run_post_l3(
                 raise e
 
     tasks = [process_with_limit(p) for p in papers]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await cache.close()
 
     # 集計
     success_count = 0
@@ -396,5 +415,6 @@ async def run_post_l3(
             "error_count": len(errors),
         },
     )
+    limiter.record_metrics("post_l3")
 
     return success_count, total_figures, errors
@@ -0,0 +1,131 @@
+"""
+L1 重複排除のマイクロベンチマーク。
+
+旧実装 (重複のたびに model_copy + list(set(...)) で再構築) と現行実装
+(ID ごとのクエリ集合を集めて最後に初出の論文へ1回だけ反映) の処理時間を比較する。
+現行実装は入力の初出の論文を書き換えるため、計測ごとにフィクスチャを作り直す。
+
+フィクスチャは 6 クエリ分の収集結果を模した合成データで、各論文は
+1〜3 クエリにヒットする (arXiv のクロスリストと同程度の重複率)。
+
+使い方:
+    uv run python -m scripts.bench_l1_dedup [--sizes 10000 100000] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import statistics
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+
+from batch.l1_collector import deduplicate
+from utils.models import ArxivPaper
+
+QUERY_COUNT = 6
+
+
+# ---------------------------------------------------------------------------
+# フィクスチャ
+# ---------------------------------------------------------------------------
+def build_papers(count: int, seed: int = 0) -> list[ArxivPaper]:
+    """count 件 (重複を含む) の論文リストをクエリ順に並べて返す。"""
+    rng = random.Random(seed)
+    published_at = datetime(2026, 2, 11, tzinfo=UTC)
+    by_query: list[list[ArxivPaper]] = [[] for _ in range(QUERY_COUNT)]
+    total = 0
+    paper_no = 0
+    while total < count:
+        arxiv_id = f"2402.{paper_no:05d}"
+        paper_no += 1
+        for query_id in rng.sample(range(1, QUERY_COUNT + 1), rng.choice([1, 1, 2, 3])):
+            by_query[query_id - 1].append(
+                ArxivPaper(
+                    arxiv_id=arxiv_id,
+                    title=f"Paper {arxiv_id}",
+                    abstract="Abstract.",
+                    authors=["Author"],
+                    primary_category="cs.CL",
+                    published_at=published_at,
+                    matched_queries=[query_id],
+                )
+            )
+            total += 1
+    return [p for papers in by_query for p in papers][:count]
+
+
+# ---------------------------------------------------------------------------
+# 旧実装 (比較用にそのまま保持)
+# ---------------------------------------------------------------------------
+def legacy_deduplicate(papers: list[ArxivPaper]) -> list[ArxivPaper]:
+    seen: dict[str, ArxivPaper] = {}
+    for paper in papers:
+        if paper.arxiv_id not in seen:
+            seen[paper.arxiv_id] = paper
+        else:
+            existing = seen[paper.arxiv_id]
+            merged_queries = list(set(existing.matched_queries + paper.matched_queries))
+            seen[paper.arxiv_id] = existing.model_copy(update={"matched_queries": merged_queries})
+    return list(seen.values())
+
+
+# ---------------------------------------------------------------------------
+# 計測
+# ---------------------------------------------------------------------------
+def _measure(fn: Callable[[list[ArxivPaper]], object], size: int, repeat: int) -> float:
+    """size 件のフィクスチャで repeat 回実行した中央値 (秒) を返す。
+
+    フィクスチャは毎回作り直し、その時間は計測に含めない。
+
+    timeit と同様に計測中は GC を止める。フィクスチャの大量のモデルを走査する
+    世代別 GC の時間が 100k 件では支配的になり、実装間の差を覆い隠すため。
+    """
+    timings = []
+    for _ in range(repeat):
+        papers = build_papers(size)
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn(papers)
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        legacy = legacy_deduplicate(build_papers(size))
+        papers = build_papers(size)
+        current = deduplicate(papers)
+        if [(p.arxiv_id, sorted(p.matched_queries)) for p in legacy] != [
+            (p.arxiv_id, p.matched_queries) for p in current
+        ]:
+            raise SystemExit("Dedup outputs differ between legacy and current implementations")
+
+        # 新たに作った論文モデルの数: 旧実装は重複1件ごと、現行実装は 0
+        input_ids = {id(p) for p in papers}
+        legacy_copies = len(papers) - len(legacy)
+        current_copies = sum(1 for p in current if id(p) not in input_ids)
+
+        legacy_sec = _measure(legacy_deduplicate, size, args.repeat)
+        current_sec = _measure(deduplicate, size, args.repeat)
+        print(
+            f"{size:>7} entries -> {len(current):>6} unique  "
+            f"legacy {legacy_sec * 1000:8.1f} ms ({legacy_copies} copies)  "
+            f"current {current_sec * 1000:8.1f} ms ({current_copies} copies)  "
+            f"speedup x{legacy_sec / current_sec:4.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+L1 Atom パーサーのマイクロベンチマーク。
+
+2,000 エントリーの Atom フィードに対して、旧実装 (ET.fromstring + エントリーごとの
+find/findall + 都度コンパイルの正規表現) と現行実装 (iter_entries + 単一走査の
+_parse_single_entry) の処理時間を比較する。
+
+フィクスチャは以下のいずれかを使う:
+    - 既定: arXiv API の応答形式を模した 2,000 件の合成フィード (決定的に生成)
+    - --fixture PATH: 保存済みの arXiv API レスポンス
+    - --capture PATH: arXiv API から 2,000 件取得して PATH に保存し、それを使う
+
+使い方:
+    uv run python -m scripts.bench_l1_parser [--fixture PATH | --capture PATH] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import statistics
+import time
+import xml.etree.ElementTree as ET
+from collections.abc import Callable
+from pathlib import Path
+
+import requests
+
+from batch.config import ARXIV_BASE_URL, ARXIV_QUERIES, ARXIV_TIMEOUT_SEC
+from batch.l1_collector import NS, _parse_datetime, _parse_single_entry, iter_entries
+from utils.models import ArxivPaper
+
+FIXTURE_ENTRIES = 2000
+
+
+# ---------------------------------------------------------------------------
+# フィクスチャ
+# ---------------------------------------------------------------------------
+def build_synthetic_feed(count: int = FIXTURE_ENTRIES, seed: int = 0) -> bytes:
+    """arXiv API の応答形式を模した Atom フィードを生成する。"""
+    rng = random.Random(seed)
+    words = [
+        "large",
+        "language",
+        "model",
+        "transformer",
+        "attention",
+        "cache",
+        "quantization",
+        "agent",
+    ]
+    entries: list[str] = []
+    for i in range(count):
+        abstract = " ".join(rng.choice(words) for _ in range(180))
+        authors = "".join(
+            f"<author><name>Author {i}-{j}</name></author>" for j in range(rng.randint(2, 8))
+        )
+        entries.append(
+            f"""
+  <entry>
+    <id>http://arxiv.org/abs/2402.{10000 + i}v{rng.randint(1, 3)}</id>
+    <updated>2026-02-11T12:00:00Z</updated>
+    <published>2026-02-11T12:00:00Z</published>
+    <title>Paper {i}:
+      {" ".join(rng.choice(words) for _ in range(8))}</title>
+    <summary>  {abstract}
+    </summary>
+    {authors}
+    <arxiv:comment>12 pages, 4 figures</arxiv:comment>
+    <link href="http://arxiv.org/abs/2402.{10000 + i}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/2402.{10000 + i}v1" rel="related"/>
+    <arxiv:primary_category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.AI" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+        )
+    feed = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" '
+        'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+        'xmlns:arxiv="http://arxiv.org/schemas/atom">'
+        f"{''.join(entries)}\n</feed>\n"
+    )
+    return feed.encode("utf-8")
+
+
+def capture_feed(path: Path, count: int = FIXTURE_ENTRIES) -> bytes:
+    """arXiv API から count 件を1リクエストで取得し、path に保存する。"""
+    query = str(ARXIV_QUERIES[0]["query"])
+    url = f"{ARXIV_BASE_URL}?search_query={query}&start=0&max_results={count}"
+    url += "&sortBy=submittedDate&sortOrder=descending"
+    response = requests.get(url, timeout=ARXIV_TIMEOUT_SEC * 4)
+    response.raise_for_status()
+    path.write_bytes(response.content)
+    return response.content
+
+
+# ---------------------------------------------------------------------------
+# 旧実装 (比較用にそのまま保持)
+# ---------------------------------------------------------------------------
+def _legacy_normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _legacy_extract_arxiv_id(id_url: str) -> str:
+    match = re.search(r"(\d{4}\.\d{4,5})(v\d+)?$", id_url)
+    if match:
+        return match.group(1)
+    match = re.search(r"([a-z-]+/\d{7})(v\d+)?$", id_url)
+    if match:
+        return match.group(1)
+    return id_url.split("/")[-1]
+
+
+def _legacy_parse_single_entry(entry: ET.Element, category_id: int) -> ArxivPaper | None:
+    id_elem = entry.find("atom:id", NS)
+    if id_elem is None or id_elem.text is None:
+        return None
+    arxiv_id = _legacy_extract_arxiv_id(id_elem.text)
+    title_elem = entry.find("atom:title", NS)
+    title = _legacy_normalize_text(
+        title_elem.text if title_elem is not None and title_elem.text else ""
+    )
+    summary_elem = entry.find("atom:summary", NS)
+    abstract = _legacy_normalize_text(
+        summary_elem.text if summary_elem is not None and summary_elem.text else ""
+    )
+    authors = []
+    for author_elem in entry.findall("atom:author", NS):
+        name_elem = author_elem.find("atom:name", NS)
+        if name_elem is not None and name_elem.text:
+            authors.append(name_elem.text)
+    pdf_url: str | None = None
+    for link_elem in entry.findall("atom:link", NS):
+        if link_elem.get("title") == "pdf":
+            pdf_url = link_elem.get("href")
+            break
+    published_elem = entry.find("atom:published", NS)
+    published_text = (
+        published_elem.text if published_elem is not None and published_elem.text else ""
+    )
+    primary_cat_elem = entry.find("arxiv:primary_category", NS)
+    primary_category = (
+        primary_cat_elem.get("term", "unknown") if primary_cat_elem is not None else "unknown"
+    )
+    all_categories = []
+    for cat_elem in entry.findall("atom:category", NS):
+        term = cat_elem.get("term")
+        if term:
+            all_categories.append(term)
+    return ArxivPaper(
+        arxiv_id=arxiv_id,
+        title=title,
+        abstract=abstract,
+        authors=authors,
+        pdf_url=pdf_url,
+        primary_category=primary_category,
+        all_categories=all_categories,
+        published_at=_parse_datetime(published_text),
+        matched_queries=[category_id],
+    )
+
+
+def _legacy_parse_entries(body: bytes) -> list[ArxivPaper]:
+    root = ET.fromstring(body.decode("utf-8"))
+    papers = []
+    for entry in root.findall("atom:entry", NS):
+        paper = _legacy_parse_single_entry(entry, 1)
+        if paper is not None:
+            papers.append(paper)
+    return papers
+
+
+def _current_parse_entries(body: bytes) -> list[ArxivPaper]:
+    chunk = 64 * 1024
+    return list(iter_entries((body[i : i + chunk] for i in range(0, len(body), chunk)), 1))
+
+
+# ---------------------------------------------------------------------------
+# 計測
+# ---------------------------------------------------------------------------
+def _measure(fn: Callable[[], object], repeat: int) -> float:
+    """repeat 回実行した中央値 (秒) を返す。"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _report(label: str, legacy_sec: float, current_sec: float, count: int) -> None:
+    print(
+        f"{label:<22} legacy {legacy_sec * 1000:8.1f} ms  "
+        f"current {current_sec * 1000:8.1f} ms  "
+        f"speedup x{legacy_sec / current_sec:4.2f}  "
+        f"({current_sec / count * 1e6:.1f} us/entry)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--fixture", type=Path, help="保存済みの arXiv Atom レスポンス")
+    source.add_argument("--capture", type=Path, help="arXiv から取得して保存する先")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.fixture:
+        body = args.fixture.read_bytes()
+    elif args.capture:
+        body = capture_feed(args.capture)
+    else:
+        body = build_synthetic_feed()
+
+    legacy = _legacy_parse_entries(body)
+    current = _current_parse_entries(body)
+    if legacy != current:
+        raise SystemExit("Parser outputs differ between legacy and current implementations")
+    count = len(current)
+    print(f"fixture: {count} entries, {len(body) / 1024:.0f} KiB")
+
+    # 1. エントリー抽出のみ (XML トークナイズを除いたホットパス)
+    entries = ET.fromstring(body).findall("atom:entry", NS)
+    _report(
+        "entry extraction",
+        _measure(lambda: [_legacy_parse_single_entry(e, 1) for e in entries], args.repeat),
+        _measure(lambda: [_parse_single_entry(e, 1) for e in entries], args.repeat),
+        count,
+    )
+
+    # 2. バイト列 → ArxivPaper リストまでの全体
+    _report(
+        "end-to-end parse",
+        _measure(lambda: _legacy_parse_entries(body), args.repeat),
+        _measure(lambda: _current_parse_entries(body), args.repeat),
+        count,
+    )
+
+
+if __name__ == "__main__":
+    main()
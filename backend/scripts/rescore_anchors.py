@@ -0,0 +1,51 @@
+"""
+AI Research OS — アンカー変更後の L2 再スコアリングスクリプト
+
+setup_anchors.py でアンカーを更新した後に実行し、papers の
+max_score / best_category_id / hit_count / all_scores / importance_score を
+現在のアンカーで計算し直す。
+
+チャンクごとに commit するため、中断した場合はログの last_id を
+--after-id に渡せば続きから再開できる。
+環境変数 (.env) の DATABASE_URL に接続する。
+
+使い方:
+    uv run python -m scripts.rescore_anchors [--after-id N] [--engine in_process|sql]
+        [--chunk-size N]
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import get_args
+
+from dotenv import load_dotenv
+
+from batch.config import L2_RESCORE_CHUNK_SIZE
+from batch.l2_selector import ScoringEngine, rescore_papers
+from utils.db import close_connections
+from utils.logger import logger
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--after-id", type=int, default=0)
+    parser.add_argument("--engine", choices=get_args(ScoringEngine.__value__), default="in_process")
+    parser.add_argument("--chunk-size", type=int, default=L2_RESCORE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    try:
+        result = rescore_papers(
+            after_id=args.after_id, engine=args.engine, chunk_size=args.chunk_size
+        )
+        logger.info("Rescore completed", extra=result.model_dump())
+    except Exception:
+        logger.error("Rescore failed", exc_info=True)
+        sys.exit(1)
+    finally:
+        asyncio.run(close_connections())
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,11 @@ AI Research OS — ローカルパイプライン実行スクリプト
 Lambdaにデプロイせずに手元でL1〜Post-L3の
 キュレーションパイプライン（日次バッチ処理）全体をローカルテストするためのスクリプトです。
 環境変数 (.env) から設定を読み込み実行します。
+
+ARXIV_CACHE_DIR を設定すると arXiv のレスポンスをディスクにキャッシュし、
+再実行時はレートリミットの待ち時間なしで L1 を再現できます。
+記録済みキャッシュをネットワークなしでリプレイする場合は
+ARXIV_CACHE_OFFLINE=1 と ARXIV_REPLAY_END_DATE=YYYYMMDD (記録した日) を併せて設定します。
 """
 
 import asyncio
@@ -1,21 +1,16 @@
 """
 初期データとして、関連度の高い有名な論文をAPIから取得し、
 パイプラインを通してDBにシードデータを投入するスクリプト。
+--force を付けると、分析済み・キャッシュ済みの論文も L3 で再分析する。
 """
 
+import argparse
 import asyncio
-import time
 
-import requests
 from dotenv import load_dotenv
 
-from batch.config import (
-    ARXIV_BASE_URL,
-    ARXIV_MAX_RETRIES,
-    ARXIV_QUERIES,
-    ARXIV_RATE_LIMIT_SEC,
-    ARXIV_TIMEOUT_SEC,
-)
+from batch.arxiv_client import get_arxiv_client
+from batch.config import ARXIV_BASE_URL, ARXIV_QUERIES
 from batch.l1_collector import deduplicate, parse_entries
 from batch.l2_selector import run_l2
 from batch.l3_analyzer import run_l3
@@ -29,6 +24,7 @@ load_dotenv()
 
 def fetch_seed_papers(max_results_per_category: int = 70) -> list[ArxivPaper]:
     all_papers: list[ArxivPaper] = []
+    client = get_arxiv_client()
 
     for q in ARXIV_QUERIES:
         category_id = int(str(q["category_id"]))
@@ -41,23 +37,9 @@ def fetch_seed_papers(max_results_per_category: int = 70) -> list[ArxivPaper]:
         params += "&sortBy=relevance&sortOrder=descending"
         url = f"{ARXIV_BASE_URL}?{params}"
 
-        xml_text = ""
-        for attempt in range(ARXIV_MAX_RETRIES):
-            try:
-                response = requests.get(url, timeout=ARXIV_TIMEOUT_SEC)
-                if response.status_code == 200:
-                    xml_text = response.text
-                    break
-                if response.status_code == 503:
-                    wait = ARXIV_RATE_LIMIT_SEC * (3**attempt)
-                    time.sleep(wait)
-                    continue
-                break
-            except requests.Timeout:
-                if attempt < ARXIV_MAX_RETRIES - 1:
-                    time.sleep(ARXIV_RATE_LIMIT_SEC)
-            except requests.RequestException:
-                break
+        # リクエスト間隔は共有クライアントのトークンバケットが保証する
+        body = client.get(url)
+        xml_text = body.decode("utf-8") if body is not None else ""
 
         if xml_text:
             papers = parse_entries(xml_text, category_id)
@@ -66,12 +48,10 @@ def fetch_seed_papers(max_results_per_category: int = 70) -> list[ArxivPaper]:
                 "Fetched papers from arXiv", extra={"category": category_name, "count": len(papers)}
             )
 
-        time.sleep(ARXIV_RATE_LIMIT_SEC)
-
     return deduplicate(all_papers)
 
 
-async def main() -> None:
+async def main(force_l3: bool = False) -> None:
     logger.info("Starting seed process...")
 
     # 1. 関連度の高い論文を取得 (各カテゴリ 70件目安 -> 重複排除後 300件強を想定)
@@ -84,7 +64,7 @@ async def main() -> None:
 
     # 2. L2 選別 (ベクトル生成・保存もここで行われる)
     try:
-        l2_papers = run_l2(l1_papers)
+        l2_papers = run_l2(l1_papers, force=force_l3)
     except Exception:
         logger.error("L2 failed", exc_info=True)
         return
@@ -95,7 +75,7 @@ async def main() -> None:
 
     # 3. L3 分析 (Gemini 判定・要約)
     try:
-        l3_papers, _, _ = await run_l3(l2_papers)
+        l3_papers, _, _ = await run_l3(l2_papers, force=force_l3)
     except Exception:
         logger.error("L3 failed", exc_info=True)
         return
@@ -137,4 +117,7 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Seed papers through the pipeline")
+    parser.add_argument("--force", action="store_true", help="L3 を分析済みの論文も再分析する")
+    args = parser.parse_args()
+    asyncio.run(main(force_l3=args.force))
@@ -2,14 +2,28 @@
 
 PGVector を有効化したデータベースに対して、6カテゴリのアンカーベクトルを生成し、
 `anchors` テーブルに挿入する。
+
+カテゴリ定義文のアンカー (anchor_key = 'default') に加えて、ARXIV_QUERIES の
+abs: キーワードごとにサブトピックのアンカーを作る (--no-subtopics で無効)。
+L2 はカテゴリ内で類似度の高い上位 L2_ANCHOR_POOL_TOP_K アンカーの平均を
+そのカテゴリのスコアとする。
+キーワードから外れたサブトピックのアンカーは is_active = FALSE にする。
+
+使い方:
+    uv run python -m scripts.setup_anchors [--no-subtopics]
 """
 
+import argparse
 import os
+import re
+import urllib.parse
 from typing import TypedDict
 
 import psycopg
 from openai import OpenAI
 
+from batch.config import ARXIV_QUERIES, CATEGORY_NAMES
+
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
@@ -104,7 +118,34 @@ ANCHORS: list[AnchorDef] = [
 ]
 
 
+def query_keywords(query: str) -> list[str]:
+    """arXiv クエリ文字列から abs: のキーワードを出現順・重複なしで取り出す。"""
+    decoded = urllib.parse.unquote_plus(query)
+    keywords = [
+        quoted or bare for quoted, bare in re.findall(r'abs:(?:"([^"]+)"|([^\s()]+))', decoded)
+    ]
+    return list(dict.fromkeys(keywords))
+
+
+def subtopic_definitions(category_id: int) -> dict[str, str]:
+    """カテゴリのサブトピック (anchor_key → アンカーの定義文) を返す。"""
+    keywords = [
+        keyword
+        for q in ARXIV_QUERIES
+        if q["category_id"] == category_id
+        for keyword in query_keywords(str(q["query"]))
+    ]
+    category = CATEGORY_NAMES[category_id]
+    return {keyword: f"Research on {keyword} in the area of {category}." for keyword in keywords}
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--no-subtopics", action="store_true", help="カテゴリ定義文のアンカーのみ投入する"
+    )
+    args = parser.parse_args()
+
     if not OPENAI_API_KEY:
         print("Error: OPENAI_API_KEY environment variable is not set.")
         return
@@ -124,38 +165,56 @@ def main() -> None:
                 for anchor in ANCHORS:
                     print(f"Processing Anchor {anchor['id']}: {anchor['category_name']}...")
 
-                    # Generate embedding
+                    # カテゴリ定義文 + サブトピックを1リクエストで Embedding 化
+                    definitions = {"default": anchor["definition_en"]}
+                    if not args.no_subtopics:
+                        definitions.update(subtopic_definitions(anchor["id"]))
                     response = client.embeddings.create(
-                        input=anchor["definition_en"], model="text-embedding-3-small"
+                        input=list(definitions.values()), model="text-embedding-3-small"
                     )
-                    embedding = response.data[0].embedding
 
-                    # Upsert anchor
+                    for (anchor_key, definition_en), item in zip(
+                        definitions.items(), response.data, strict=True
+                    ):
+                        # Upsert anchor
+                        cur.execute(
+                            """
+                            INSERT INTO anchors (
+                                category_id, anchor_key, category_name,
+                                definition_en, definition_ja, embedding
+                            )
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                            ON CONFLICT (category_id, anchor_key) DO UPDATE SET
+                                category_name = EXCLUDED.category_name,
+                                definition_en = EXCLUDED.definition_en,
+                                definition_ja = EXCLUDED.definition_ja,
+                                embedding = EXCLUDED.embedding,
+                                is_active = TRUE,
+                                updated_at = NOW();
+                            """,
+                            (
+                                anchor["id"],  # category_id = id
+                                anchor_key,
+                                anchor["category_name"],
+                                definition_en,
+                                anchor["definition_ja"] if anchor_key == "default" else None,
+                                # pgvector requires string format with psycopg v3
+                                str(item.embedding),
+                            ),
+                        )
+
+                    # 今回のキーワードに無いサブトピックは無効化する
                     cur.execute(
                         """
-                        INSERT INTO anchors (
-                            id, category_id, category_name, definition_en, definition_ja, embedding
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (category_id) DO UPDATE SET
-                            category_name = EXCLUDED.category_name,
-                            definition_en = EXCLUDED.definition_en,
-                            definition_ja = EXCLUDED.definition_ja,
-                            embedding = EXCLUDED.embedding,
-                            updated_at = NOW();
+                        UPDATE anchors SET is_active = FALSE, updated_at = NOW()
+                        WHERE category_id = %s AND NOT (anchor_key = ANY(%s))
                         """,
-                        (
-                            anchor["id"],
-                            anchor["id"],  # category_id = id
-                            anchor["category_name"],
-                            anchor["definition_en"],
-                            anchor["definition_ja"],
-                            # pgvector requires explicit casting or string format with psycopg v3
-                            str(embedding),
-                        ),
+                        (anchor["id"], list(definitions)),
                     )
+                    print(f"  {len(definitions)} anchors")
             conn.commit()
             print("All anchors inserted/updated successfully.")
+            print("Run `python -m scripts.rescore_anchors` to re-score existing papers.")
 
     except Exception as e:
         print(f"Error: {e}")
@@ -2,11 +2,14 @@
 
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass, field
+from types import SimpleNamespace
 from typing import Any, Generator
 
 import pytest
 from fastapi.testclient import TestClient
+from google.genai import errors, types
 
 from api.app import app
 from api.dependencies import CurrentUser, get_current_user, get_db
@@ -50,11 +53,13 @@ class FakeCursor:
         self._index: int = 0
         self.last_query: str = ""
         self.last_params: tuple[Any, ...] | list[Any] = ()
+        self.queries: list[tuple[str, Any]] = []  # 実行した (クエリ, パラメータ) の履歴
         self._query_results: dict[str, list[Any]] = {}
 
     def execute(self, query: str, params: tuple[Any, ...] | list[Any] = ()) -> None:
         self.last_query = query
         self.last_params = params
+        self.queries.append((query, params))
         # クエリパターンに基づいて結果を返す
         if query in self._query_results:
             self._results = [self._query_results[query]]
@@ -124,3 +129,187 @@ def api_client(
     app.dependency_overrides[get_current_user] = _override_user
     yield TestClient(app)
     app.dependency_overrides.clear()
+
+
+# ---------------------------------------------------------------------------
+# Gemini クライアント (オフライン用の疑似実装)
+# ---------------------------------------------------------------------------
+def _cache_not_found(name: str) -> errors.ClientError:
+    return errors.ClientError(
+        404, {"error": {"code": 404, "message": f"{name} not found", "status": "NOT_FOUND"}}
+    )
+
+
+def fake_gemini_response(payload: Any, in_tokens: int = 0, out_tokens: int = 0) -> Any:
+    """generate_content の疑似レスポンス (payload を JSON 文字列にして text に入れる)。"""
+    return SimpleNamespace(
+        text=json.dumps(payload),
+        usage_metadata=SimpleNamespace(
+            prompt_token_count=in_tokens, candidates_token_count=out_tokens
+        ),
+    )
+
+
+class FakeGeminiCaches:
+    """client.aio.caches の疑似実装。作成したキャッシュをメモリ上に保持する。"""
+
+    def __init__(self) -> None:
+        self.live: dict[str, str | None] = {}  # キャッシュ名 → system_instruction
+        self.create_count = 0
+        self.update_count = 0
+        self.deleted: list[str] = []
+        self.create_error: BaseException | None = None
+
+    async def create(
+        self, *, model: str, config: types.CreateCachedContentConfig
+    ) -> types.CachedContent:
+        if self.create_error is not None:
+            raise self.create_error
+        self.create_count += 1
+        name = f"cachedContents/fake-{self.create_count}"
+        self.live[name] = str(config.system_instruction)
+        return types.CachedContent(name=name, model=model, display_name=config.display_name)
+
+    async def update(
+        self, *, name: str, config: types.UpdateCachedContentConfig
+    ) -> types.CachedContent:
+        if name not in self.live:
+            raise _cache_not_found(name)
+        self.update_count += 1
+        return types.CachedContent(name=name)
+
+    async def delete(self, *, name: str) -> None:
+        self.live.pop(name, None)
+        self.deleted.append(name)
+
+    def expire(self, name: str) -> None:
+        """サーバー側で期限切れになったことを再現する。"""
+        self.live.pop(name, None)
+
+
+class FakeGeminiModels:
+    """client.aio.models の疑似実装。responses の先頭から順に返す (例外なら送出する)。"""
+
+    def __init__(self, caches: FakeGeminiCaches) -> None:
+        self._caches = caches
+        self.responses: list[Any] = []
+        self.calls: list[dict[str, Any]] = []
+        self.prompt_tokens = 4096  # count_tokens が返すトークン数
+        self.count_tokens_calls = 0
+
+    async def generate_content(
+        self, *, model: str, contents: list[Any], config: types.GenerateContentConfig | None = None
+    ) -> Any:
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        cached = config.cached_content if config is not None else None
+        if cached and cached not in self._caches.live:
+            raise _cache_not_found(cached)
+        if not self.responses:
+            raise AssertionError("No fake Gemini response queued")
+        item = self.responses.pop(0)
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    async def count_tokens(
+        self, *, model: str, contents: Any, config: Any = None
+    ) -> types.CountTokensResponse:
+        self.count_tokens_calls += 1
+        return types.CountTokensResponse(total_tokens=self.prompt_tokens)
+
+
+class FakeGeminiFiles:
+    """client.aio.files の疑似実装。アップロードした内容をメモリ上に保持する。"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+
+    async def upload(
+        self, *, file: str, config: types.UploadFileConfig | None = None
+    ) -> types.File:
+        name = f"files/fake-{len(self.data) + 1}"
+        with open(file, "rb") as f:
+            self.data[name] = f.read()
+        return types.File(name=name)
+
+    async def download(self, *, file: str, config: Any = None) -> bytes:
+        return self.data[file]
+
+
+class FakeGeminiBatches:
+    """client.aio.batches の疑似実装。complete() / fail() を呼ぶまでジョブは実行中のまま。"""
+
+    def __init__(self, files: FakeGeminiFiles) -> None:
+        self._files = files
+        self.jobs: dict[str, types.BatchJob] = {}
+        self.create_error: BaseException | None = None
+        self.get_error: BaseException | None = None
+
+    async def create(
+        self, *, model: str, src: str, config: types.CreateBatchJobConfig | None = None
+    ) -> types.BatchJob:
+        if self.create_error is not None:
+            raise self.create_error
+        name = f"batches/fake-{len(self.jobs) + 1}"
+        self.jobs[name] = types.BatchJob(
+            name=name,
+            model=model,
+            state=types.JobState.JOB_STATE_PENDING,
+            src=types.BatchJobSource(file_name=src),
+        )
+        return self.jobs[name]
+
+    async def get(self, *, name: str, config: Any = None) -> types.BatchJob:
+        if self.get_error is not None:
+            raise self.get_error
+        return self.jobs[name]
+
+    def requests(self, name: str) -> list[dict[str, Any]]:
+        """ジョブに投入された JSONL の各行を返す。"""
+        src = self.jobs[name].src
+        assert src is not None and src.file_name is not None
+        return [json.loads(line) for line in self._files.data[src.file_name].splitlines()]
+
+    def complete(self, name: str, respond: Any) -> None:
+        """respond(request 行) → 結果行 ("response" / "error") でジョブを完了させる。"""
+        lines = [json.dumps({"key": r["key"], **respond(r)}) for r in self.requests(name)]
+        output = f"files/fake-output-{len(self._files.data) + 1}"
+        self._files.data[output] = "\n".join(lines).encode()
+        job = self.jobs[name]
+        job.state = types.JobState.JOB_STATE_SUCCEEDED
+        job.dest = types.BatchJobDestination(file_name=output)
+
+    def fail(self, name: str) -> None:
+        self.jobs[name].state = types.JobState.JOB_STATE_FAILED
+
+
+class FakeGeminiClient:
+    """genai.Client の代わりに使う疑似クライアント (aio.caches / models / files / batches)。"""
+
+    def __init__(self) -> None:
+        caches = FakeGeminiCaches()
+        files = FakeGeminiFiles()
+        self.aio = SimpleNamespace(
+            caches=caches,
+            models=FakeGeminiModels(caches),
+            files=files,
+            batches=FakeGeminiBatches(files),
+        )
+
+    @property
+    def caches(self) -> FakeGeminiCaches:
+        return self.aio.caches  # type: ignore[no-any-return]
+
+    @property
+    def models(self) -> FakeGeminiModels:
+        return self.aio.models  # type: ignore[no-any-return]
+
+    @property
+    def batches(self) -> FakeGeminiBatches:
+        return self.aio.batches  # type: ignore[no-any-return]
+
+
+@pytest.fixture
+def fake_gemini() -> FakeGeminiClient:
+    """オフラインで Gemini 呼び出しを検証する疑似クライアント。"""
+    return FakeGeminiClient()
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import UTC, datetime
 from typing import Any
 
 from tests.conftest import FakeConnection, FakeCursor
@@ -48,7 +48,7 @@ class TestListPapers:
 
     def test_returns_papers(self, api_client, fake_conn) -> None:  # type: ignore[no-untyped-def]
         conn: FakeConnection = fake_conn
-        now = datetime(2026, 2, 15, tzinfo=timezone.utc)
+        now = datetime(2026, 2, 15, tzinfo=UTC)
 
         class PapersCursor(FakeCursor):
             def __init__(self) -> None:
@@ -104,7 +104,7 @@ class TestGetPaperDetail:
 
     def test_returns_detail(self, api_client, fake_conn) -> None:  # type: ignore[no-untyped-def]
         conn: FakeConnection = fake_conn
-        now = datetime(2026, 2, 15, tzinfo=timezone.utc)
+        now = datetime(2026, 2, 15, tzinfo=UTC)
         detail_review = {
             "one_line_takeaway": "テスト",
             "sections": [],
@@ -144,12 +144,70 @@ class TestGetPaperDetail:
         assert body["data"]["detail"]["one_line_takeaway"] == "テスト"
 
 
+class TestGetRelatedPapers:
+    """GET /papers/{arxiv_id}/related"""
+
+    @staticmethod
+    def _cursor(has_embedding: bool | None, rows: list[list[Any]]) -> FakeCursor:
+        class RelatedCursor(FakeCursor):
+            def execute(self, query: str, params: Any = ()) -> None:
+                self.queries.append((query, params))
+                if "embedding IS NOT NULL" in query:
+                    self._results = [] if has_embedding is None else [[has_embedding]]
+                elif "candidates" in query:
+                    self._results = rows
+                else:
+                    self._results = []
+                self._index = 0
+
+        return RelatedCursor()
+
+    def test_not_found(self, api_client, fake_conn) -> None:  # type: ignore[no-untyped-def]
+        conn: FakeConnection = fake_conn
+        conn._cursor = self._cursor(None, [])
+        resp = api_client.get("/papers/9999.99999/related")
+        assert resp.status_code == 404
+
+    def test_without_embedding_returns_empty(self, api_client, fake_conn) -> None:  # type: ignore[no-untyped-def]
+        conn: FakeConnection = fake_conn
+        conn._cursor = self._cursor(False, [])
+        resp = api_client.get("/papers/2402.12345/related")
+        assert resp.status_code == 200
+        assert resp.json() == {"data": []}
+
+    def test_returns_related_with_similarity(self, api_client, fake_conn) -> None:  # type: ignore[no-untyped-def]
+        conn: FakeConnection = fake_conn
+        now = datetime(2026, 2, 15, tzinfo=UTC)
+        row = ["2402.00002", "Near Paper", 1, "基盤モデル", 4, "要約", "テイクアウェイ"]
+        cursor = self._cursor(True, [[*row, ["Author A"], now, False, True, 0.912345678]])
+        conn._cursor = cursor
+
+        resp = api_client.get("/papers/2402.12345/related?limit=5&ef_search=100")
+        assert resp.status_code == 200
+        data = resp.json()["data"]
+        assert [p["arxiv_id"] for p in data] == ["2402.00002"]
+        assert data[0]["similarity"] == 0.9123
+        assert data[0]["is_viewed"] is True
+
+        # ef_search はトランザクション内だけ変更し、レスポンス前に commit で戻す
+        set_config = [p for q, p in cursor.queries if "set_config" in q]
+        assert set_config == [("100",)]
+        _, params = cursor.queries[-1]
+        assert params["ef_search"] == 100
+        assert params["limit"] == 5
+        assert conn.committed
+
+    def test_rejects_out_of_range_ef_search(self, api_client) -> None:  # type: ignore[no-untyped-def]
+        resp = api_client.get("/papers/2402.12345/related?ef_search=5")
+        assert resp.status_code == 400
+
+
 class TestRecordView:
     """POST /papers/{arxiv_id}/view"""
 
     def test_records_new_view(self, api_client, fake_conn) -> None:  # type: ignore[no-untyped-def]
         conn: FakeConnection = fake_conn
-        now = datetime(2026, 2, 15, 12, 0, 0, tzinfo=timezone.utc)
+        now = datetime(2026, 2, 15, 12, 0, 0, tzinfo=UTC)
 
         class ViewCursor(FakeCursor):
             def __init__(self) -> None:
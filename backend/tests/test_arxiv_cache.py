@@ -0,0 +1,160 @@
+"""Tests for batch.arxiv_cache module."""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from batch.arxiv_cache import ArxivResponseCache
+from batch.arxiv_client import ArxivClient, TokenBucket
+
+URL = "http://export.arxiv.org/api/query?search_query=cat:cs.CL&start=0&max_results=2"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _make_cache(
+    tmp_path: Path, clock: FakeClock, max_bytes: int = 1024, offline: bool = False
+) -> ArxivResponseCache:
+    return ArxivResponseCache(
+        tmp_path, ttl_sec=60.0, max_bytes=max_bytes, offline=offline, clock=clock
+    )
+
+
+def _set_times(cache: ArxivResponseCache, url: str, atime: float, mtime: float) -> None:
+    os.utime(cache.path_for(url), (atime, mtime))
+
+
+# ---------------------------------------------------------------------------
+# 読み書き・TTL
+# ---------------------------------------------------------------------------
+class TestArxivResponseCache:
+    """TTL・LRU 削除・オフラインモードを検証する。"""
+
+    def test_round_trip(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        cache = _make_cache(tmp_path, clock)
+        assert cache.get(URL) is None
+        cache.put(URL, b"<feed/>")
+        assert cache.get(URL) == b"<feed/>"
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_expired_entry_is_a_miss(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        cache = _make_cache(tmp_path, clock)
+        cache.put(URL, b"<feed/>")
+        _set_times(cache, URL, clock.now, clock.now)
+        clock.now += 61
+        assert cache.get(URL) is None
+
+    def test_hit_does_not_extend_ttl(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        cache = _make_cache(tmp_path, clock)
+        cache.put(URL, b"<feed/>")
+        _set_times(cache, URL, clock.now, clock.now)
+        clock.now += 50
+        assert cache.get(URL) is not None
+        clock.now += 20
+        assert cache.get(URL) is None
+
+    def test_offline_ignores_ttl(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        cache = _make_cache(tmp_path, clock, offline=True)
+        cache.put(URL, b"<feed/>")
+        _set_times(cache, URL, clock.now, clock.now)
+        clock.now += 10_000
+        assert cache.get(URL) == b"<feed/>"
+
+    def test_evicts_least_recently_used(self, tmp_path: Path) -> None:
+        clock = FakeClock()
+        cache = _make_cache(tmp_path, clock, max_bytes=250)
+        urls = [f"{URL}&n={i}" for i in range(3)]
+        for i, url in enumerate(urls[:2]):
+            cache.put(url, b"x" * 100)
+            _set_times(cache, url, clock.now + i, clock.now)
+        # urls[0] を参照して最新にする → 次の追加で urls[1] が削除される
+        clock.now += 10
+        assert cache.get(urls[0]) is not None
+        cache.put(urls[2], b"x" * 100)
+
+        assert cache.path_for(urls[0]).exists()
+        assert not cache.path_for(urls[1]).exists()
+        assert cache.path_for(urls[2]).exists()
+
+    def test_tee_caches_complete_body(self, tmp_path: Path) -> None:
+        cache = _make_cache(tmp_path, FakeClock())
+        chunks = list(cache.tee(URL, iter([b"<feed>", b"</feed>"])))
+        assert chunks == [b"<feed>", b"</feed>"]
+        assert cache.get(URL) == b"<feed></feed>"
+
+    def test_tee_discards_partial_body(self, tmp_path: Path) -> None:
+        cache = _make_cache(tmp_path, FakeClock())
+
+        def broken() -> Generator[bytes]:
+            yield b"<feed>"
+            raise ConnectionError("reset")
+
+        with pytest.raises(ConnectionError):
+            list(cache.tee(URL, broken()))
+        assert cache.get(URL) is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_discard_removes_entry(self, tmp_path: Path) -> None:
+        cache = _make_cache(tmp_path, FakeClock())
+        list(cache.tee(URL, iter([b"<feed>"])))
+        cache.discard(URL)
+        cache.discard(URL)
+        assert cache.get(URL) is None
+
+
+# ---------------------------------------------------------------------------
+# クライアントとの統合
+# ---------------------------------------------------------------------------
+class TestClientWithCache:
+    """キャッシュヒット時はネットワークにもレートリミッターにも触れない。"""
+
+    def _client(self, cache: ArxivResponseCache) -> ArxivClient:
+        limiter = TokenBucket(rate_per_sec=1 / 3.0, sleep=MagicMock())
+        return ArxivClient(limiter=limiter, cache=cache)
+
+    def test_streamed_body_is_cached_then_replayed(self, tmp_path: Path) -> None:
+        client = self._client(_make_cache(tmp_path, FakeClock()))
+        response = MagicMock(status_code=200)
+        response.iter_content.return_value = [b"<feed>", b"</feed>"]
+
+        with patch.object(client.session, "get", return_value=response) as mock_get:
+            first = client.iter_body(URL, 4)
+            assert first is not None
+            assert b"".join(first) == b"<feed></feed>"
+            second = client.iter_body(URL, 4)
+            assert second is not None
+            assert b"".join(second) == b"<feed></feed>"
+
+        assert mock_get.call_count == 1
+        assert client.limiter.reserved_count == 1
+
+    def test_get_uses_cache(self, tmp_path: Path) -> None:
+        cache = _make_cache(tmp_path, FakeClock())
+        cache.put(URL, b"<feed/>")
+        client = self._client(cache)
+        with patch.object(client.session, "get") as mock_get:
+            body = client.get(URL)
+        assert body == b"<feed/>"
+        mock_get.assert_not_called()
+
+    def test_offline_miss_skips_network(self, tmp_path: Path) -> None:
+        client = self._client(_make_cache(tmp_path, FakeClock(), offline=True))
+        with patch.object(client.session, "get") as mock_get:
+            assert client.iter_body(URL, 4) is None
+            assert client.get(URL) is None
+        mock_get.assert_not_called()
@@ -0,0 +1,116 @@
+"""Tests for batch.arxiv_client module — レートリミッター、リトライの検証。"""
+
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from batch.arxiv_client import ArxivClient, TokenBucket
+
+
+class FakeClock:
+    """sleep で時刻が進むテスト用の時計。"""
+
+    def __init__(self) -> None:
+        self.now = 100.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _make_bucket(clock: FakeClock, interval: float = 3.0) -> TokenBucket:
+    return TokenBucket(rate_per_sec=1.0 / interval, clock=clock, sleep=clock.sleep)
+
+
+def _response(status_code: int) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status_code
+    return response
+
+
+# ---------------------------------------------------------------------------
+# TokenBucket
+# ---------------------------------------------------------------------------
+class TestTokenBucket:
+    """トークンバケットの間隔制御を検証する。"""
+
+    def test_first_acquire_does_not_wait(self) -> None:
+        clock = FakeClock()
+        assert _make_bucket(clock).acquire() == 0.0
+        assert clock.sleeps == []
+
+    def test_back_to_back_requests_are_spaced(self) -> None:
+        clock = FakeClock()
+        bucket = _make_bucket(clock)
+        bucket.acquire()
+        assert abs(bucket.acquire() - 3.0) < 1e-9
+        assert abs(clock.now - 103.0) < 1e-9
+
+    def test_elapsed_time_counts_toward_interval(self) -> None:
+        clock = FakeClock()
+        bucket = _make_bucket(clock)
+        bucket.acquire()
+        clock.now += 2.0  # 前のリクエストの処理に2秒かかった
+        assert abs(bucket.acquire() - 1.0) < 1e-9
+
+    def test_idle_time_does_not_accumulate_burst(self) -> None:
+        clock = FakeClock()
+        bucket = _make_bucket(clock)
+        bucket.acquire()
+        clock.now += 60.0
+        assert bucket.acquire() == 0.0
+        assert abs(bucket.acquire() - 3.0) < 1e-9
+
+    def test_reservations_queue_up_across_callers(self) -> None:
+        clock = FakeClock()
+        bucket = _make_bucket(clock)
+        waits = [bucket.reserve() for _ in range(3)]
+        assert [round(w, 6) for w in waits] == [0.0, 3.0, 6.0]
+
+
+# ---------------------------------------------------------------------------
+# ArxivClient
+# ---------------------------------------------------------------------------
+class TestArxivClient:
+    """共有クライアントのリトライ挙動を検証する。"""
+
+    def _client(self) -> ArxivClient:
+        clock = FakeClock()
+        return ArxivClient(limiter=_make_bucket(clock))
+
+    def test_requests_gzip(self) -> None:
+        assert "gzip" in self._client().session.headers["Accept-Encoding"]
+
+    @patch("batch.arxiv_client.time.sleep")
+    def test_retries_on_503(self, mock_sleep: MagicMock) -> None:
+        client = self._client()
+        ok = _response(200)
+        with patch.object(client.session, "get", side_effect=[_response(503), ok]) as mock_get:
+            assert client.get("http://example.com") == ok.content
+        assert mock_get.call_count == 2
+        mock_sleep.assert_called_once()
+
+    def test_retries_on_timeout(self) -> None:
+        client = self._client()
+        ok = _response(200)
+        with patch.object(client.session, "get", side_effect=[requests.Timeout(), ok]):
+            assert client.get("http://example.com") == ok.content
+
+    def test_returns_none_on_client_error(self) -> None:
+        client = self._client()
+        with patch.object(client.session, "get", return_value=_response(400)) as mock_get:
+            assert client.get("http://example.com") is None
+        assert mock_get.call_count == 1
+
+    def test_every_attempt_goes_through_limiter(self) -> None:
+        limiter = MagicMock()
+        client = ArxivClient(limiter=limiter)
+        with patch.object(client.session, "get", side_effect=requests.Timeout()):
+            assert client.get("http://example.com") is None
+        assert limiter.acquire.call_count == 3
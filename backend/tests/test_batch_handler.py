@@ -6,7 +6,7 @@ from typing import Any
 from unittest.mock import MagicMock, patch
 
 from batch.handler import main
-from utils.models import BatchLogEntry
+from utils.models import BatchLogEntry, L2RescoreResult
 
 
 class TestBatchHandler:
@@ -67,3 +67,31 @@ class TestBatchHandler:
         event = {"source": "aws.events"}
         result = main(event, lambda_context)
         assert result["statusCode"] == 500
+
+
+class TestRescoreAnchorsMode:
+    """mode=rescore_anchors でパイプラインの代わりに再スコアリングすることを検証する。"""
+
+    @patch("utils.db.close_connections")
+    @patch("batch.l2_selector.rescore_papers")
+    def test_resumes_from_after_id(
+        self,
+        mock_rescore: MagicMock,
+        mock_close: MagicMock,
+        lambda_context: Any,
+    ) -> None:
+        mock_rescore.return_value = L2RescoreResult(processed=10, updated=10, last_id=42)
+
+        event = {"mode": "rescore_anchors", "after_id": 7, "engine": "sql"}
+        result = main(event, lambda_context)
+
+        assert result["statusCode"] == 200
+        assert result["body"]["last_id"] == 42
+        assert result["body"]["done"] is False
+        kwargs = mock_rescore.call_args.kwargs
+        assert (kwargs["after_id"], kwargs["engine"]) == (7, "sql")
+        assert kwargs["should_continue"]() is True  # FakeLambdaContext は残り 300 秒
+
+    def test_rejects_unknown_engine(self, lambda_context: Any) -> None:
+        result = main({"mode": "rescore_anchors", "engine": "gpu"}, lambda_context)
+        assert result["statusCode"] == 400
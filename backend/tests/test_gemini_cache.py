@@ -0,0 +1,109 @@
+"""Tests for batch.gemini_cache module — システムプロンプトのコンテキストキャッシュ。"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from google.genai import errors
+
+from batch.config import GEMINI_CACHE_REFRESH_MARGIN_SEC
+from batch.gemini_cache import PromptCache
+from tests.conftest import FakeGeminiClient
+
+PROMPT = "You are a test analyst."
+
+
+class FakeClock:
+    """テスト用の単調増加クロック。"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(client: FakeGeminiClient, clock: FakeClock | None = None, **kwargs: Any) -> PromptCache:
+    fake: Any = client
+    kwargs.setdefault("enabled", True)
+    return PromptCache(fake, "test", PROMPT, ttl_sec=600, clock=clock or FakeClock(), **kwargs)
+
+
+class TestPromptCache:
+    @pytest.mark.asyncio
+    async def test_created_once_and_referenced(self, fake_gemini: FakeGeminiClient) -> None:
+        cache = _cache(fake_gemini)
+
+        first = await cache.config(temperature=0.1)
+        second = await cache.config(temperature=0.1)
+
+        assert first.cached_content == second.cached_content == "cachedContents/fake-1"
+        assert first.system_instruction is None
+        assert first.temperature == 0.1
+        assert fake_gemini.caches.create_count == 1
+        assert fake_gemini.caches.live == {"cachedContents/fake-1": PROMPT}
+
+    @pytest.mark.asyncio
+    async def test_refreshes_ttl_before_expiry(self, fake_gemini: FakeGeminiClient) -> None:
+        clock = FakeClock()
+        cache = _cache(fake_gemini, clock)
+        await cache.get()
+
+        clock.now = 600 - GEMINI_CACHE_REFRESH_MARGIN_SEC
+        assert await cache.get() == "cachedContents/fake-1"
+        assert fake_gemini.caches.update_count == 1
+        assert cache.refresh_count == 1
+
+        # 延長できなかった (既に消えていた) 場合は作り直す
+        fake_gemini.caches.expire("cachedContents/fake-1")
+        clock.now += 600
+        assert await cache.get() == "cachedContents/fake-2"
+        assert cache.create_count == 2
+
+    @pytest.mark.asyncio
+    async def test_falls_back_inline_when_create_fails(self, fake_gemini: FakeGeminiClient) -> None:
+        fake_gemini.caches.create_error = errors.ClientError(
+            400, {"error": {"code": 400, "message": "Cached content is too small"}}
+        )
+        cache = _cache(fake_gemini)
+
+        first = await cache.config()
+        second = await cache.config()
+
+        assert first.cached_content is None
+        assert first.system_instruction == PROMPT
+        assert second.system_instruction == PROMPT
+        # 作成の失敗は1度だけ (以降は作成を試みない)
+        fake_gemini.caches.create_error = None
+        assert await cache.get() is None
+        assert fake_gemini.caches.create_count == 0
+
+    @pytest.mark.asyncio
+    async def test_skips_prompt_below_min_tokens(self, fake_gemini: FakeGeminiClient) -> None:
+        fake_gemini.models.prompt_tokens = 300
+        cache = _cache(fake_gemini, min_tokens=1024)
+
+        first = await cache.config()
+        second = await cache.config()
+
+        # 作成を試みず (作成エラーも出さず) インラインで送る。トークン数の確認は1度だけ
+        assert first.system_instruction == second.system_instruction == PROMPT
+        assert fake_gemini.caches.create_count == 0
+        assert fake_gemini.models.count_tokens_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_disabled_sends_inline(self, fake_gemini: FakeGeminiClient) -> None:
+        cache = _cache(fake_gemini, enabled=False)
+        config = await cache.config()
+        assert config.system_instruction == PROMPT
+        assert fake_gemini.caches.create_count == 0
+
+    @pytest.mark.asyncio
+    async def test_close_deletes_cache(self, fake_gemini: FakeGeminiClient) -> None:
+        cache = _cache(fake_gemini)
+        await cache.get()
+        await cache.close()
+        assert fake_gemini.caches.deleted == ["cachedContents/fake-1"]
+        assert fake_gemini.caches.live == {}
+        assert cache.cache_name is None
@@ -0,0 +1,145 @@
+"""Tests for batch.gemini_limiter module — AIMD による同時実行数の調整。"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from batch.gemini_limiter import AdaptiveLimiter, is_gemini_overload
+
+
+class FakeClock:
+    """テスト用の単調増加クロック。"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _limiter(
+    clock: FakeClock,
+    initial: float = 4,
+    increase: float = 1.0,
+    latency_tolerance: float = 2.0,
+) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        name="test",
+        initial=initial,
+        min_limit=1,
+        max_limit=8,
+        increase=increase,
+        latency_tolerance=latency_tolerance,
+        clock=clock,
+    )
+
+
+async def _succeed(limiter: AdaptiveLimiter, clock: FakeClock, latency: float = 1.0) -> None:
+    async with limiter.slot("l3"):
+        clock.now += latency
+
+
+def _rate_limited() -> errors.ClientError:
+    return errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+
+
+class TestIsGeminiOverload:
+    def test_rate_limit_and_server_errors(self) -> None:
+        assert is_gemini_overload(_rate_limited())
+        assert is_gemini_overload(errors.ServerError(503, {"error": {"code": 503}}))
+        assert is_gemini_overload(TimeoutError())
+
+    def test_client_errors_are_not_overload(self) -> None:
+        assert not is_gemini_overload(errors.ClientError(400, {"error": {"code": 400}}))
+        assert not is_gemini_overload(ValueError("bad json"))
+
+
+class TestAdaptiveLimiter:
+    @pytest.mark.asyncio
+    async def test_additive_increase_per_window(self) -> None:
+        clock = FakeClock()
+        limiter = _limiter(clock, initial=4)
+        # 1件ごとに +1/window なので、おおよそ window 件の正常応答で上限が +1 される
+        for _ in range(4):
+            await _succeed(limiter, clock)
+        assert limiter.limit == 4
+        await _succeed(limiter, clock)
+        assert limiter.limit == 5
+
+    @pytest.mark.asyncio
+    async def test_multiplicative_decrease_once_per_burst(self) -> None:
+        clock = FakeClock()
+        limiter = _limiter(clock, initial=8)
+        gate = asyncio.Event()
+
+        async def rate_limited() -> None:
+            async with limiter.slot("l3"):
+                await gate.wait()
+                raise _rate_limited()
+
+        # 同時に送った 4件がまとめて 429 になっても、減少は1回だけ
+        tasks = [asyncio.create_task(rate_limited()) for _ in range(4)]
+        await asyncio.sleep(0)
+        clock.now = 1.0
+        gate.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(r, errors.ClientError) for r in results)
+        assert limiter.limit == 4
+        assert limiter.overload_count == 4
+        assert limiter.decrease_count == 1
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_decrease_respects_minimum(self) -> None:
+        clock = FakeClock()
+        limiter = _limiter(clock, initial=1)
+        with pytest.raises(errors.ClientError):
+            async with limiter.slot("l3"):
+                raise _rate_limited()
+        assert limiter.limit == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_responses_hold_limit(self) -> None:
+        clock = FakeClock()
+        limiter = _limiter(clock, initial=4, latency_tolerance=2.0)
+        await _succeed(limiter, clock, latency=1.0)
+        before = limiter.stats()
+        # 最小レイテンシ (1秒) の2倍を超える応答では増やさない
+        for _ in range(8):
+            await _succeed(limiter, clock, latency=3.0)
+        assert limiter.stats()["limit"] == before["limit"]
+        assert limiter.success_count == 9
+
+    @pytest.mark.asyncio
+    async def test_other_errors_do_not_change_limit(self) -> None:
+        clock = FakeClock()
+        limiter = _limiter(clock, initial=4)
+        with pytest.raises(ValueError):
+            async with limiter.slot("l3"):
+                raise ValueError("bad response")
+        assert limiter.limit == 4
+        assert limiter.overload_count == 0
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_in_flight_bounded_by_limit(self) -> None:
+        clock = FakeClock()
+        limiter = _limiter(clock, initial=2, increase=0.0)
+        active = 0
+        peak = 0
+
+        async def call() -> None:
+            nonlocal active, peak
+            async with limiter.slot("l3"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.001)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        assert peak == 2
+        assert limiter.max_in_flight == 2
@@ -2,12 +2,29 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
-
+import asyncio
+import time
+import xml.etree.ElementTree as ET
+from collections.abc import Generator
+from datetime import UTC, datetime
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from batch import l1_collector
+from batch.arxiv_client import TokenBucket
+from batch.config import ARXIV_QUERIES
 from batch.l1_collector import (
+    _harvest_query,
+    _load_checkpoint,
+    _rate_limit_stats,
+    collect_papers,
+    collect_papers_async,
     compute_date_range,
     deduplicate,
     extract_arxiv_id,
+    iter_entries,
     parse_entries,
 )
 from utils.models import ArxivPaper
@@ -49,6 +66,33 @@ EMPTY_XML = """<?xml version="1.0" encoding="UTF-8"?>
 </feed>"""
 
 
+def _make_feed(count: int, offset: int = 0) -> str:
+    """連番 ID のエントリーを count 件含む Atom フィードを生成する。"""
+    entries = "".join(
+        f"""
+  <entry>
+    <id>http://arxiv.org/abs/2402.{10000 + offset + i}v1</id>
+    <title>Paper {offset + i}</title>
+    <summary>Abstract {offset + i}</summary>
+    <author><name>Author</name></author>
+    <published>2026-02-11T12:00:00Z</published>
+    <arxiv:primary_category term="cs.CL"/>
+  </entry>"""
+        for i in range(count)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">'
+        f"{entries}</feed>"
+    )
+
+
+def _fake_response(xml_text: str, chunk_size: int = 64) -> Generator[bytes]:
+    """XML を小分けに返す疑似ストリーミング本文。"""
+    body = xml_text.encode("utf-8")
+    return (body[i : i + chunk_size] for i in range(0, len(body), chunk_size))
+
+
 # ---------------------------------------------------------------------------
 # extract_arxiv_id
 # ---------------------------------------------------------------------------
@@ -126,9 +170,246 @@ class TestParseEntries:
         assert papers[0].published_at.month == 2
 
 
+# ---------------------------------------------------------------------------
+# iter_entries (ストリーミングパース)
+# ---------------------------------------------------------------------------
+class TestIterEntries:
+    """インクリメンタルパースのテスト。"""
+
+    def test_matches_parse_entries_on_small_chunks(self) -> None:
+        body = SAMPLE_XML.encode("utf-8")
+        chunks = [body[i : i + 7] for i in range(0, len(body), 7)]
+        streamed = list(iter_entries(chunks, category_id=2))
+        assert streamed == parse_entries(SAMPLE_XML, category_id=2)
+
+    def test_yields_before_stream_ends(self) -> None:
+        feed = _make_feed(3).encode("utf-8")
+        head, tail = feed[: len(feed) // 2], feed[len(feed) // 2 :]
+
+        def chunks() -> Generator[bytes]:
+            yield head
+            yield tail
+
+        iterator = iter_entries(chunks(), category_id=1)
+        first = next(iterator)
+        assert first.arxiv_id == "2402.10000"
+        assert len(list(iterator)) == 2
+
+    def test_truncated_stream_raises(self) -> None:
+        truncated = _make_feed(2).encode("utf-8")[:-30]
+        with pytest.raises(ET.ParseError):
+            list(iter_entries([truncated], category_id=1))
+
+
+# ---------------------------------------------------------------------------
+# _harvest_query (ページング + チェックポイント)
+# ---------------------------------------------------------------------------
+@pytest.fixture
+def checkpoint_dir(tmp_path: Path) -> Generator[Path]:
+    """チェックポイント保存先を一時ディレクトリに差し替える。"""
+    with patch.object(l1_collector, "ARXIV_CHECKPOINT_DIR", str(tmp_path)):
+        yield tmp_path
+
+
+@pytest.mark.usefixtures("checkpoint_dir")
+@patch("batch.l1_collector.time.sleep")
+class TestHarvestQuery:
+    """ページング取得と再開のテスト。"""
+
+    def test_walks_start_offsets_until_short_page(self, _sleep: MagicMock) -> None:
+        with patch(
+            "batch.l1_collector._open_query_stream",
+            side_effect=[
+                _fake_response(_make_feed(2, 0)),
+                _fake_response(_make_feed(2, 2)),
+                _fake_response(_make_feed(1, 4)),
+            ],
+        ) as mock_fetch:
+            papers = _harvest_query(1, "q", 2, "202602100000", "202602110000")
+
+        assert len(papers) == 5
+        assert [c.kwargs["start"] for c in mock_fetch.call_args_list] == [0, 2, 4]
+
+    def test_stops_at_max_pages(self, _sleep: MagicMock) -> None:
+        with (
+            patch.object(l1_collector, "ARXIV_MAX_PAGES_PER_QUERY", 2),
+            patch(
+                "batch.l1_collector._open_query_stream",
+                side_effect=[_fake_response(_make_feed(2, 0)), _fake_response(_make_feed(2, 2))],
+            ) as mock_fetch,
+        ):
+            papers = _harvest_query(1, "q", 2, "202602100000", "202602110000")
+
+        assert len(papers) == 4
+        assert mock_fetch.call_count == 2
+
+    def test_resumes_after_failure(self, _sleep: MagicMock) -> None:
+        with patch(
+            "batch.l1_collector._open_query_stream",
+            side_effect=[_fake_response(_make_feed(2, 0)), None],
+        ):
+            first = _harvest_query(1, "q", 2, "202602100000", "202602110000")
+        assert len(first) == 2
+
+        checkpoint = _load_checkpoint(1, "202602100000", "202602110000")
+        assert checkpoint.next_start == 2
+        assert checkpoint.done is False
+
+        with patch(
+            "batch.l1_collector._open_query_stream",
+            side_effect=[_fake_response(_make_feed(1, 2))],
+        ) as mock_fetch:
+            second = _harvest_query(1, "q", 2, "202602100000", "202602110000")
+
+        assert mock_fetch.call_args.kwargs["start"] == 2
+        assert [p.arxiv_id for p in second] == ["2402.10000", "2402.10001", "2402.10002"]
+
+    def test_truncated_page_is_a_fetch_failure(self, _sleep: MagicMock) -> None:
+        # 5件中2件目の途中で切れた本文: 件数不足でもクエリ完了にしない
+        truncated = _make_feed(5, 0)[:600]
+        with (
+            patch(
+                "batch.l1_collector._open_query_stream",
+                side_effect=[_fake_response(truncated)],
+            ),
+            patch("batch.l1_collector.get_arxiv_client") as mock_client,
+        ):
+            papers = _harvest_query(1, "q", 5, "202602100000", "202602110000")
+
+        assert papers == []
+        checkpoint = _load_checkpoint(1, "202602100000", "202602110000")
+        assert checkpoint.next_start == 0
+        assert checkpoint.done is False
+        # 読み切れてしまった本文もキャッシュから消す
+        discarded_url = mock_client.return_value.discard.call_args.args[0]
+        assert "start=0&max_results=5" in discarded_url
+
+    def test_completed_query_is_not_refetched(self, _sleep: MagicMock) -> None:
+        with patch(
+            "batch.l1_collector._open_query_stream",
+            side_effect=[_fake_response(_make_feed(1, 0))],
+        ):
+            _harvest_query(1, "q", 2, "202602100000", "202602110000")
+
+        with patch("batch.l1_collector._open_query_stream") as mock_fetch:
+            papers = _harvest_query(1, "q", 2, "202602100000", "202602110000")
+
+        mock_fetch.assert_not_called()
+        assert len(papers) == 1
+
+
+# ---------------------------------------------------------------------------
+# collect_papers (レートリミットのスケジューリング)
+# ---------------------------------------------------------------------------
+class TestCollectPapersScheduling:
+    """クエリ間の待機がスロット残り時間だけになることを検証する。"""
+
+    def test_waits_only_remaining_slot_time(self) -> None:
+        now = [0.0]
+        sleeps: list[float] = []
+
+        def fake_sleep(seconds: float) -> None:
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate_per_sec=1 / 3.0, clock=lambda: now[0], sleep=fake_sleep)
+
+        def fake_harvest(category_id: int, *args: object) -> list[ArxivPaper]:
+            bucket.acquire()
+            now[0] += 1.0  # ダウンロード + パースに1秒
+            return []
+
+        with (
+            patch("batch.l1_collector.get_arxiv_client") as mock_client,
+            patch("batch.l1_collector._harvest_query", side_effect=fake_harvest),
+            patch("batch.l1_collector.time.sleep") as mock_sleep,
+            patch("batch.l1_collector.logger") as mock_logger,
+        ):
+            mock_client.return_value.limiter = bucket
+            collect_papers()
+
+        mock_sleep.assert_not_called()
+        # 先頭以外は 3 秒スロットの残り 2 秒だけ待つ
+        assert [round(s, 6) for s in sleeps] == [2.0] * (len(ARXIV_QUERIES) - 1)
+        stats = mock_logger.info.call_args.kwargs["extra"]["rate_limit"]
+        assert stats["requests"] == len(ARXIV_QUERIES)
+        assert stats["waited_sec"] == 2.0 * (len(ARXIV_QUERIES) - 1)
+        assert stats["estimated_saved_sec"] == 3.0 * len(ARXIV_QUERIES) - stats["waited_sec"]
+
+    def test_estimated_saving_is_never_negative(self) -> None:
+        # 503 のバックオフ等で固定間隔より長く待った場合
+        limiter = MagicMock(reserved_count=2, total_wait_sec=10.0)
+        stats = _rate_limit_stats(limiter, 0, 0.0, time.monotonic())
+        assert stats["waited_sec"] == 10.0
+        assert stats["estimated_saved_sec"] == 0.0
+
+
+# ---------------------------------------------------------------------------
+# collect_papers_async (L2 へのカテゴリ単位の受け渡し)
+# ---------------------------------------------------------------------------
+def _drain(queue: asyncio.Queue[list[ArxivPaper] | None]) -> list[list[ArxivPaper] | None]:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+class TestCollectPapersAsync:
+    """カテゴリごとのバッチと終端 (None) がキューに流れることを検証する。"""
+
+    @pytest.mark.asyncio
+    async def test_puts_each_category_then_sentinel(self) -> None:
+        async def fake_harvest(client: object, category_id: int, *args: object) -> list[ArxivPaper]:
+            return parse_entries(SAMPLE_XML, category_id)
+
+        queue: asyncio.Queue[list[ArxivPaper] | None] = asyncio.Queue()
+        with (
+            patch("batch.l1_collector._harvest_query_async", side_effect=fake_harvest),
+            patch("batch.l1_collector.AsyncArxivClient") as mock_client,
+        ):
+            mock_client.return_value.aclose = AsyncMock()
+            await collect_papers_async(queue)
+
+        items = _drain(queue)
+        assert items[-1] is None
+        batches = [b for b in items[:-1] if b is not None]
+        assert len(batches) == len(ARXIV_QUERIES)
+        assert [b[0].matched_queries for b in batches] == [
+            [int(q["category_id"])] for q in ARXIV_QUERIES
+        ]
+
+    @pytest.mark.asyncio
+    async def test_sentinel_sent_on_failure(self) -> None:
+        queue: asyncio.Queue[list[ArxivPaper] | None] = asyncio.Queue()
+        with (
+            patch(
+                "batch.l1_collector._harvest_query_async",
+                side_effect=RuntimeError("arXiv API down"),
+            ),
+            patch("batch.l1_collector.AsyncArxivClient") as mock_client,
+        ):
+            mock_client.return_value.aclose = AsyncMock()
+            with pytest.raises(RuntimeError):
+                await collect_papers_async(queue)
+
+        assert _drain(queue) == [None]
+
+
 # ---------------------------------------------------------------------------
 # deduplicate
 # ---------------------------------------------------------------------------
+def _make_paper(arxiv_id: str, matched_queries: list[int]) -> ArxivPaper:
+    return ArxivPaper(
+        arxiv_id=arxiv_id,
+        title="Paper",
+        abstract="Abstract",
+        authors=["Author"],
+        primary_category="cs.CL",
+        published_at=datetime(2026, 2, 11, tzinfo=UTC),
+        matched_queries=matched_queries,
+    )
+
+
 class TestDeduplicate:
     """重複排除のテスト。"""
 
@@ -139,7 +420,7 @@ class TestDeduplicate:
             abstract="Abstract 1",
             authors=["Author"],
             primary_category="cs.CL",
-            published_at=datetime(2026, 2, 11, tzinfo=timezone.utc),
+            published_at=datetime(2026, 2, 11, tzinfo=UTC),
             matched_queries=[1],
         )
         p2 = ArxivPaper(
@@ -148,7 +429,7 @@ class TestDeduplicate:
             abstract="Abstract 1",
             authors=["Author"],
             primary_category="cs.CL",
-            published_at=datetime(2026, 2, 11, tzinfo=timezone.utc),
+            published_at=datetime(2026, 2, 11, tzinfo=UTC),
             matched_queries=[3],
         )
         result = deduplicate([p1, p2])
@@ -161,7 +442,7 @@ class TestDeduplicate:
             abstract="Abstract 1",
             authors=["Author"],
             primary_category="cs.CL",
-            published_at=datetime(2026, 2, 11, tzinfo=timezone.utc),
+            published_at=datetime(2026, 2, 11, tzinfo=UTC),
             matched_queries=[1],
         )
         p2 = ArxivPaper(
@@ -170,12 +451,30 @@ class TestDeduplicate:
             abstract="Abstract 1",
             authors=["Author"],
             primary_category="cs.CL",
-            published_at=datetime(2026, 2, 11, tzinfo=timezone.utc),
+            published_at=datetime(2026, 2, 11, tzinfo=UTC),
             matched_queries=[3],
         )
         result = deduplicate([p1, p2])
         assert set(result[0].matched_queries) == {1, 3}
 
+    def test_matched_queries_sorted_in_first_seen_order(self) -> None:
+        papers = [
+            _make_paper("2402.00001", [5]),
+            _make_paper("2402.00002", [2]),
+            _make_paper("2402.00001", [1]),
+            _make_paper("2402.00001", [5, 3]),
+        ]
+        result = deduplicate(papers)
+        assert [p.arxiv_id for p in result] == ["2402.00001", "2402.00002"]
+        assert result[0].matched_queries == [1, 3, 5]
+        # 論文モデルは作り直さず、初出の論文をそのまま使う
+        assert result[0] is papers[0]
+        assert result[1] is papers[1]
+
+    def test_sorts_multi_query_input(self) -> None:
+        paper = _make_paper("2402.00001", [4, 2])
+        assert deduplicate([paper])[0].matched_queries == [2, 4]
+
     def test_keeps_unique_papers(self) -> None:
         p1 = ArxivPaper(
             arxiv_id="2402.11111",
@@ -183,7 +482,7 @@ class TestDeduplicate:
             abstract="Abstract 1",
             authors=["Author"],
             primary_category="cs.CL",
-            published_at=datetime(2026, 2, 11, tzinfo=timezone.utc),
+            published_at=datetime(2026, 2, 11, tzinfo=UTC),
             matched_queries=[1],
         )
         p2 = ArxivPaper(
@@ -192,7 +491,7 @@ class TestDeduplicate:
             abstract="Abstract 2",
             authors=["Author"],
             primary_category="cs.LG",
-            published_at=datetime(2026, 2, 11, tzinfo=timezone.utc),
+            published_at=datetime(2026, 2, 11, tzinfo=UTC),
             matched_queries=[2],
         )
         result = deduplicate([p1, p2])
@@ -5,14 +5,44 @@ DB・APIコールは含まない純粋なロジックテスト。
 
 from __future__ import annotations
 
+import asyncio
+import base64
+from collections.abc import Generator
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import numpy.typing as npt
+import openai
+import pytest
+
 from batch.config import (
-    ANCHOR_COUNT,
+    ARXIV_QUERIES,
+    CATEGORY_NAMES,
     IMPORTANCE_WEIGHT_HIT_COUNT,
     IMPORTANCE_WEIGHT_MATCHED_QUERIES,
     IMPORTANCE_WEIGHT_MAX_SCORE,
+    L2_DUPLICATE_EF_SEARCH,
     L2_THRESHOLD,
 )
-from utils.models import L2Result
+from batch.l2_selector import (
+    _compute_l2_scores,
+    _embedding_cache_key,
+    _fetch_recent_duplicates,
+    _find_duplicates,
+    _generate_embeddings,
+    _insert_papers,
+    _pack_batches,
+    _request_embeddings,
+    _update_l2_results,
+    embed_collected_batches,
+    rescore_papers,
+    run_l2,
+)
+from utils.models import ArxivPaper, L2Result
+
+CATEGORY_COUNT = len(CATEGORY_NAMES)
+QUERY_COUNT = len(ARXIV_QUERIES)
 
 
 def compute_importance(
@@ -23,8 +53,8 @@ def compute_importance(
     """importance_score の計算ロジック (l2_selector._compute_l2_scores 内と同一)。"""
     return (
         IMPORTANCE_WEIGHT_MAX_SCORE * max_score
-        + IMPORTANCE_WEIGHT_HIT_COUNT * (hit_count / ANCHOR_COUNT)
-        + IMPORTANCE_WEIGHT_MATCHED_QUERIES * (matched_queries_count / ANCHOR_COUNT)
+        + IMPORTANCE_WEIGHT_HIT_COUNT * (hit_count / CATEGORY_COUNT)
+        + IMPORTANCE_WEIGHT_MATCHED_QUERIES * (matched_queries_count / QUERY_COUNT)
     )
 
 
@@ -112,3 +142,724 @@ class TestL2Threshold:
     def test_threshold_value(self) -> None:
         """閾値が設計書の値 (0.40) であること。"""
         assert L2_THRESHOLD == 0.40
+
+
+# ---------------------------------------------------------------------------
+# L1 と並行した Embedding 生成
+# ---------------------------------------------------------------------------
+def _make_paper(arxiv_id: str, category_id: int) -> ArxivPaper:
+    return ArxivPaper(
+        arxiv_id=arxiv_id,
+        title=f"Paper {arxiv_id}",
+        abstract="Abstract.",
+        authors=["Author"],
+        primary_category="cs.CL",
+        published_at=datetime(2026, 2, 11, tzinfo=UTC),
+        matched_queries=[category_id],
+    )
+
+
+class TestEmbedCollectedBatches:
+    """L1 のキューを消費する embed_collected_batches を検証する。"""
+
+    @pytest.mark.asyncio
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
+    @patch("batch.l2_selector._generate_embeddings")
+    async def test_embeds_each_paper_once(
+        self, mock_embed: MagicMock, mock_known: MagicMock, mock_api_key: MagicMock
+    ) -> None:
+        """クロスリストされた論文は最初のバッチでのみ Embedding される。"""
+        mock_embed.side_effect = lambda papers, client: [[float(len(p.arxiv_id))] for p in papers]
+        queue: asyncio.Queue[list[ArxivPaper] | None] = asyncio.Queue()
+        await queue.put([_make_paper("2402.00001", 1), _make_paper("2402.00002", 1)])
+        await queue.put([_make_paper("2402.00002", 2), _make_paper("2402.00003", 2)])
+        await queue.put(None)
+
+        raw, embeddings = await embed_collected_batches(queue)
+
+        assert len(raw) == 4
+        assert set(embeddings) == {"2402.00001", "2402.00002", "2402.00003"}
+        second_batch = mock_embed.call_args_list[1].args[0]
+        assert [p.arxiv_id for p in second_batch] == ["2402.00003"]
+
+    @pytest.mark.asyncio
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
+    @patch("batch.l2_selector._generate_embeddings")
+    async def test_failed_batch_is_deferred(
+        self, mock_embed: MagicMock, mock_known: MagicMock, mock_api_key: MagicMock
+    ) -> None:
+        """Embedding に失敗したバッチも論文は受け取り、後続バッチは処理を続ける。"""
+        mock_embed.side_effect = [RuntimeError("rate limited"), [[0.1]]]
+        queue: asyncio.Queue[list[ArxivPaper] | None] = asyncio.Queue()
+        await queue.put([_make_paper("2402.00001", 1)])
+        await queue.put([_make_paper("2402.00002", 2)])
+        await queue.put(None)
+
+        raw, embeddings = await embed_collected_batches(queue)
+
+        assert [p.arxiv_id for p in raw] == ["2402.00001", "2402.00002"]
+        assert embeddings == {"2402.00002": [0.1]}
+
+    @pytest.mark.asyncio
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value={"2402.00001"})
+    @patch("batch.l2_selector._generate_embeddings")
+    async def test_skips_known_papers(
+        self, mock_embed: MagicMock, mock_known: MagicMock, mock_api_key: MagicMock
+    ) -> None:
+        """papers テーブルに登録済みの論文は Embedding しない。"""
+        mock_embed.side_effect = lambda papers, client: [[0.1]] * len(papers)
+        queue: asyncio.Queue[list[ArxivPaper] | None] = asyncio.Queue()
+        await queue.put([_make_paper("2402.00001", 1), _make_paper("2402.00002", 1)])
+        await queue.put([_make_paper("2402.00001", 2)])
+        await queue.put(None)
+
+        raw, embeddings = await embed_collected_batches(queue)
+
+        assert len(raw) == 3
+        assert set(embeddings) == {"2402.00002"}
+        # 登録済みと分かった論文は次のバッチで問い合わせない
+        assert mock_known.call_count == 1
+
+
+# ---------------------------------------------------------------------------
+# 登録済み論文の除外
+# ---------------------------------------------------------------------------
+class TestRunL2KnownPapers:
+    """登録済み論文が Embedding・スコアリングから除外されることを検証する。"""
+
+    @patch("batch.l2_selector._update_l2_results")
+    @patch("batch.l2_selector._compute_l2_scores", return_value=[])
+    @patch("batch.l2_selector._insert_papers")
+    @patch("batch.l2_selector._find_duplicates", return_value={})
+    @patch("batch.l2_selector._generate_embeddings")
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_unanalyzed_results", return_value=[])
+    @patch("batch.l2_selector._merge_known_papers")
+    @patch("batch.l2_selector._fetch_known_ids", return_value={"2402.00001"})
+    def test_known_papers_only_merge_queries(
+        self,
+        mock_known: MagicMock,
+        mock_merge: MagicMock,
+        mock_unanalyzed: MagicMock,
+        mock_api_key: MagicMock,
+        mock_embed: MagicMock,
+        mock_duplicates: MagicMock,
+        mock_insert: MagicMock,
+        mock_scores: MagicMock,
+        mock_update: MagicMock,
+    ) -> None:
+        mock_embed.side_effect = lambda papers, client: [[0.1]] * len(papers)
+        papers = [_make_paper("2402.00001", 2), _make_paper("2402.00002", 1)]
+
+        run_l2(papers)
+
+        mock_known.assert_called_once_with(["2402.00001", "2402.00002"])
+        assert [p.arxiv_id for p in mock_merge.call_args.args[0]] == ["2402.00001"]
+        assert [p.arxiv_id for p in mock_embed.call_args.args[0]] == ["2402.00002"]
+        assert [p.arxiv_id for p in mock_insert.call_args.args[0]] == ["2402.00002"]
+
+    @patch("batch.l2_selector._generate_embeddings")
+    @patch("batch.l2_selector._fetch_unanalyzed_results", return_value=[])
+    @patch("batch.l2_selector._merge_known_papers")
+    @patch("batch.l2_selector._fetch_known_ids", return_value={"2402.00001"})
+    def test_all_known_skips_embedding(
+        self,
+        mock_known: MagicMock,
+        mock_merge: MagicMock,
+        mock_unanalyzed: MagicMock,
+        mock_embed: MagicMock,
+    ) -> None:
+        assert run_l2([_make_paper("2402.00001", 1)]) == []
+        mock_embed.assert_not_called()
+        mock_merge.assert_called_once()
+
+    @patch("batch.l2_selector._generate_embeddings")
+    @patch("batch.l2_selector._fetch_unanalyzed_results")
+    @patch("batch.l2_selector._merge_known_papers")
+    @patch("batch.l2_selector._fetch_known_ids", return_value={"2402.00001", "2402.00002"})
+    def test_rerun_after_l3_failure_passes_unanalyzed_papers(
+        self,
+        mock_known: MagicMock,
+        mock_merge: MagicMock,
+        mock_unanalyzed: MagicMock,
+        mock_embed: MagicMock,
+    ) -> None:
+        # 前回の実行は L2 まで終えて L3 で失敗した: 2402.00001 は L2 通過・L3 未分析
+        mock_unanalyzed.return_value = [
+            L2Result(
+                arxiv_id="2402.00001",
+                max_score=0.8,
+                best_category_id=3,
+                hit_count=2,
+                importance_score=0.6,
+                all_scores={"3": 0.8},
+                passed=True,
+            )
+        ]
+        papers = [_make_paper("2402.00001", 2), _make_paper("2402.00002", 1)]
+
+        passed = run_l2(papers)
+
+        assert [p.arxiv_id for p in passed] == ["2402.00001"]
+        assert passed[0].best_category_id == 3
+        assert passed[0].max_score == 0.8
+        mock_embed.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# Embedding キャッシュ
+# ---------------------------------------------------------------------------
+DIM = 3
+
+
+@pytest.fixture(autouse=True)
+def small_dimensions() -> Generator[None]:
+    """Embedding の次元数をテスト用に縮める。"""
+    with patch("batch.l2_selector.EMBEDDING_DIMENSIONS", DIM):
+        yield
+
+
+def _b64(values: list[float]) -> str:
+    """OpenAI API の encoding_format="base64" 形式にエンコードする。"""
+    return base64.b64encode(np.array(values, dtype="<f4").tobytes()).decode()
+
+
+def _openai_error(status_code: int) -> openai.APIStatusError:
+    """指定ステータスの OpenAI API エラー (429 なら RateLimitError) を作る。"""
+    # HTTP ライブラリの型に依存しないよう、レスポンスは必要な属性だけを持つモックにする
+    response = MagicMock(status_code=status_code, headers={})
+    if status_code == 429:
+        return openai.RateLimitError("rate limited", response=response, body=None)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def _fake_openai() -> MagicMock:
+    """入力テキスト数だけ base64 形式の Embedding を返す疑似 OpenAI クライアント。"""
+    client = MagicMock()
+    client.embeddings.create.side_effect = lambda input, model, encoding_format: MagicMock(
+        data=[MagicMock(embedding=_b64([float(len(t))] * DIM)) for t in input]
+    )
+    return client
+
+
+class TestEmbeddingCache:
+    """キャッシュヒット分は OpenAI を呼ばないことを検証する。"""
+
+    @patch("batch.l2_selector._store_cached_embeddings")
+    @patch("batch.l2_selector._lookup_cached_embeddings")
+    def test_only_misses_are_requested(self, mock_lookup: MagicMock, mock_store: MagicMock) -> None:
+        cached = _embedding_cache_key("Paper 2402.00001 Abstract.")
+        mock_lookup.return_value = {cached: np.full(DIM, 9.0, dtype=np.float32)}
+        client = _fake_openai()
+        papers = [
+            _make_paper("2402.00001", 1),
+            _make_paper("2402.00002", 1),
+            _make_paper("2402.00002", 2),
+        ]
+
+        vectors = _generate_embeddings(papers, client)
+
+        assert vectors.shape == (3, DIM)
+        assert vectors.dtype == np.float32
+        assert vectors[0].tolist() == [9.0] * DIM
+        assert vectors[1].tolist() == vectors[2].tolist() == [26.0] * DIM
+        # 同一テキストは1回だけ問い合わせ、結果を保存する
+        assert client.embeddings.create.call_args.kwargs["input"] == ["Paper 2402.00002 Abstract."]
+        assert list(mock_store.call_args.args[0]) == [
+            _embedding_cache_key("Paper 2402.00002 Abstract.")
+        ]
+
+    @patch("batch.l2_selector._store_cached_embeddings", side_effect=RuntimeError("db down"))
+    @patch("batch.l2_selector._lookup_cached_embeddings", side_effect=RuntimeError("db down"))
+    def test_cache_failure_falls_back_to_api(
+        self, mock_lookup: MagicMock, mock_store: MagicMock
+    ) -> None:
+        vectors = _generate_embeddings([_make_paper("2402.00001", 1)], _fake_openai())
+        assert len(vectors) == 1
+
+    def test_key_depends_on_model(self) -> None:
+        assert _embedding_cache_key("text", "model-a") != _embedding_cache_key("text", "model-b")
+
+
+# ---------------------------------------------------------------------------
+# Embedding バッチ分割
+# ---------------------------------------------------------------------------
+class TestEmbeddingBatcher:
+    """推定トークン数によるバッチ分割と、バッチ単位のリトライを検証する。"""
+
+    def test_packs_by_token_budget(self) -> None:
+        texts = ["x" * 30, "x" * 30, "x" * 30, "x"]
+        with patch("batch.l2_selector.EMBEDDING_MAX_BATCH_TOKENS", 25):
+            # 30文字 ≈ 11トークン → 2件ずつ
+            assert _pack_batches(texts) == [[0, 1], [2, 3]]
+
+    def test_packs_by_input_count(self) -> None:
+        with patch("batch.l2_selector.EMBEDDING_MAX_BATCH_INPUTS", 2):
+            assert _pack_batches(["a"] * 5) == [[0, 1], [2, 3], [4]]
+
+    def test_oversized_text_gets_own_batch(self) -> None:
+        with patch("batch.l2_selector.EMBEDDING_MAX_BATCH_TOKENS", 5):
+            assert _pack_batches(["a", "x" * 100, "b"]) == [[0], [1], [2]]
+
+    @patch("batch.l2_selector.time.sleep")
+    def test_order_kept_and_failed_batch_retried_alone(self, mock_sleep: MagicMock) -> None:
+        calls: list[list[str]] = []
+        failed: set[str] = set()
+
+        def create(input: list[str], model: str, encoding_format: str) -> MagicMock:
+            calls.append(list(input))
+            if "c" in input and "c" not in failed:
+                failed.add("c")
+                raise _openai_error(429)
+            return MagicMock(data=[MagicMock(embedding=_b64([float(ord(t))] * DIM)) for t in input])
+
+        client = MagicMock()
+        client.embeddings.create.side_effect = create
+        with patch("batch.l2_selector.EMBEDDING_MAX_BATCH_INPUTS", 2):
+            vectors = _request_embeddings(["a", "b", "c", "d", "e"], client)
+
+        assert vectors[:, 0].tolist() == [97.0, 98.0, 99.0, 100.0, 101.0]
+        # 失敗したバッチ ("c", "d") だけが再送される
+        assert sorted(map(tuple, calls)) == [("a", "b"), ("c", "d"), ("c", "d"), ("e",)]
+        mock_sleep.assert_called_once()
+
+    @patch("batch.l2_selector.time.sleep")
+    def test_raises_after_retries(self, mock_sleep: MagicMock) -> None:
+        client = MagicMock()
+        client.embeddings.create.side_effect = _openai_error(503)
+        with pytest.raises(openai.APIStatusError):
+            _request_embeddings(["a"], client)
+        assert client.embeddings.create.call_count == 3
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            _openai_error(401),
+            _openai_error(400),
+            RuntimeError("bug"),
+        ],
+    )
+    @patch("batch.l2_selector.time.sleep")
+    def test_non_transient_error_is_not_retried(
+        self, mock_sleep: MagicMock, error: Exception
+    ) -> None:
+        client = MagicMock()
+        client.embeddings.create.side_effect = error
+        with pytest.raises(type(error)):
+            _request_embeddings(["a"], client)
+        assert client.embeddings.create.call_count == 1
+        mock_sleep.assert_not_called()
+
+    @patch("batch.l2_selector.time.sleep")
+    def test_connection_error_is_retried(self, mock_sleep: MagicMock) -> None:
+        client = _fake_openai()
+        ok = client.embeddings.create.side_effect
+        timeout = openai.APITimeoutError(request=MagicMock())
+        client.embeddings.create.side_effect = [timeout, ok(["a"], "", "")]
+        assert _request_embeddings(["a"], client).shape == (1, DIM)
+        assert client.embeddings.create.call_count == 2
+
+
+# ---------------------------------------------------------------------------
+# papers への一括投入
+# ---------------------------------------------------------------------------
+class TestInsertPapers:
+    """COPY で一時テーブルに流し込み、1文でマージすることを検証する。"""
+
+    @patch("batch.l2_selector.get_sync_connection")
+    def test_copy_then_single_merge(self, mock_conn: MagicMock) -> None:
+        cur = mock_conn.return_value.cursor.return_value.__enter__.return_value
+        copy = cur.copy.return_value.__enter__.return_value
+        papers = [_make_paper("2402.00001", 1), _make_paper("2402.00002", 2)]
+        embeddings = np.arange(2 * DIM, dtype=np.float32).reshape(2, DIM)
+
+        _insert_papers(papers, embeddings)
+
+        assert "COPY papers_staging" in cur.copy.call_args.args[0]
+        rows = [c.args[0] for c in copy.write_row.call_args_list]
+        assert [(r[0], r[8]) for r in rows] == [("2402.00001", [1]), ("2402.00002", [2])]
+        np.testing.assert_array_equal(rows[1][9], embeddings[1])
+        assert [r[10] for r in rows] == [None, None]
+        # 一時テーブル作成 + マージの2文のみ (行ごとの INSERT は無い)
+        statements = [c.args[0] for c in cur.execute.call_args_list]
+        assert len(statements) == 2
+        assert "ON CONFLICT (arxiv_id)" in statements[1]
+        mock_conn.return_value.commit.assert_called_once()
+
+    @patch("batch.l2_selector.get_sync_connection")
+    def test_empty_is_noop(self, mock_conn: MagicMock) -> None:
+        _insert_papers([], np.empty((0, DIM), dtype=np.float32))
+        mock_conn.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# 近似重複の検出
+# ---------------------------------------------------------------------------
+class TestFindDuplicates:
+    """Embedding がほぼ同じ論文を先に登録・公開された論文に対応付けることを検証する。"""
+
+    @staticmethod
+    def _papers(*days: int) -> list[ArxivPaper]:
+        return [
+            _make_paper(f"2402.{i:05d}", 1).model_copy(
+                update={"published_at": datetime(2026, 2, day, tzinfo=UTC)}
+            )
+            for i, day in enumerate(days, start=1)
+        ]
+
+    @patch("batch.l2_selector._fetch_recent_duplicates", return_value={})
+    def test_in_batch_links_to_earliest(self, mock_recent: MagicMock) -> None:
+        # 00001 (2/12) と 00003 (2/11) はほぼ同一、00002 は別の論文
+        papers = self._papers(12, 12, 11)
+        embeddings = np.array([[1.0, 0.01, 0], [0, 1, 0], [1.0, 0, 0]], dtype=np.float32)
+
+        assert _find_duplicates(papers, embeddings) == {"2402.00001": "2402.00003"}
+        assert mock_recent.call_args.args[0] == ["2402.00001", "2402.00002", "2402.00003"]
+
+    @patch("batch.l2_selector._fetch_recent_duplicates")
+    def test_links_to_recent_paper(self, mock_recent: MagicMock) -> None:
+        # 登録済み論文の重複は、バッチ内の重複元にはならない
+        mock_recent.return_value = {"2402.00001": "2401.08888"}
+        papers = self._papers(11, 12)
+        embeddings = np.array([[1.0, 0, 0], [1.0, 0.01, 0]], dtype=np.float32)
+
+        assert _find_duplicates(papers, embeddings) == {"2402.00001": "2401.08888"}
+
+    @patch("batch.l2_selector.get_sync_connection")
+    def test_recent_duplicates_use_nearest_neighbour_query(self, mock_conn: MagicMock) -> None:
+        cur = mock_conn.return_value.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [("2402.00002", "2401.08888")]
+        embeddings = np.eye(2, DIM, dtype=np.float32)
+
+        duplicates = _fetch_recent_duplicates(["2402.00001", "2402.00002"], embeddings)
+
+        assert duplicates == {"2402.00002": "2401.08888"}
+        # ef_search はトランザクション内だけ上げ、探索後に commit で戻す
+        assert cur.execute.call_args_list[0].args == (
+            "SELECT set_config('hnsw.ef_search', %s, true)",
+            (str(L2_DUPLICATE_EF_SEARCH),),
+        )
+        mock_conn.return_value.commit.assert_called_once()
+        sql, params = cur.execute.call_args.args
+        assert "ORDER BY p.embedding <=> q.embedding" in sql
+        # 登録済み論文の Embedding は読み込まず、今回の論文の Embedding だけを送る
+        assert [v.dtype for v in params["embeddings"]] == [np.float32, np.float32]
+
+    @patch("batch.l2_selector._fetch_recent_duplicates", return_value={})
+    def test_duplicate_of_duplicate_points_to_source(self, mock_recent: MagicMock) -> None:
+        papers = self._papers(11, 12, 13)
+        embeddings = np.array([[1.0, 0, 0], [1.0, 0.1, 0], [1.0, 0.2, 0]], dtype=np.float32)
+
+        duplicates = _find_duplicates(papers, embeddings)
+
+        assert set(duplicates.values()) == {"2402.00001"}
+
+    @patch("batch.l2_selector._update_l2_results")
+    @patch("batch.l2_selector._compute_l2_scores")
+    @patch("batch.l2_selector._insert_papers")
+    @patch("batch.l2_selector._find_duplicates", return_value={"2402.00002": "2402.00001"})
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
+    def test_run_l2_skips_duplicates(
+        self,
+        mock_known: MagicMock,
+        mock_duplicates: MagicMock,
+        mock_insert: MagicMock,
+        mock_scores: MagicMock,
+        mock_update: MagicMock,
+    ) -> None:
+        papers = self._papers(11, 12)
+        mock_scores.return_value = [
+            L2Result(
+                arxiv_id=p.arxiv_id,
+                max_score=0.9,
+                best_category_id=1,
+                hit_count=1,
+                importance_score=0.5,
+                all_scores={"1": 0.9},
+                passed=True,
+            )
+            for p in papers
+        ]
+        embeddings = {p.arxiv_id: np.ones(DIM, dtype=np.float32) for p in papers}
+
+        passed = run_l2(papers, embeddings)
+
+        # 重複もスコアは保存するが、L3 には重複元だけを渡す
+        assert [p.arxiv_id for p in passed] == ["2402.00001"]
+        assert mock_insert.call_args.args[2] == {"2402.00002": "2402.00001"}
+        assert len(mock_update.call_args.args[0]) == 2
+
+
+# ---------------------------------------------------------------------------
+# L2 スコアリング
+# ---------------------------------------------------------------------------
+def _reference_scores(
+    paper: ArxivPaper, embedding: np.ndarray, category_ids: list[int], anchors: np.ndarray
+) -> L2Result:
+    """旧実装 (論文ごとに SQL で 1 - (embedding <=> anchor) を取得) と同じ導出。"""
+    scores = []
+    for anchor in anchors:
+        dot = sum(float(x) * float(y) for x, y in zip(embedding, anchor, strict=True))
+        norm = (sum(float(x) ** 2 for x in embedding) * sum(float(y) ** 2 for y in anchor)) ** 0.5
+        scores.append(dot / norm)
+    max_score = max(scores)
+    hit_count = sum(1 for s in scores if s >= L2_THRESHOLD)
+    importance = (
+        IMPORTANCE_WEIGHT_MAX_SCORE * max_score
+        + IMPORTANCE_WEIGHT_HIT_COUNT * (hit_count / len(category_ids))
+        + IMPORTANCE_WEIGHT_MATCHED_QUERIES * (len(paper.matched_queries) / QUERY_COUNT)
+    )
+    return L2Result(
+        arxiv_id=paper.arxiv_id,
+        max_score=round(max_score, 4),
+        best_category_id=category_ids[scores.index(max_score)],
+        hit_count=hit_count,
+        importance_score=round(importance, 4),
+        all_scores={str(c): round(s, 4) for c, s in zip(category_ids, scores, strict=True)},
+        passed=max_score >= L2_THRESHOLD,
+    )
+
+
+class TestComputeL2Scores:
+    """行列積によるスコアリングが論文ごとの計算と一致することを検証する。"""
+
+    def test_matches_per_paper_computation(self) -> None:
+        rng = np.random.default_rng(0)
+        category_ids = [1, 2, 3, 4, 5, 6]
+        anchors = rng.standard_normal((6, 64)).astype(np.float32)
+        # アンカーに寄せた論文を混ぜ、閾値前後のスコアと複数ヒットを作る
+        mix = rng.uniform(0, 1, (40, 6)) ** 4
+        embeddings = (mix @ anchors + 0.5 * rng.standard_normal((40, 64))).astype(np.float32)
+        papers = [_make_paper(f"2402.{i:05d}", 1 + i % 6) for i in range(40)]
+        papers[0] = papers[0].model_copy(update={"matched_queries": [1, 2, 3]})
+
+        with patch("batch.l2_selector._fetch_active_anchors", return_value=(category_ids, anchors)):
+            results = _compute_l2_scores(papers, embeddings)
+
+        expected = [
+            _reference_scores(p, e, category_ids, anchors)
+            for p, e in zip(papers, embeddings, strict=True)
+        ]
+        assert results == expected
+        assert any(r.passed for r in results) and not all(r.passed for r in results)
+        assert any(r.hit_count > 1 for r in results)
+
+    def test_pools_top_k_anchors_per_category(self) -> None:
+        rng = np.random.default_rng(1)
+        anchor_category_ids = [1, 1, 2, 3, 3, 3]
+        anchors = rng.standard_normal((6, 16)).astype(np.float32)
+        embeddings = (anchors + 0.3 * rng.standard_normal((6, 16))).astype(np.float32)
+        papers = [_make_paper(f"2402.{i:05d}", 1) for i in range(6)]
+
+        with (
+            patch("batch.l2_selector.L2_ANCHOR_POOL_TOP_K", 2),
+            patch(
+                "batch.l2_selector._fetch_active_anchors",
+                return_value=(anchor_category_ids, anchors),
+            ),
+        ):
+            results = _compute_l2_scores(papers, embeddings)
+
+        per_anchor = [
+            _reference_scores(p, e, list(range(6)), anchors)
+            for p, e in zip(papers, embeddings, strict=True)
+        ]
+        for result, ref in zip(results, per_anchor, strict=True):
+            raw = [ref.all_scores[str(i)] for i in range(6)]
+            expected = {
+                "1": (raw[0] + raw[1]) / 2,
+                "2": raw[2],
+                "3": sum(sorted(raw[3:6])[-2:]) / 2,
+            }
+            assert result.all_scores == pytest.approx(expected, abs=2e-4)
+
+    def test_subtopic_anchors_do_not_raise_pass_rate(self) -> None:
+        """サブトピックのアンカーを足しても、1アンカーのときより通過率が上がらない。"""
+        rng = np.random.default_rng(0)
+        dim = 256
+
+        def unit(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+            normed: npt.NDArray[np.float64] = x / np.linalg.norm(x, axis=-1, keepdims=True)
+            return normed
+
+        # カテゴリ定義文のアンカーと、キーワード由来のサブトピックのアンカー 4 本
+        default, *keyword_rows = unit(rng.standard_normal((5, dim)))
+        keywords = np.stack(keyword_rows)
+        noise = rng.standard_normal((100, dim)) / np.sqrt(dim)
+        # 該当論文: 定義文とどれかのキーワードの両方に近い (どちらとも類似度 ~0.6)
+        on_topic = unit(default + keywords[rng.integers(0, 4, 40)] + 0.8 * noise[:40])
+        # 近いだけの論文: キーワード1つとしか似ていない (類似度 ~0.55)
+        near_miss = unit(keywords[rng.integers(0, 4, 60)] + 1.6 * noise[40:])
+        embeddings = np.vstack([on_topic, near_miss]).astype(np.float32)
+        papers = [_make_paper(f"2402.{i:05d}", 1) for i in range(len(embeddings))]
+
+        def pass_rate(anchors: npt.NDArray[np.float64], top_k: int) -> float:
+            with (
+                patch("batch.l2_selector.L2_ANCHOR_POOL_TOP_K", top_k),
+                patch(
+                    "batch.l2_selector._fetch_active_anchors",
+                    return_value=([1] * len(anchors), anchors.astype(np.float32)),
+                ),
+            ):
+                results = _compute_l2_scores(papers, embeddings)
+            return sum(r.passed for r in results) / len(results)
+
+        with_subtopics = np.vstack([default, keywords])
+        single = pass_rate(default[None, :], top_k=2)
+        assert single == pytest.approx(0.4)
+        # 最大値で集約すると近いだけの論文まで通る
+        assert pass_rate(with_subtopics, top_k=1) == 1.0
+        assert pass_rate(with_subtopics, top_k=2) == single
+
+    @patch("batch.l2_selector.get_sync_connection")
+    def test_sql_engine_keeps_input_order(self, mock_conn: MagicMock) -> None:
+        cur = mock_conn.return_value.cursor.return_value.__enter__.return_value
+        # (arxiv_id, matched_count, category_ids, scores, max, argmax, hit_count)
+        cur.fetchall.return_value = [
+            ("2402.00002", 1, [1, 2], [0.1, 0.2], 0.2, 2, 0),
+            ("2402.00001", 2, [1, 2], [0.55, 0.45], 0.55, 1, 2),
+        ]
+        papers = [_make_paper(f"2402.0000{i}", 1) for i in (1, 2, 3)]
+
+        results = _compute_l2_scores(papers, engine="sql")
+
+        assert cur.execute.call_args.args[1]["arxiv_ids"] == [
+            "2402.00001",
+            "2402.00002",
+            "2402.00003",
+        ]
+        # 2402.00003 は Embedding が無く結果に含まれない
+        assert [r.arxiv_id for r in results] == ["2402.00001", "2402.00002"]
+        first = results[0]
+        assert (first.best_category_id, first.hit_count, first.passed) == (1, 2, True)
+        assert first.all_scores == {"1": 0.55, "2": 0.45}
+        assert first.importance_score == round(
+            IMPORTANCE_WEIGHT_MAX_SCORE * 0.55
+            + IMPORTANCE_WEIGHT_HIT_COUNT * 2 / 2  # スコアを計算した2カテゴリで正規化
+            + IMPORTANCE_WEIGHT_MATCHED_QUERIES * 2 / QUERY_COUNT,
+            4,
+        )
+
+    def test_in_process_requires_embeddings(self) -> None:
+        with pytest.raises(ValueError):
+            _compute_l2_scores([_make_paper("2402.00001", 1)])
+
+    def test_no_active_anchors(self) -> None:
+        with patch(
+            "batch.l2_selector._fetch_active_anchors",
+            return_value=([], np.empty((0, DIM), dtype=np.float32)),
+        ):
+            assert (
+                _compute_l2_scores(
+                    [_make_paper("2402.00001", 1)], np.ones((1, DIM), dtype=np.float32)
+                )
+                == []
+            )
+
+
+# ---------------------------------------------------------------------------
+# L2 結果の書き戻し
+# ---------------------------------------------------------------------------
+class TestUpdateL2Results:
+    """UPDATE ... FROM unnest でチャンクごとに1文で更新することを検証する。"""
+
+    @patch("batch.l2_selector.L2_UPDATE_CHUNK_SIZE", 2)
+    @patch("batch.l2_selector.get_sync_connection")
+    def test_chunked_update_reports_rowcount(self, mock_conn: MagicMock) -> None:
+        cur = mock_conn.return_value.cursor.return_value.__enter__.return_value
+        cur.rowcount = 2
+        results = [
+            L2Result(
+                arxiv_id=f"2402.0000{i}",
+                max_score=0.5,
+                best_category_id=i,
+                hit_count=1,
+                importance_score=0.3,
+                all_scores={"1": 0.5},
+                passed=True,
+            )
+            for i in range(1, 6)
+        ]
+
+        assert _update_l2_results(results) == 6
+
+        # 5件をチャンクサイズ2で3文に分け、各文は列ごとの配列を受け取る
+        params = [c.args[1] for c in cur.execute.call_args_list]
+        assert [p[0] for p in params] == [
+            ["2402.00001", "2402.00002"],
+            ["2402.00003", "2402.00004"],
+            ["2402.00005"],
+        ]
+        assert params[0][1] == [1, 2]
+        assert params[0][5] == ['{"1": 0.5}', '{"1": 0.5}']
+        mock_conn.return_value.commit.assert_called_once()
+
+
+# ---------------------------------------------------------------------------
+# アンカー変更後の再スコアリング
+# ---------------------------------------------------------------------------
+def _page(ids: list[int]) -> list[tuple[int, str, int, np.ndarray]]:
+    return [(i, f"2402.{i:05d}", 1, np.full(DIM, float(i), dtype=np.float32)) for i in ids]
+
+
+class TestRescorePapers:
+    """キーセットページングで全論文を再スコアリングし、再開できることを検証する。"""
+
+    @patch("batch.l2_selector._update_l2_results", side_effect=lambda results: len(results))
+    @patch("batch.l2_selector._fetch_active_anchors")
+    @patch("batch.l2_selector._fetch_rescore_page")
+    def test_pages_until_exhausted(
+        self, mock_page: MagicMock, mock_anchors: MagicMock, mock_update: MagicMock
+    ) -> None:
+        mock_anchors.return_value = ([1, 2], np.eye(2, DIM, dtype=np.float32))
+        mock_page.side_effect = [_page([3, 5]), _page([8]), []]
+
+        result = rescore_papers(after_id=2, chunk_size=2)
+
+        assert (result.processed, result.updated, result.last_id, result.done) == (3, 3, 8, True)
+        # 直前のチャンクの最大 id から次のページを読む
+        assert [c.args[:2] for c in mock_page.call_args_list] == [(2, 2), (5, 2), (8, 2)]
+        assert [r.arxiv_id for r in mock_update.call_args_list[0].args[0]] == [
+            "2402.00003",
+            "2402.00005",
+        ]
+        mock_anchors.assert_called_once()
+
+    @patch("batch.l2_selector._update_l2_results", side_effect=lambda results: len(results))
+    @patch("batch.l2_selector._fetch_active_anchors")
+    @patch("batch.l2_selector._fetch_rescore_page")
+    def test_stops_when_budget_exhausted(
+        self, mock_page: MagicMock, mock_anchors: MagicMock, mock_update: MagicMock
+    ) -> None:
+        mock_anchors.return_value = ([1], np.ones((1, DIM), dtype=np.float32))
+        mock_page.side_effect = [_page([1, 2]), _page([3, 4])]
+        budget = iter([True, False])
+
+        result = rescore_papers(chunk_size=2, should_continue=lambda: next(budget))
+
+        assert (result.processed, result.last_id, result.done) == (2, 2, False)
+        mock_page.assert_called_once()
+
+    @patch("batch.l2_selector._update_l2_results", return_value=2)
+    @patch("batch.l2_selector._compute_l2_scores_sql")
+    @patch("batch.l2_selector._fetch_active_anchors")
+    @patch("batch.l2_selector._fetch_rescore_page")
+    def test_sql_engine_skips_embedding_load(
+        self,
+        mock_page: MagicMock,
+        mock_anchors: MagicMock,
+        mock_sql: MagicMock,
+        mock_update: MagicMock,
+    ) -> None:
+        mock_page.side_effect = [[(1, "2402.00001", 1, None), (2, "2402.00002", 1, None)], []]
+        mock_sql.return_value = [MagicMock(), MagicMock()]
+
+        result = rescore_papers(engine="sql")
+
+        assert result.done and result.processed == 2
+        assert mock_page.call_args_list[0].args[2] is False
+        mock_sql.assert_called_once_with(["2402.00001", "2402.00002"])
+        mock_anchors.assert_not_called()
@@ -2,10 +2,28 @@
 
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
+from typing import Any
+from unittest.mock import AsyncMock, patch
 
-from batch.config import CATEGORY_NAMES
-from batch.l3_analyzer import build_l3_prompt
+import pytest
+from google.genai import errors
+
+from batch.config import CATEGORY_NAMES, L3_BATCH_SYSTEM_PROMPT, L3_SYSTEM_PROMPT
+from batch.gemini_cache import PromptCache
+from batch.gemini_limiter import AdaptiveLimiter
+from batch.l3_analyzer import (
+    _call_gemini,
+    _l3_cache_key,
+    _parse_batch_results,
+    _process_batch,
+    _reuse_l3_results,
+    build_l3_batch_prompt,
+    build_l3_prompt,
+    run_l3,
+)
+from tests.conftest import FakeGeminiClient, fake_gemini_response
 from utils.models import L2Paper, L3Response
 
 
@@ -146,3 +164,208 @@ class TestL3Response:
                 importance=3,
                 summary_ja="テスト",
             )
+
+
+# ---------------------------------------------------------------------------
+# Gemini 呼び出しと同時実行数リミッター
+# ---------------------------------------------------------------------------
+class TestCallGemini:
+    """_call_gemini がリミッター経由で呼び出し、429 で同時実行数を下げることを検証する。"""
+
+    @pytest.mark.asyncio
+    @patch("batch.l3_analyzer.BACKOFF_BASE_SEC", 0)
+    async def test_rate_limit_then_success(self, fake_gemini: FakeGeminiClient) -> None:
+        result = L3Response(
+            is_relevant=True, category_id=4, confidence=0.9, importance=4, summary_ja="要約"
+        )
+        fake_gemini.models.responses = [
+            errors.ClientError(429, {"error": {"code": 429}}),
+            fake_gemini_response(result.model_dump(), 120, 30),
+        ]
+        client: Any = fake_gemini
+        limiter = AdaptiveLimiter(name="test", initial=4, min_limit=1, max_limit=8)
+        cache = PromptCache(client, "l3", L3_SYSTEM_PROMPT, enabled=True)
+
+        parsed, in_tokens, out_tokens = await _call_gemini(client, _make_l2_paper(), limiter, cache)
+
+        assert parsed == result
+        assert (in_tokens, out_tokens) == (120, 30)
+        assert limiter.decrease_count == 1
+        assert limiter.limit == 2
+        assert limiter.success_count == 1
+        # バックオフ中・終了後に枠を保持していない
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    @patch("batch.l3_analyzer.BACKOFF_BASE_SEC", 0)
+    async def test_references_cached_system_prompt(self, fake_gemini: FakeGeminiClient) -> None:
+        item = {k: v for k, v in _l3_item("x").items() if k != "arxiv_id"}
+        fake_gemini.models.responses = [fake_gemini_response(item), fake_gemini_response(item)]
+        client: Any = fake_gemini
+        limiter = AdaptiveLimiter(name="test", initial=4, min_limit=1, max_limit=8)
+        cache = PromptCache(client, "l3", L3_SYSTEM_PROMPT, enabled=True)
+
+        await _call_gemini(client, _make_l2_paper(), limiter, cache)
+        # サーバー側で期限切れになったキャッシュは 404 を受けて作り直す
+        fake_gemini.caches.expire("cachedContents/fake-1")
+        parsed, _, _ = await _call_gemini(client, _make_l2_paper(), limiter, cache)
+
+        assert parsed is not None
+        configs = [call["config"] for call in fake_gemini.models.calls]
+        assert [c.cached_content for c in configs] == [
+            "cachedContents/fake-1",
+            "cachedContents/fake-1",
+            "cachedContents/fake-2",
+        ]
+        assert all(c.system_instruction is None for c in configs)
+        assert fake_gemini.caches.live == {"cachedContents/fake-2": L3_SYSTEM_PROMPT}
+
+
+# ---------------------------------------------------------------------------
+# 複数論文モード
+# ---------------------------------------------------------------------------
+def _l3_item(arxiv_id: str, is_relevant: bool = True) -> dict[str, object]:
+    return {
+        "arxiv_id": arxiv_id,
+        "is_relevant": is_relevant,
+        "category_id": 4,
+        "confidence": 0.8,
+        "importance": 3,
+        "summary_ja": f"{arxiv_id} の要約",
+    }
+
+
+class TestBuildL3BatchPrompt:
+    def test_contains_every_paper(self) -> None:
+        papers = [
+            _make_l2_paper(arxiv_id="2402.00001", title="First Paper"),
+            _make_l2_paper(arxiv_id="2402.00002", title="Second Paper"),
+        ]
+        prompt = build_l3_batch_prompt(papers)
+        for paper in papers:
+            assert paper.arxiv_id in prompt
+            assert paper.title in prompt
+        assert "2 papers" in prompt
+
+
+class TestParseBatchResults:
+    def test_ignores_invalid_unknown_and_repeated_items(self) -> None:
+        invalid = {**_l3_item("2402.00002"), "importance": 9}
+        repeated = _l3_item("2402.00001", is_relevant=False)
+        text = json.dumps(
+            {"results": [_l3_item("2402.00001"), invalid, _l3_item("9999.99999"), repeated]}
+        )
+
+        parsed = _parse_batch_results(text, ["2402.00001", "2402.00002"])
+
+        assert list(parsed) == ["2402.00001"]
+        assert parsed["2402.00001"].is_relevant is True
+
+
+class TestProcessBatch:
+    @pytest.mark.asyncio
+    async def test_missing_paper_falls_back_to_single_call(
+        self, fake_gemini: FakeGeminiClient
+    ) -> None:
+        papers = [_make_l2_paper(arxiv_id=f"2402.0000{i}") for i in range(1, 4)]
+        batch = {"results": [_l3_item("2402.00001"), _l3_item("2402.00003")]}
+        single = {k: v for k, v in _l3_item("x").items() if k != "arxiv_id"}
+        fake_gemini.models.responses = [
+            fake_gemini_response(batch, 900, 300),
+            fake_gemini_response(single, 500, 100),
+        ]
+        client: Any = fake_gemini
+        limiter = AdaptiveLimiter(name="test", initial=4, min_limit=1, max_limit=8)
+        batch_cache = PromptCache(client, "l3_batch", L3_BATCH_SYSTEM_PROMPT, enabled=True)
+        single_cache = PromptCache(client, "l3", L3_SYSTEM_PROMPT, enabled=True)
+
+        with patch("batch.l3_analyzer._apply_l3_results", new=AsyncMock()) as apply:
+            outcomes, in_tokens, out_tokens = await _process_batch(
+                client, papers, limiter, batch_cache, single_cache
+            )
+
+        assert [arxiv_id for arxiv_id, _ in outcomes] == [p.arxiv_id for p in papers]
+        assert all(result is not None for _, result in outcomes)
+        assert (in_tokens, out_tokens) == (1400, 400)
+        # 3論文分の結果を1回の一括 UPDATE で反映する
+        apply.assert_awaited_once()
+        assert set(apply.await_args_list[0].args[0]) == {p.arxiv_id for p in papers}
+        # 2回目の呼び出しは欠けた論文だけを単独プロンプトで送る
+        calls = fake_gemini.models.calls
+        assert "2402.00003" in calls[0]["contents"][0]
+        assert "2402.00003" not in calls[1]["contents"][0]
+        assert fake_gemini.caches.create_count == 2
+
+
+# ---------------------------------------------------------------------------
+# L3 結果の再利用
+# ---------------------------------------------------------------------------
+class TestL3CacheKey:
+    def test_depends_on_prompt_and_model(self) -> None:
+        paper = _make_l2_paper()
+        assert _l3_cache_key(paper) == _l3_cache_key(_make_l2_paper())
+        assert _l3_cache_key(paper) != _l3_cache_key(_make_l2_paper(abstract="Changed."))
+        assert _l3_cache_key(paper) != _l3_cache_key(_make_l2_paper(max_score=0.9))
+        assert _l3_cache_key(paper) != _l3_cache_key(paper, model="other-model")
+
+
+class TestReuseL3Results:
+    @pytest.mark.asyncio
+    async def test_skips_analyzed_and_applies_cache_hits(self) -> None:
+        analyzed, cached, fresh = (
+            _make_l2_paper(arxiv_id=f"2402.0000{i}", abstract=f"Abstract {i}") for i in range(3)
+        )
+        hit = L3Response.model_validate({k: v for k, v in _l3_item("x").items() if k != "arxiv_id"})
+
+        with (
+            patch(
+                "batch.l3_analyzer._fetch_analyzed",
+                new=AsyncMock(return_value={analyzed.arxiv_id: False}),
+            ),
+            patch(
+                "batch.l3_analyzer._lookup_cached_results",
+                new=AsyncMock(return_value={_l3_cache_key(cached): hit}),
+            ),
+            patch("batch.l3_analyzer._apply_l3_results", new=AsyncMock()) as apply,
+        ):
+            remaining, reused = await _reuse_l3_results([analyzed, cached, fresh])
+
+        assert remaining == [fresh]
+        assert reused == {analyzed.arxiv_id: False, cached.arxiv_id: True}
+        apply.assert_awaited_once_with({cached.arxiv_id: hit})
+
+    @pytest.mark.asyncio
+    async def test_force_skips_lookup(self) -> None:
+        papers = [_make_l2_paper()]
+        with patch("batch.l3_analyzer._fetch_analyzed", new=AsyncMock()) as fetch:
+            remaining, reused = await _reuse_l3_results(papers, force=True)
+        assert remaining == papers
+        assert reused == {}
+        fetch.assert_not_awaited()
+
+
+class TestRunL3:
+    @pytest.mark.asyncio
+    async def test_calls_api_only_for_new_papers(self, fake_gemini: FakeGeminiClient) -> None:
+        known = _make_l2_paper(arxiv_id="2402.00001")
+        new = _make_l2_paper(arxiv_id="2402.00002")
+        item = {k: v for k, v in _l3_item("x").items() if k != "arxiv_id"}
+        fake_gemini.models.responses = [fake_gemini_response(item, 100, 20)]
+
+        with (
+            patch("batch.l3_analyzer.genai.Client", return_value=fake_gemini),
+            patch("batch.l3_analyzer.get_gemini_api_key", return_value="test-key"),
+            patch(
+                "batch.l3_analyzer._reuse_l3_results",
+                new=AsyncMock(return_value=([new], {known.arxiv_id: True})),
+            ),
+            patch("batch.l3_analyzer._apply_l3_results", new=AsyncMock()),
+            patch("batch.l3_analyzer._store_cached_results", new=AsyncMock()) as store,
+        ):
+            relevant, in_tokens, _ = await run_l3([known, new], batch_size=1)
+
+        assert [p.arxiv_id for p in relevant] == [known.arxiv_id, new.arxiv_id]
+        assert in_tokens == 100
+        assert len(fake_gemini.models.calls) == 1
+        (entries,) = store.await_args_list[0].args
+        assert list(entries) == [_l3_cache_key(new)]
@@ -0,0 +1,284 @@
+"""Tests for batch.l3_batch_prediction module — Gemini バッチ予測モードの投入・再開。"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from batch.config import L3_SYSTEM_PROMPT
+from batch.l3_batch_prediction import (
+    build_batch_request,
+    parse_batch_output,
+    run_l3_batch_prediction,
+)
+from tests.conftest import FakeGeminiClient
+from utils.models import L2Paper, L3Response
+
+
+def _make_l2_paper(arxiv_id: str) -> L2Paper:
+    return L2Paper(
+        arxiv_id=arxiv_id,
+        title=f"Paper {arxiv_id}",
+        abstract="Abstract",
+        authors=["Author"],
+        all_categories=["cs.AI"],
+        primary_category="cs.AI",
+        published_at=datetime(2026, 10, 1, tzinfo=UTC),
+        best_category_id=4,
+        max_score=0.6,
+        hit_count=2,
+    )
+
+
+def _l3_response(is_relevant: bool) -> dict[str, Any]:
+    result = {
+        "is_relevant": is_relevant,
+        "category_id": 4,
+        "confidence": 0.8,
+        "importance": 3,
+        "summary_ja": "要約",
+    }
+    return {
+        "response": {
+            "candidates": [{"content": {"parts": [{"text": json.dumps(result)}]}}],
+            "usageMetadata": {"promptTokenCount": 400, "candidatesTokenCount": 80},
+        }
+    }
+
+
+class FakeJobStore:
+    """l3_batch_jobs テーブルのメモリ上の代替。"""
+
+    def __init__(self) -> None:
+        self.jobs: dict[int, dict[str, Any]] = {}
+        self.applied: dict[str, L3Response] = {}
+        self.cached: dict[str, bool] = {}  # 分析済み・キャッシュ済みとして扱う arxiv_id
+        self.remembered: dict[str, L3Response] = {}
+
+    async def fetch_open(self) -> list[tuple[int, str, list[L2Paper]]]:
+        return [
+            (job_id, job["job_name"], job["papers"])
+            for job_id, job in self.jobs.items()
+            if job["status"] == "submitted"
+        ]
+
+    async def record(
+        self, job_name: str, papers: list[L2Paper], failed_jobs: list[tuple[int, str]]
+    ) -> None:
+        for job_id, provider_state in failed_jobs:
+            self.jobs[job_id].update(status="failed", provider_state=provider_state)
+        if job_name:
+            self.jobs[len(self.jobs) + 1] = {
+                "job_name": job_name,
+                "papers": papers,
+                "status": "submitted",
+            }
+
+    async def finish(self, job_id: int, status: str, provider_state: str, **counts: int) -> None:
+        self.jobs[job_id].update(status=status, provider_state=provider_state, **counts)
+
+    async def apply(self, results: dict[str, L3Response]) -> None:
+        self.applied.update(results)
+
+    async def reuse(
+        self, papers: list[L2Paper], force: bool = False
+    ) -> tuple[list[L2Paper], dict[str, bool]]:
+        return [p for p in papers if p.arxiv_id not in self.cached], {
+            p.arxiv_id: self.cached[p.arxiv_id] for p in papers if p.arxiv_id in self.cached
+        }
+
+    async def remember(self, papers: list[L2Paper], results: dict[str, L3Response]) -> None:
+        self.remembered.update(results)
+
+
+@pytest.fixture
+def job_store() -> Iterator[FakeJobStore]:
+    store = FakeJobStore()
+    with (
+        patch("batch.l3_batch_prediction._fetch_open_jobs", new=store.fetch_open),
+        patch("batch.l3_batch_prediction._record_submission", new=store.record),
+        patch("batch.l3_batch_prediction._finish_job", new=store.finish),
+        patch("batch.l3_batch_prediction._apply_l3_results", new=store.apply),
+        patch("batch.l3_batch_prediction._reuse_l3_results", new=store.reuse),
+        patch("batch.l3_batch_prediction._remember_l3_results", new=store.remember),
+        patch("batch.l3_batch_prediction.L3_BATCH_PREDICTION_DIR", "/tmp/test_l3_batch"),
+    ):
+        yield store
+
+
+class TestBatchRequest:
+    def test_request_line(self) -> None:
+        line = build_batch_request(_make_l2_paper("2410.00001"))
+        assert line["key"] == "2410.00001"
+        request = line["request"]
+        assert "Paper 2410.00001" in request["contents"][0]["parts"][0]["text"]
+        assert request["system_instruction"]["parts"][0]["text"] == L3_SYSTEM_PROMPT
+        assert request["generation_config"]["response_mime_type"] == "application/json"
+        assert "is_relevant" in request["generation_config"]["response_json_schema"]["properties"]
+
+    def test_parse_output_counts_errors(self) -> None:
+        lines = [
+            {"key": "2410.00001", **_l3_response(True)},
+            {"key": "2410.00002", "error": {"code": 500, "message": "internal"}},
+            {"key": "2410.00003", "response": {"candidates": []}},
+        ]
+        data = "\n".join(json.dumps(line) for line in lines).encode()
+
+        results, in_tokens, out_tokens, error_count = parse_batch_output(data)
+
+        assert list(results) == ["2410.00001"]
+        assert (in_tokens, out_tokens) == (400, 80)
+        assert error_count == 2
+
+
+class TestRunL3BatchPrediction:
+    @pytest.mark.asyncio
+    async def test_submit_then_resume(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        day1 = [_make_l2_paper("2410.00001"), _make_l2_paper("2410.00002")]
+
+        # 1回目: 投入のみ (結果はまだ無い)
+        relevant, in_tokens, _, counts = await run_l3_batch_prediction(day1, client)
+        assert relevant == []
+        assert in_tokens == 0
+        assert (counts.submitted, counts.applied, counts.pending) == (2, 0, 0)
+        assert [r["key"] for r in fake_gemini.batches.requests("batches/fake-1")] == [
+            "2410.00001",
+            "2410.00002",
+        ]
+        assert job_store.jobs[1]["status"] == "submitted"
+
+        # 2回目: 完了したジョブの結果を取り込み、今回の論文を新しいジョブに投入する
+        fake_gemini.batches.complete(
+            "batches/fake-1", lambda r: _l3_response(r["key"] == "2410.00001")
+        )
+        day2 = [_make_l2_paper("2410.00003")]
+        relevant, in_tokens, out_tokens, counts = await run_l3_batch_prediction(day2, client)
+
+        assert [p.arxiv_id for p in relevant] == ["2410.00001"]
+        assert (in_tokens, out_tokens) == (800, 160)
+        # 投入した論文 (今回分) と結果を反映した論文 (前回分) は別に数える
+        assert (counts.submitted, counts.applied, counts.pending) == (1, 2, 0)
+        assert set(job_store.applied) == {"2410.00001", "2410.00002"}
+        assert set(job_store.remembered) == {"2410.00001", "2410.00002"}
+        assert job_store.jobs[1]["status"] == "applied"
+        assert job_store.jobs[1]["applied_count"] == 2
+        assert [p.arxiv_id for p in job_store.jobs[2]["papers"]] == ["2410.00003"]
+
+    @pytest.mark.asyncio
+    async def test_running_job_is_left_open(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        await run_l3_batch_prediction([_make_l2_paper("2410.00001")], client)
+
+        relevant, _, _, counts = await run_l3_batch_prediction([], client)
+
+        assert relevant == []
+        assert (counts.submitted, counts.applied, counts.pending) == (0, 0, 1)
+        assert job_store.jobs[1]["status"] == "submitted"
+        assert len(job_store.jobs) == 1
+
+    @pytest.mark.asyncio
+    async def test_poll_error_keeps_job_open(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        await run_l3_batch_prediction([_make_l2_paper("2410.00001")], client)
+        fake_gemini.batches.get_error = RuntimeError("503 Service Unavailable")
+
+        relevant, _, _, counts = await run_l3_batch_prediction(
+            [_make_l2_paper("2410.00001"), _make_l2_paper("2410.00002")], client
+        )
+
+        # 状態を確認できなかったジョブは実行中として扱い、その論文は再投入しない
+        assert relevant == []
+        assert counts.pending == 1
+        assert job_store.jobs[1]["status"] == "submitted"
+        assert [r["key"] for r in fake_gemini.batches.requests("batches/fake-2")] == ["2410.00002"]
+
+    @pytest.mark.asyncio
+    async def test_papers_in_running_job_are_not_resubmitted(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        await run_l3_batch_prediction([_make_l2_paper("2410.00001")], client)
+
+        # L2 は結果未取り込みの論文も再実行時に渡し直す
+        await run_l3_batch_prediction(
+            [_make_l2_paper("2410.00001"), _make_l2_paper("2410.00002")], client
+        )
+
+        assert [r["key"] for r in fake_gemini.batches.requests("batches/fake-2")] == ["2410.00002"]
+
+    @pytest.mark.asyncio
+    async def test_failed_job_is_resubmitted(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        await run_l3_batch_prediction([_make_l2_paper("2410.00001")], client)
+        fake_gemini.batches.fail("batches/fake-1")
+
+        await run_l3_batch_prediction([_make_l2_paper("2410.00002")], client)
+
+        assert job_store.jobs[1]["status"] == "failed"
+        assert [r["key"] for r in fake_gemini.batches.requests("batches/fake-2")] == [
+            "2410.00001",
+            "2410.00002",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_failed_job_stays_open_when_resubmit_fails(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        await run_l3_batch_prediction([_make_l2_paper("2410.00001")], client)
+        fake_gemini.batches.fail("batches/fake-1")
+        fake_gemini.batches.create_error = RuntimeError("quota exceeded")
+
+        await run_l3_batch_prediction([_make_l2_paper("2410.00002")], client)
+
+        # 再投入できなければ失敗を記録しない (次回また失敗を検出して再投入する)
+        assert job_store.jobs[1]["status"] == "submitted"
+        assert len(job_store.jobs) == 1
+
+    @pytest.mark.asyncio
+    async def test_applied_results_are_returned_when_submit_fails(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        await run_l3_batch_prediction([_make_l2_paper("2410.00001")], client)
+        fake_gemini.batches.complete("batches/fake-1", lambda r: _l3_response(True))
+        fake_gemini.batches.create_error = RuntimeError("quota exceeded")
+
+        relevant, _, _, counts = await run_l3_batch_prediction(
+            [_make_l2_paper("2410.00002")], client
+        )
+
+        # 取り込み済みの結果は投入の失敗に関係なく Post-L3 へ渡す
+        assert [p.arxiv_id for p in relevant] == ["2410.00001"]
+        assert (counts.applied, counts.submitted) == (1, 0)
+        assert job_store.jobs[1]["status"] == "applied"
+        assert len(job_store.jobs) == 1
+
+    @pytest.mark.asyncio
+    async def test_reused_papers_are_not_submitted(
+        self, fake_gemini: FakeGeminiClient, job_store: FakeJobStore
+    ) -> None:
+        client: Any = fake_gemini
+        job_store.cached = {"2410.00001": True}
+        papers = [_make_l2_paper("2410.00001"), _make_l2_paper("2410.00002")]
+
+        relevant, _, _, counts = await run_l3_batch_prediction(papers, client)
+
+        assert [p.arxiv_id for p in relevant] == ["2410.00001"]
+        # キャッシュから反映した論文は結果を反映した論文として数える
+        assert (counts.submitted, counts.applied) == (1, 1)
+        assert [r["key"] for r in fake_gemini.batches.requests("batches/fake-1")] == ["2410.00002"]
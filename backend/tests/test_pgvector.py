@@ -0,0 +1,39 @@
+"""Tests for utils.pgvector module — バイナリ形式の変換のみ (DB 接続なし)。"""
+
+from __future__ import annotations
+
+import struct
+
+import numpy as np
+import psycopg
+import pytest
+
+from utils.pgvector import VectorBinaryDumper, VectorBinaryLoader, VectorTextLoader
+
+
+class TestVectorAdapters:
+    """pgvector の vector_send / vector_recv と同じ形式で変換されることを検証する。"""
+
+    def test_binary_dump_layout(self) -> None:
+        data = VectorBinaryDumper(np.ndarray).dump(np.array([1.0, -2.5], dtype=np.float32))
+        assert bytes(data) == struct.pack(">HHff", 2, 0, 1.0, -2.5)
+
+    def test_binary_round_trip(self) -> None:
+        vector = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+        data = VectorBinaryDumper(np.ndarray).dump(vector)
+        loaded = VectorBinaryLoader(0).load(data)
+        assert loaded.dtype == np.float32
+        np.testing.assert_array_equal(loaded, vector)
+
+    def test_dump_converts_float64(self) -> None:
+        data = VectorBinaryDumper(np.ndarray).dump(np.array([0.5, 0.25]))
+        assert len(bytes(data)) == 4 + 2 * 4
+
+    def test_dump_rejects_matrix(self) -> None:
+        with pytest.raises(psycopg.DataError):
+            VectorBinaryDumper(np.ndarray).dump(np.zeros((2, 3), dtype=np.float32))
+
+    def test_text_load(self) -> None:
+        loaded = VectorTextLoader(0).load(b"[0.1,-2,3e-05]")
+        np.testing.assert_allclose(loaded, [0.1, -2.0, 3e-05], rtol=1e-6)
+        assert loaded.dtype == np.float32
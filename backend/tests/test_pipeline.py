@@ -5,12 +5,14 @@
 
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Awaitable, Callable
 from datetime import datetime, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from utils.models import ArxivPaper, BatchLogEntry, L2Paper
+from utils.models import ArxivPaper, BatchLogEntry, L2Paper, L2Result
 
 
 # ---------------------------------------------------------------------------
@@ -45,6 +47,21 @@ def _make_l2_paper(arxiv_id: str = "2402.12345") -> L2Paper:
     )
 
 
+def _fake_l1(
+    papers: list[ArxivPaper], error: Exception | None = None
+) -> Callable[[asyncio.Queue[list[ArxivPaper] | None]], Awaitable[None]]:
+    """collect_papers_async の代替。papers を1バッチ流して終端を送る。"""
+
+    async def _collect(queue: asyncio.Queue[list[ArxivPaper] | None]) -> None:
+        if papers:
+            await queue.put(papers)
+        await queue.put(None)
+        if error is not None:
+            raise error
+
+    return _collect
+
+
 # ---------------------------------------------------------------------------
 # パイプラインのテスト
 # ---------------------------------------------------------------------------
@@ -57,11 +74,17 @@ class TestPipeline:
     @patch("batch.pipeline.run_post_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l2")
-    @patch("batch.pipeline.collect_papers")
+    @patch("batch.pipeline.collect_papers_async")
+    @patch("batch.l2_selector._generate_embeddings", side_effect=lambda p, c: [[0.1]] * len(p))
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
     @patch("batch.pipeline.log_curation_stats")
     async def test_full_pipeline_success(
         self,
         mock_log_stats: MagicMock,
+        mock_known: MagicMock,
+        mock_api_key: MagicMock,
+        mock_embed: MagicMock,
         mock_l1: MagicMock,
         mock_l2: MagicMock,
         mock_l3: AsyncMock,
@@ -72,7 +95,7 @@ class TestPipeline:
         """正常系: 全フェーズが成功する場合。"""
         # L1
         papers = [_make_arxiv_paper("2402.11111"), _make_arxiv_paper("2402.22222")]
-        mock_l1.return_value = papers
+        mock_l1.side_effect = _fake_l1(papers)
 
         # L2
         l2_papers = [_make_l2_paper("2402.11111")]
@@ -101,6 +124,9 @@ class TestPipeline:
 
         assert isinstance(result, BatchLogEntry)
         assert result.l1_dedup_count == 2
+        # L1 と並行して計算した Embedding が L2 に渡される
+        _, embeddings = mock_l2.call_args.args
+        assert set(embeddings) == {"2402.11111", "2402.22222"}
         assert result.l2_passed_count == 1
         assert result.l3_relevant_count == 1
         mock_close.assert_called_once()
@@ -111,11 +137,17 @@ class TestPipeline:
     @patch("batch.pipeline.run_post_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l2")
-    @patch("batch.pipeline.collect_papers")
+    @patch("batch.pipeline.collect_papers_async")
+    @patch("batch.l2_selector._generate_embeddings", side_effect=lambda p, c: [[0.1]] * len(p))
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
     @patch("batch.pipeline.log_curation_stats")
     async def test_l1_failure_continues(
         self,
         mock_log_stats: MagicMock,
+        mock_known: MagicMock,
+        mock_api_key: MagicMock,
+        mock_embed: MagicMock,
         mock_l1: MagicMock,
         mock_l2: MagicMock,
         mock_l3: AsyncMock,
@@ -124,7 +156,7 @@ class TestPipeline:
         mock_close: AsyncMock,
     ) -> None:
         """L1 が失敗しても後続フェーズが空リストで実行される。"""
-        mock_l1.side_effect = RuntimeError("arXiv API down")
+        mock_l1.side_effect = _fake_l1([], RuntimeError("arXiv API down"))
         mock_l2.return_value = []
         mock_l3.return_value = ([], 0, 0)
         mock_post_l3.return_value = (0, 0, [])
@@ -151,11 +183,17 @@ class TestPipeline:
     @patch("batch.pipeline.run_post_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l2")
-    @patch("batch.pipeline.collect_papers")
+    @patch("batch.pipeline.collect_papers_async")
+    @patch("batch.l2_selector._generate_embeddings", side_effect=lambda p, c: [[0.1]] * len(p))
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
     @patch("batch.pipeline.log_curation_stats")
     async def test_l2_failure_continues(
         self,
         mock_log_stats: MagicMock,
+        mock_known: MagicMock,
+        mock_api_key: MagicMock,
+        mock_embed: MagicMock,
         mock_l1: MagicMock,
         mock_l2: MagicMock,
         mock_l3: AsyncMock,
@@ -164,7 +202,7 @@ class TestPipeline:
         mock_close: AsyncMock,
     ) -> None:
         """L2 が失敗しても L3 以降が空リストで実行される。"""
-        mock_l1.return_value = [_make_arxiv_paper()]
+        mock_l1.side_effect = _fake_l1([_make_arxiv_paper()])
         mock_l2.side_effect = RuntimeError("DB connection failed")
         mock_l3.return_value = ([], 0, 0)
         mock_post_l3.return_value = (0, 0, [])
@@ -190,11 +228,17 @@ class TestPipeline:
     @patch("batch.pipeline.run_post_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l3", new_callable=AsyncMock)
     @patch("batch.pipeline.run_l2")
-    @patch("batch.pipeline.collect_papers")
+    @patch("batch.pipeline.collect_papers_async")
+    @patch("batch.l2_selector._generate_embeddings", side_effect=lambda p, c: [[0.1]] * len(p))
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
     @patch("batch.pipeline.log_curation_stats")
     async def test_empty_pipeline(
         self,
         mock_log_stats: MagicMock,
+        mock_known: MagicMock,
+        mock_api_key: MagicMock,
+        mock_embed: MagicMock,
         mock_l1: MagicMock,
         mock_l2: MagicMock,
         mock_l3: AsyncMock,
@@ -203,7 +247,7 @@ class TestPipeline:
         mock_close: AsyncMock,
     ) -> None:
         """L1 が空リストを返す場合。"""
-        mock_l1.return_value = []
+        mock_l1.side_effect = _fake_l1([])
         mock_l2.return_value = []
         mock_l3.return_value = ([], 0, 0)
         mock_post_l3.return_value = (0, 0, [])
@@ -223,3 +267,123 @@ class TestPipeline:
         assert result.l1_dedup_count == 0
         assert result.l2_passed_count == 0
         assert result.l3_relevant_count == 0
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("force_l3", [False, True])
+    @patch("batch.pipeline.close_connections", new_callable=AsyncMock)
+    @patch("batch.pipeline.get_async_connection", new_callable=AsyncMock)
+    @patch("batch.pipeline.run_post_l3", new_callable=AsyncMock)
+    @patch("batch.pipeline.run_l3", new_callable=AsyncMock)
+    @patch("batch.pipeline.collect_papers_async")
+    @patch("batch.l2_selector._generate_embeddings")
+    @patch("batch.l2_selector._fetch_unanalyzed_results")
+    @patch("batch.l2_selector._merge_known_papers")
+    @patch("batch.l2_selector._fetch_known_ids", return_value={"2402.11111"})
+    @patch("batch.pipeline.log_curation_stats")
+    async def test_force_l3_reaches_analyzed_known_papers(
+        self,
+        mock_log_stats: MagicMock,
+        mock_known: MagicMock,
+        mock_merge: MagicMock,
+        mock_unanalyzed: MagicMock,
+        mock_embed: MagicMock,
+        mock_l1: MagicMock,
+        mock_l3: AsyncMock,
+        mock_post_l3: AsyncMock,
+        mock_get_conn: AsyncMock,
+        mock_close: AsyncMock,
+        force_l3: bool,
+    ) -> None:
+        """分析済みの登録済み論文は force_l3 のときだけ L2 を越えて L3 に届く。"""
+        analyzed = L2Result(
+            arxiv_id="2402.11111",
+            max_score=0.6,
+            best_category_id=1,
+            hit_count=2,
+            importance_score=0.5,
+            all_scores={"1": 0.6},
+            passed=True,
+        )
+        # papers 上は L2 通過・L3 分析済み
+        mock_unanalyzed.side_effect = lambda ids, force: [analyzed] if force else []
+        mock_l1.side_effect = _fake_l1([_make_arxiv_paper("2402.11111")])
+        mock_l3.return_value = ([], 0, 0)
+        mock_post_l3.return_value = (0, 0, [])
+
+        mock_conn = AsyncMock()
+        mock_cursor = AsyncMock()
+        mock_cursor.__aenter__ = AsyncMock(return_value=mock_cursor)
+        mock_cursor.__aexit__ = AsyncMock(return_value=False)
+        mock_conn.cursor.return_value = mock_cursor
+        mock_conn.commit = AsyncMock()
+        mock_get_conn.return_value = mock_conn
+
+        from batch.pipeline import run_pipeline
+
+        await run_pipeline(force_l3=force_l3)
+
+        l3_input = mock_l3.call_args.args[0]
+        expected = ["2402.11111"] if force_l3 else []
+        assert [p.arxiv_id for p in l3_input] == expected
+        assert mock_l3.call_args.kwargs["force"] is force_l3
+        mock_embed.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("batch.pipeline.close_connections", new_callable=AsyncMock)
+    @patch("batch.pipeline.get_async_connection", new_callable=AsyncMock)
+    @patch("batch.pipeline.run_post_l3", new_callable=AsyncMock)
+    @patch("batch.pipeline.run_l3_batch_prediction", new_callable=AsyncMock)
+    @patch("batch.pipeline.run_l2")
+    @patch("batch.pipeline.collect_papers_async")
+    @patch("batch.l2_selector._generate_embeddings", side_effect=lambda p, c: [[0.1]] * len(p))
+    @patch("batch.l2_selector.get_openai_api_key", return_value="test-key")
+    @patch("batch.l2_selector._fetch_known_ids", return_value=set())
+    @patch("batch.pipeline.log_curation_stats")
+    @patch("batch.pipeline.L3_MODE", "batch_prediction")
+    async def test_batch_prediction_metrics_count_applied_papers(
+        self,
+        mock_log_stats: MagicMock,
+        mock_known: MagicMock,
+        mock_api_key: MagicMock,
+        mock_embed: MagicMock,
+        mock_l1: MagicMock,
+        mock_l2: MagicMock,
+        mock_l3: AsyncMock,
+        mock_post_l3: AsyncMock,
+        mock_get_conn: AsyncMock,
+        mock_close: AsyncMock,
+    ) -> None:
+        """バッチ予測モードの関連率は、投入した論文ではなく結果を反映した論文で計算する。"""
+        from batch.l3_batch_prediction import BatchPredictionCounts
+
+        mock_l1.side_effect = _fake_l1([_make_arxiv_paper("2402.11111")])
+        mock_l2.return_value = [_make_l2_paper("2402.11111")]
+        # 今回の1本は投入のみ。前回のジョブから4本の結果を取り込み、うち1本が関連
+        mock_l3.return_value = (
+            [_make_l2_paper("2402.00001")],
+            100,
+            50,
+            BatchPredictionCounts(submitted=1, applied=4, pending=0),
+        )
+        mock_post_l3.return_value = (1, 0, [])
+
+        mock_conn = AsyncMock()
+        mock_cursor = AsyncMock()
+        mock_cursor.fetchall = AsyncMock(return_value=[])
+        mock_cursor.__aenter__ = AsyncMock(return_value=mock_cursor)
+        mock_cursor.__aexit__ = AsyncMock(return_value=False)
+        mock_conn.cursor.return_value = mock_cursor
+        mock_conn.commit = AsyncMock()
+        mock_get_conn.return_value = mock_conn
+
+        from batch.pipeline import run_pipeline
+
+        result = await run_pipeline()
+
+        assert result.l2_passed_count == 1
+        assert result.l3_submitted_count == 1
+        assert result.l3_input_count == 4
+        assert result.l3_relevant_count == 1
+        assert result.l3_relevance_rate == 25.0
+        stats = mock_log_stats.call_args.args[0]
+        assert (stats.l3_passed, stats.l3_filtered) == (1, 3)
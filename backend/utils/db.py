@@ -3,6 +3,7 @@ AI Research OS — DB 接続管理
 
 psycopg v3 を使用した同期/非同期接続管理。
 Lambda 環境ではプールを使わず、1接続を再利用する。
+接続時に pgvector のバイナリアダプター (utils.pgvector) を登録する。
 """
 
 from __future__ import annotations
@@ -13,6 +14,7 @@ import psycopg
 import psycopg.sql
 
 from utils.logger import logger
+from utils.pgvector import register_vector, register_vector_async
 from utils.secrets import get_db_connection_params
 
 # ---------------------------------------------------------------------------
@@ -35,6 +37,7 @@ def get_sync_connection() -> psycopg.Connection[Any]:
             password=params["password"],
             autocommit=False,
         )
+        register_vector(_sync_conn)
     return _sync_conn
 
 
@@ -58,6 +61,7 @@ async def get_async_connection() -> psycopg.AsyncConnection[Any]:
             password=params["password"],
             autocommit=False,
         )
+        await register_vector_async(_async_conn)
     return _async_conn
 
 
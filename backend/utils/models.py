@@ -56,6 +56,15 @@ class L2Paper(ArxivPaper):
     all_scores: dict[str, float] = Field(default_factory=dict)
 
 
+class L2RescoreResult(BaseModel):
+    """アンカー変更後の再スコアリング1回分の結果。"""
+
+    processed: int = Field(default=0, description="スコアを計算した論文数")
+    updated: int = Field(default=0, description="papers で更新した行数")
+    last_id: int = Field(default=0, description="処理済みの最大 papers.id (次回の再開位置)")
+    done: bool = Field(default=False, description="全論文を処理し終えたか")
+
+
 # ---------------------------------------------------------------------------
 # L3: LLM 分析結果
 # ---------------------------------------------------------------------------
@@ -71,6 +80,18 @@ class L3Response(BaseModel):
     reasoning: str = ""
 
 
+class L3BatchItem(L3Response):
+    """L3 複数論文モードの1論文分の出力。"""
+
+    arxiv_id: str
+
+
+class L3BatchResponse(BaseModel):
+    """Gemini L3 複数論文モードのJSON出力スキーマ。"""
+
+    results: list[L3BatchItem]
+
+
 # ---------------------------------------------------------------------------
 # Post-L3: 詳細解説
 # ---------------------------------------------------------------------------
@@ -144,7 +165,8 @@ class BatchLogEntry(BaseModel):
     l2_input_count: int = 0
     l2_passed_count: int = 0
     l2_pass_rate: float = 0.0
-    l3_input_count: int = 0
+    l3_submitted_count: int = 0  # L3 に投入した論文数
+    l3_input_count: int = 0  # L3 の結果を反映した論文数 (l3_relevance_rate の分母)
     l3_relevant_count: int = 0
     l3_relevance_rate: float = 0.0
     l3_input_tokens: int = 0